@@ -6,9 +6,17 @@ Autor: Engenheiro de Dados Sênior
 Data: Janeiro 2026
 """
 
+import io
 import streamlit as st
-from user_database import get_user_database
+import pandas as pd
+from user_database import get_user_database, get_city_alias_map
 from auth import generate_password_hash
+from normalizacao import normalizar_nomes
+from ufs import UFS, sigla_uf, uf_do_municipio
+from usuarios_csv import COLUNAS_IMPORTACAO, importar_usuarios, linhas_csv_usuarios
+
+
+USERS_PAGE_SIZE = 25
 
 
 def render_user_management():
@@ -25,7 +33,10 @@ def render_user_management():
     db = get_user_database()
     
     # Tabs para diferentes ações
-    tab1, tab2, tab3 = st.tabs(["📋 Listar Usuários", "➕ Adicionar Usuário", "🔑 Alterar Senha"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+        "📋 Listar Usuários", "➕ Adicionar Usuário", "🔑 Alterar Senha", "🏙️ Aliases de Cidades",
+        "📥 Importar / Exportar"
+    ])
     
     # =====================================================================
     # TAB 1: LISTAR USUÁRIOS
@@ -33,7 +44,31 @@ def render_user_management():
     with tab1:
         st.subheader("📋 Usuários Cadastrados")
         
-        users = db.list_users()
+        # Filtros
+        col_busca, col_papel, col_status = st.columns([2, 1, 1])
+        with col_busca:
+            busca = st.text_input("🔍 Buscar", placeholder="Usuário ou nome", key="users_search")
+        with col_papel:
+            filtro_papel = st.selectbox("Papel", ["Todos", "user", "admin"], key="users_role_filter")
+        with col_status:
+            filtro_status = st.selectbox("Status", ["Todos", "Ativos", "Inativos"], key="users_status_filter")
+        
+        # Reiniciar a paginação quando os filtros mudarem
+        filtros = (busca.strip(), filtro_papel, filtro_status)
+        if st.session_state.get('users_filters') != filtros:
+            st.session_state.users_filters = filtros
+            st.session_state.users_cursors = [None]
+        
+        cursors = st.session_state.users_cursors
+        
+        # Uma única consulta paginada por rerun
+        users, next_cursor = db.list_users_page(
+            limit=USERS_PAGE_SIZE,
+            after=cursors[-1],
+            search=busca.strip() or None,
+            role=None if filtro_papel == "Todos" else filtro_papel,
+            active=None if filtro_status == "Todos" else filtro_status == "Ativos"
+        )
         
         if not users:
             st.info("Nenhum usuário cadastrado.")
@@ -80,6 +115,40 @@ def render_user_management():
                                 st.rerun()
                 
                 st.markdown("---")
+            
+            # Ações em lote sobre os usuários da página (exceto o próprio admin)
+            selecionaveis = [
+                user['username'] for user in users
+                if user['username'] != st.session_state.user['username']
+            ]
+            if selecionaveis:
+                selecionados = st.multiselect("☑️ Selecionar usuários desta página", selecionaveis,
+                                              key="users_bulk_selection")
+                col_ativar, col_desativar = st.columns(2)
+                with col_ativar:
+                    ativar = st.button("✅ Ativar selecionados", key="users_bulk_activate",
+                                       disabled=not selecionados)
+                with col_desativar:
+                    desativar = st.button("🚫 Desativar selecionados", key="users_bulk_deactivate",
+                                          disabled=not selecionados)
+                
+                if (ativar or desativar) and db.set_users_active(selecionados, ativar):
+                    st.success(f"✅ {len(selecionados)} usuário(s) {'ativado(s)' if ativar else 'desativado(s)'}!")
+                    del st.session_state.users_bulk_selection
+                    st.rerun()
+        
+        # Paginação
+        col_anterior, col_pagina, col_proxima = st.columns([1, 2, 1])
+        with col_anterior:
+            if len(cursors) > 1 and st.button("⬅️ Anterior", key="users_prev_page"):
+                cursors.pop()
+                st.rerun()
+        with col_pagina:
+            st.caption(f"Página {len(cursors)}")
+        with col_proxima:
+            if next_cursor is not None and st.button("Próxima ➡️", key="users_next_page"):
+                cursors.append(next_cursor)
+                st.rerun()
     
     # =====================================================================
     # TAB 2: ADICIONAR USUÁRIO
@@ -121,8 +190,9 @@ def render_user_management():
     with tab3:
         st.subheader("🔑 Alterar Senha de Usuário")
         
-        users_list = db.list_users()
-        usernames = [u['username'] for u in users_list if u['active']]
+        if st.button("🔄 Atualizar lista", key="refresh_usernames"):
+            st.session_state.pop('active_usernames', None)
+        usernames = _usernames_ativos(db)
         
         if not usernames:
             st.info("Nenhum usuário ativo.")
@@ -146,3 +216,132 @@ def render_user_management():
                             st.success(f"✅ Senha de '{selected_user}' alterada com sucesso!")
                         else:
                             st.error("❌ Erro ao alterar senha!")
+    
+    # =====================================================================
+    # TAB 4: ALIASES DE CIDADES
+    # =====================================================================
+    with tab4:
+        render_city_aliases(db)
+    
+    # =====================================================================
+    # TAB 5: IMPORTAR / EXPORTAR
+    # =====================================================================
+    with tab5:
+        render_import_export(db)
+
+
+def _usernames_ativos(db):
+    """
+    Usernames ativos do seletor de senha, guardados no session_state e
+    recarregados só quando db.users_version muda (alterações feitas neste
+    processo) ou no botão "Atualizar lista" (alterações de outros processos).
+    """
+    versao, usernames = st.session_state.get('active_usernames', (None, None))
+    if versao != db.users_version:
+        usernames = db.list_usernames(active=True)
+        st.session_state.active_usernames = (db.users_version, usernames)
+    return usernames
+
+
+def render_import_export(db):
+    """Renderiza a importação de usuários em lote (CSV) e a exportação para auditoria"""
+    st.subheader("📥 Importar Usuários (CSV)")
+    st.caption(f"Cabeçalho: {','.join(COLUNAS_IMPORTACAO)} (role opcional, padrão 'user'). "
+               "Usuários já cadastrados são ignorados.")
+    
+    with st.form("import_users_form"):
+        arquivo = st.file_uploader("📄 Arquivo CSV", type=['csv'])
+        submit = st.form_submit_button("📥 Importar")
+        
+        if submit:
+            if arquivo is None:
+                st.error("❌ Selecione um arquivo CSV!")
+            else:
+                with st.spinner("⏳ Validando e gerando hashes das senhas..."):
+                    resultado = importar_usuarios(db, io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline=''))
+                
+                if resultado.criados:
+                    st.success(f"✅ {resultado.criados} usuário(s) criado(s)!")
+                if resultado.existentes:
+                    st.info(f"ℹ️ {len(resultado.existentes)} usuário(s) já existente(s) ignorado(s): "
+                            f"{', '.join(resultado.existentes[:20])}")
+                if resultado.erros:
+                    st.warning(f"⚠️ {len(resultado.erros)} linha(s) com erro:")
+                    st.dataframe(
+                        [{'Linha': numero, 'Motivo': motivo} for numero, motivo in resultado.erros],
+                        use_container_width=True
+                    )
+    
+    st.markdown("---")
+    st.subheader("📤 Exportar Usuários (CSV)")
+    st.caption("Lista de usuários para auditoria (sem hashes de senha).")
+    
+    if st.button("📤 Gerar CSV", key="export_users"):
+        st.session_state.users_export_csv = ''.join(linhas_csv_usuarios(db))
+    
+    if 'users_export_csv' in st.session_state:
+        st.download_button(
+            "💾 Baixar usuarios.csv",
+            data=st.session_state.users_export_csv.encode('utf-8-sig'),
+            file_name="usuarios.csv",
+            mime="text/csv"
+        )
+
+
+def render_city_aliases(db):
+    """Renderiza a tabela de aliases de cidades com opção de fixar/corrigir"""
+    st.subheader("🏙️ Aliases de Cidades")
+    st.caption("Grafias das planilhas já associadas a um município (código IBGE). "
+               "Aliases fixados não são sobrescritos pelo matching automático e têm "
+               "prioridade até sobre um nome idêntico ao oficial.")
+    
+    aliases = db.get_city_aliases()
+    
+    if not aliases:
+        st.info("Nenhum alias registrado ainda.")
+    else:
+        st.dataframe(
+            [
+                {
+                    'UF': sigla_uf(codigo_uf),
+                    'Alias': alias,
+                    'Código IBGE': info['codigo_ibge'],
+                    'Score': info['score'],
+                    'Fixado': "📌" if info['pinned'] else "",
+                    'Atualizado em': info['updated_at']
+                }
+                for (codigo_uf, alias), info in sorted(aliases.items())
+            ],
+            use_container_width=True
+        )
+    
+    with st.form("city_alias_form"):
+        codigo_uf = st.selectbox("🗺️ UF", list(UFS), format_func=sigla_uf, index=list(UFS).index(29))
+        alias = st.text_input("✏️ Alias (como aparece na planilha)")
+        codigo_ibge = st.number_input("🏙️ Código IBGE do município", min_value=0, step=1)
+        
+        col_salvar, col_remover = st.columns(2)
+        with col_salvar:
+            salvar = st.form_submit_button("📌 Fixar / Corrigir")
+        with col_remover:
+            remover = st.form_submit_button("🗑️ Remover")
+        
+        alias_normalizado = normalizar_nomes(pd.Series([alias])).iloc[0]
+        
+        if salvar:
+            if not alias_normalizado or not codigo_ibge:
+                st.error("❌ Informe o alias e o código IBGE!")
+            elif uf_do_municipio(codigo_ibge) != codigo_uf:
+                st.error(f"❌ O código IBGE {int(codigo_ibge)} não é de um município de {sigla_uf(codigo_uf)}!")
+            elif db.set_city_alias(alias_normalizado, int(codigo_ibge), pinned=True):
+                get_city_alias_map.clear()
+                st.success(f"✅ Alias '{alias_normalizado}' fixado!")
+                st.rerun()
+        
+        if remover:
+            if not alias_normalizado:
+                st.error("❌ Informe o alias!")
+            elif db.delete_city_alias(codigo_uf, alias_normalizado):
+                get_city_alias_map.clear()
+                st.success(f"✅ Alias '{alias_normalizado}' removido!")
+                st.rerun()
@@ -10,16 +10,28 @@ NOVO: Sistema com autenticação e integração com Google Sheets
 
 import streamlit as st
 import pandas as pd
-import json
+import numpy as np
 import folium
+from folium.plugins import Draw, FastMarkerCluster
 from streamlit_folium import st_folium
-from rapidfuzz import fuzz, process
 import os
+import copy
+from functools import lru_cache
+from html import escape
 from pathlib import Path
 
 # Importar módulos de autenticação e Google Sheets
 from auth import Authenticator
 from google_sheets import get_sheets_loader
+from distancias import carregar_matriz
+from indice_espacial import IndiceEspacial, codigos_em_desenhos
+from normalizacao import normalizar_nomes
+from ufs import UFS, codigos_uf, sigla_uf, uf_do_municipio
+from sheets_snapshot import carregar_snapshot, idade_snapshot, versao_arquivo
+from rotas import planejar_rota, planejar_viagens
+from city_matching import novos_aliases
+from consolidacao import NOME_ARTEFATO, consolidar, preparar_municipios
+from user_database import get_user_database, get_city_alias_map
 
 # =====================================================================
 # CONFIGURAÇÃO DA PÁGINA
@@ -34,37 +46,60 @@ st.set_page_config(
 # =====================================================================
 # CONSTANTES
 # =====================================================================
-CODIGO_UF_BAHIA = 29
+CODIGO_UF_PADRAO = 29  # Bahia
+BRASIL = 0  # opção "todas as UFs" no seletor de estado
 FUZZY_THRESHOLD = 85
+# Faixas de total de profissionais -> (cor, ícone) do marcador, da maior para a menor
+FAIXAS_MARCADOR = [
+    (100, 'red', 'star'),
+    (50, 'orange', 'info-sign'),
+    (20, 'blue', 'user'),
+]
+MARCADOR_PADRAO = ('green', 'map-marker')
+# Contagens por cidade, na ordem usada pelo popup e pelo callback do cluster
+COLUNAS_CONTAGEM = [
+    'corretores_total', 'corretores_regulares', 'corretores_irregulares',
+    'imobiliarias_total', 'imobiliarias_regulares', 'imobiliarias_irregulares',
+    'total_profissionais'
+]
+TAMANHO_CACHE_POPUPS = 4096  # popups/tooltips memoizados (LRU)
+SNAPSHOT_IDADE_MAXIMA = 300  # segundos até disparar atualização em segundo plano
 COORDENADAS_CENTRO_BAHIA = (-12.5797, -41.7007)  # Centro aproximado da BA
+CRITERIOS_ROTA = {
+    'total_profissionais': "Total de profissionais",
+    'corretores_irregulares': "Corretores irregulares",
+    'imobiliarias_irregulares': "Imobiliárias irregulares"
+}
+FILTROS_GEOGRAFICOS = {
+    'nenhum': "Sem filtro",
+    'raio': "Raio a partir de uma cidade",
+    'vizinhos': "Cidades mais próximas",
+    'poligono': "Área desenhada no mapa"
+}
+CORES_VIAGENS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#9467bd', '#8c564b', '#e377c2', '#17becf', '#bcbd22']
 
 # =====================================================================
 # FUNÇÕES DE CARREGAMENTO E PROCESSAMENTO
 # =====================================================================
 
 @st.cache_data
-def carregar_municipios_bahia():
+def carregar_municipios(codigos_uf):
     """
-    Carrega o arquivo JSON de municípios e filtra apenas os da Bahia.
+    Carrega os municípios das UFs informadas a partir do índice binário
+    pré-compilado (uma fatia do índice por UF).
+    O índice é reconstruído a partir de municipios.json quando estiver desatualizado.
+    
+    Args:
+        codigos_uf: Tupla de códigos IBGE das UFs (ex.: (29,) para a Bahia).
     
     Returns:
-        DataFrame com municípios da Bahia e suas coordenadas.
+        DataFrame com os municípios e suas coordenadas.
     """
     try:
-        caminho_json = Path("dados/municipios.json")
-        
-        with open(caminho_json, 'r', encoding='utf-8-sig') as f:
-            municipios = json.load(f)
-        
-        # Filtrar apenas municípios da Bahia
-        municipios_ba = [m for m in municipios if m.get('codigo_uf') == CODIGO_UF_BAHIA]
-        
-        df = pd.DataFrame(municipios_ba)
-        
-        # Normalizar nomes para facilitar matching
-        df['nome_normalizado'] = df['nome'].str.upper().str.strip()
+        # Nomes normalizados (nome_normalizado) para facilitar matching
+        df = preparar_municipios(codigos_uf)
         
-        st.sidebar.success(f"✅ {len(df)} municípios da Bahia carregados")
+        st.sidebar.success(f"✅ {len(df)} municípios carregados")
         
         return df
         
@@ -108,11 +143,13 @@ def carregar_excel(arquivo, nome_tipo):
             st.warning(f"⚠️ Colunas faltantes em {arquivo}: {colunas_faltantes}")
             return pd.DataFrame()
         
-        # Filtrar apenas Bahia
-        df = df[df['UF'].str.upper().isin(['BA', 'BAHIA'])].copy()
+        # Código IBGE da UF (linhas com UF não reconhecida são descartadas)
+        df['CODIGO_UF'] = codigos_uf(df['UF'])
+        df = df[df['CODIGO_UF'].notna()].copy()
+        df['CODIGO_UF'] = df['CODIGO_UF'].astype(int)
         
         # Normalizar nomes de cidades
-        df['CIDADE_NORMALIZADA'] = df['CIDADE'].str.upper().str.strip()
+        df['CIDADE_NORMALIZADA'] = normalizar_nomes(df['CIDADE'])
         
         # Garantir que colunas numéricas existam
         for col in ['QUANTIDADE', 'REGULAR', 'IRREGULAR']:
@@ -121,8 +158,8 @@ def carregar_excel(arquivo, nome_tipo):
             else:
                 df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
         
-        # Consolidar duplicatas (somar quantidades)
-        df_consolidado = df.groupby('CIDADE_NORMALIZADA', as_index=False).agg({
+        # Consolidar duplicatas (somar quantidades) dentro de cada UF
+        df_consolidado = df.groupby(['CODIGO_UF', 'CIDADE_NORMALIZADA'], as_index=False).agg({
             'QUANTIDADE': 'sum',
             'REGULAR': 'sum',
             'IRREGULAR': 'sum'
@@ -137,258 +174,489 @@ def carregar_excel(arquivo, nome_tipo):
         return pd.DataFrame()
 
 
+@st.cache_data
+def ler_snapshot(nome, versao):
+    """
+    Lê um snapshot local das planilhas.
+    O argumento versao (mtime do arquivo) invalida o cache quando o snapshot é regravado.
+    
+    Args:
+        nome: Tipo de dado ("corretores", "imobiliarias" ou o consolidado do ETL).
+        versao: mtime do arquivo de snapshot.
+    
+    Returns:
+        Tupla (DataFrame, momento da coleta) ou None.
+    """
+    if versao is None:
+        return None
+    return carregar_snapshot(nome)
+
+
 def carregar_dados_fonte():
     """
     Carrega dados de corretores e imobiliárias da fonte configurada.
-    Prioriza Google Sheets, mas usa Excel local como fallback.
+    
+    Se houver snapshots locais, eles são servidos imediatamente e, quando mais
+    velhos que SNAPSHOT_IDADE_MAXIMA, o Google Sheets é consultado em segundo
+    plano. Sem snapshot, carrega do Google Sheets de forma síncrona e, em último
+    caso, dos arquivos Excel locais.
     
     Returns:
         Tupla (df_corretores, df_imobiliarias)
     """
     sheets_loader = get_sheets_loader()
     
-    # Tentar carregar do Google Sheets primeiro
-    df_corretores = sheets_loader.carregar_corretores()
-    df_imobiliarias = sheets_loader.carregar_imobiliarias()
+    snapshots = {
+        nome: ler_snapshot(nome, versao_arquivo(nome))
+        for nome in ("corretores", "imobiliarias")
+    }
     
-    # Se falhar, tentar carregar dos arquivos Excel locais (fallback)
+    # Cold start instantâneo: servir os snapshots e atualizar em segundo plano
+    if all(snapshots.values()):
+        idade = max(idade_snapshot(nome) or 0 for nome in snapshots)
+        if idade > SNAPSHOT_IDADE_MAXIMA:
+            sheets_loader.atualizar_em_segundo_plano()
+        
+        obtido_em = min(snapshot[1] for snapshot in snapshots.values())
+        st.sidebar.caption(f"🕒 Dados das planilhas de {obtido_em.astimezone():%d/%m/%Y %H:%M}")
+        
+        return snapshots["corretores"][0], snapshots["imobiliarias"][0]
+    
+    # Sem snapshot: carregar do Google Sheets (as duas planilhas em paralelo)
+    df_corretores, df_imobiliarias = sheets_loader.carregar_todos()
+    
+    # Se falhar, usar o snapshot disponível ou os arquivos Excel locais (fallback)
     if df_corretores.empty:
-        st.sidebar.warning("⚠️ Tentando carregar corretores do arquivo local...")
-        df_corretores = carregar_excel("Corretores.xlsx", "Corretores")
+        if snapshots["corretores"]:
+            df_corretores = snapshots["corretores"][0]
+        else:
+            st.sidebar.warning("⚠️ Tentando carregar corretores do arquivo local...")
+            df_corretores = carregar_excel("Corretores.xlsx", "Corretores")
     
     if df_imobiliarias.empty:
-        st.sidebar.warning("⚠️ Tentando carregar imobiliárias do arquivo local...")
-        df_imobiliarias = carregar_excel("Imobiliárias.xlsx", "Imobiliárias")
+        if snapshots["imobiliarias"]:
+            df_imobiliarias = snapshots["imobiliarias"][0]
+        else:
+            st.sidebar.warning("⚠️ Tentando carregar imobiliárias do arquivo local...")
+            df_imobiliarias = carregar_excel("Imobiliárias.xlsx", "Imobiliárias")
     
     return df_corretores, df_imobiliarias
 
 
-def realizar_fuzzy_matching(nome_cidade, lista_municipios, threshold=FUZZY_THRESHOLD):
+def carregar_consolidado_etl(codigos_uf):
     """
-    Realiza fuzzy matching para encontrar o município mais próximo.
+    Carrega o consolidado gravado pelo ETL offline (etl_consolidado.py), se houver.
+    Com ele, o app não lê as planilhas nem executa o matching por requisição.
     
     Args:
-        nome_cidade: Nome da cidade a buscar.
-        lista_municipios: Lista de nomes normalizados dos municípios.
-        threshold: Score mínimo de similaridade (0-100).
+        codigos_uf: Tupla de códigos IBGE das UFs selecionadas.
     
     Returns:
-        Nome do município correspondente ou None.
+        DataFrame consolidado das UFs selecionadas ou None se o ETL não foi executado.
     """
-    try:
-        # Tenta match exato primeiro
-        if nome_cidade in lista_municipios:
-            return nome_cidade
-        
-        # Se não houver match exato, usa fuzzy matching
-        resultado = process.extractOne(
-            nome_cidade, 
-            lista_municipios, 
-            scorer=fuzz.WRatio
-        )
-        
-        if resultado and resultado[1] >= threshold:
-            return resultado[0]
-        
-        return None
-        
-    except Exception as e:
-        st.warning(f"Erro no fuzzy matching para '{nome_cidade}': {str(e)}")
+    artefato = ler_snapshot(NOME_ARTEFATO, versao_arquivo(NOME_ARTEFATO))
+    if not artefato:
         return None
+    
+    df, gerado_em = artefato
+    st.sidebar.caption(f"🕒 Dados consolidados em {gerado_em.astimezone():%d/%m/%Y %H:%M}")
+    
+    return df[(df['codigo_ibge'] // 100000).isin(codigos_uf)].reset_index(drop=True)
 
 
 @st.cache_data
-def consolidar_dados(df_municipios, df_corretores, df_imobiliarias):
+def consolidar_dados(df_municipios, df_corretores, df_imobiliarias, aliases=None):
     """
     Consolida todos os dados em um DataFrame único com coordenadas.
+    O matching é restrito à UF de cada registro (ver anexar_municipios).
+    Nomes resolvidos por fuzzy matching são gravados na tabela de aliases da
+    UF, de modo que só grafias nunca vistas pagam o custo do fuzzy na próxima vez.
     
     Args:
-        df_municipios: DataFrame com municípios e coordenadas.
-        df_corretores: DataFrame com dados de corretores.
-        df_imobiliarias: DataFrame com dados de imobiliárias.
+        df_municipios: DataFrame com municípios e coordenadas (uma ou mais UFs).
+        df_corretores: DataFrame com dados de corretores (coluna CODIGO_UF).
+        df_imobiliarias: DataFrame com dados de imobiliárias (coluna CODIGO_UF).
+        aliases: Mapa (codigo_uf, alias) -> (codigo_ibge, score, fixado) já resolvido anteriormente.
     
     Returns:
         DataFrame consolidado final.
     """
     try:
-        # Criar lista de nomes normalizados dos municípios para fuzzy matching
-        municipios_nomes = df_municipios['nome_normalizado'].tolist()
-        
-        # Processar Corretores
-        dados_consolidados = []
-        
-        # Adicionar dados de corretores
-        for _, row in df_corretores.iterrows():
-            cidade_match = realizar_fuzzy_matching(row['CIDADE_NORMALIZADA'], municipios_nomes)
-            
-            if cidade_match:
-                municipio_info = df_municipios[df_municipios['nome_normalizado'] == cidade_match].iloc[0]
-                
-                dados_consolidados.append({
-                    'cidade': municipio_info['nome'],
-                    'latitude': municipio_info['latitude'],
-                    'longitude': municipio_info['longitude'],
-                    'corretores_total': row['QUANTIDADE'],
-                    'corretores_regulares': row['REGULAR'],
-                    'corretores_irregulares': row['IRREGULAR'],
-                    'imobiliarias_total': 0,
-                    'imobiliarias_regulares': 0,
-                    'imobiliarias_irregulares': 0
-                })
-        
-        # Criar DataFrame intermediário
-        df_consolidado = pd.DataFrame(dados_consolidados)
-        
-        # Adicionar dados de imobiliárias
-        for _, row in df_imobiliarias.iterrows():
-            cidade_match = realizar_fuzzy_matching(row['CIDADE_NORMALIZADA'], municipios_nomes)
-            
-            if cidade_match:
-                municipio_info = df_municipios[df_municipios['nome_normalizado'] == cidade_match].iloc[0]
-                cidade_nome = municipio_info['nome']
-                
-                # Verificar se a cidade já existe no DataFrame
-                if cidade_nome in df_consolidado['cidade'].values:
-                    # Atualizar dados existentes
-                    idx = df_consolidado[df_consolidado['cidade'] == cidade_nome].index[0]
-                    df_consolidado.at[idx, 'imobiliarias_total'] = row['QUANTIDADE']
-                    df_consolidado.at[idx, 'imobiliarias_regulares'] = row['REGULAR']
-                    df_consolidado.at[idx, 'imobiliarias_irregulares'] = row['IRREGULAR']
-                else:
-                    # Adicionar nova linha
-                    df_consolidado = pd.concat([df_consolidado, pd.DataFrame([{
-                        'cidade': cidade_nome,
-                        'latitude': municipio_info['latitude'],
-                        'longitude': municipio_info['longitude'],
-                        'corretores_total': 0,
-                        'corretores_regulares': 0,
-                        'corretores_irregulares': 0,
-                        'imobiliarias_total': row['QUANTIDADE'],
-                        'imobiliarias_regulares': row['REGULAR'],
-                        'imobiliarias_irregulares': row['IRREGULAR']
-                    }])], ignore_index=True)
-        
-        # Calcular totais combinados
-        df_consolidado['total_profissionais'] = (
-            df_consolidado['corretores_total'] + 
-            df_consolidado['imobiliarias_total']
+        df_consolidado, corretores_match, imobiliarias_match = consolidar(
+            df_municipios, df_corretores, df_imobiliarias, aliases, FUZZY_THRESHOLD
         )
         
-        # Ordenar por total de profissionais (decrescente)
-        df_consolidado = df_consolidado.sort_values('total_profissionais', ascending=False)
+        # Persistir as grafias resolvidas por fuzzy matching
+        aliases_novos = novos_aliases(pd.concat([corretores_match, imobiliarias_match]))
+        if aliases_novos and get_user_database().save_city_aliases(aliases_novos):
+            get_city_alias_map.clear()
         
-        return df_consolidado.reset_index(drop=True)
+        return df_consolidado
         
     except Exception as e:
         st.error(f"❌ Erro ao consolidar dados: {str(e)}")
         return pd.DataFrame()
 
 
+@lru_cache(maxsize=TAMANHO_CACHE_POPUPS)
+def _montar_popup_html(cidade, corretores_total, corretores_regulares, corretores_irregulares,
+                       imobiliarias_total, imobiliarias_regulares, imobiliarias_irregulares,
+                       total_profissionais):
+    """Monta o HTML do popup; memoizado pelo conteúdo (nome + contagens)"""
+    return (
+        f'<div class="ci-popup"><h3>📍 {escape(cidade)}</h3>'
+        f'<h4 class="cor">👤 Corretores</h4><table>'
+        f'<tr><td><strong>Total:</strong></td><td class="n">{corretores_total}</td></tr>'
+        f'<tr class="ok"><td>✅ Regulares:</td><td class="n">{corretores_regulares}</td></tr>'
+        f'<tr class="irr"><td>⚠️ Irregulares:</td><td class="n">{corretores_irregulares}</td></tr></table>'
+        f'<h4 class="imob">🏢 Imobiliárias</h4><table>'
+        f'<tr><td><strong>Total:</strong></td><td class="n">{imobiliarias_total}</td></tr>'
+        f'<tr class="ok"><td>✅ Regulares:</td><td class="n">{imobiliarias_regulares}</td></tr>'
+        f'<tr class="irr"><td>⚠️ Irregulares:</td><td class="n">{imobiliarias_irregulares}</td></tr></table>'
+        f'<div class="total">Total de Profissionais: {total_profissionais}</div></div>'
+    )
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_POPUPS)
+def criar_tooltip(cidade, total_profissionais):
+    """Texto do tooltip do marcador; memoizado pelo conteúdo"""
+    return f"{escape(cidade)} ({total_profissionais} profissionais)"
+
+
 def criar_popup_html(row):
     """
     Cria HTML formatado para o popup do marcador no mapa.
     
+    O estilo fica nas classes de CSS_POPUP (incluído uma vez no mapa base) e o
+    HTML é memoizado pelo nome e contagens da cidade, então re-renderizações
+    apenas consultam o cache.
+    
     Args:
         row: Linha do DataFrame com dados da cidade.
     
     Returns:
         String HTML formatada.
     """
-    html = f"""
-    <div style="font-family: Arial, sans-serif; width: 300px;">
-        <h3 style="margin: 0 0 10px 0; color: #1f77b4; border-bottom: 2px solid #1f77b4; padding-bottom: 5px;">
-            📍 {row['cidade']}
-        </h3>
-        
-        <div style="margin: 10px 0;">
-            <h4 style="margin: 5px 0; color: #2ca02c;">👤 Corretores</h4>
-            <table style="width: 100%; border-collapse: collapse;">
-                <tr>
-                    <td style="padding: 3px;"><strong>Total:</strong></td>
-                    <td style="padding: 3px; text-align: right;">{int(row['corretores_total'])}</td>
-                </tr>
-                <tr style="background-color: #e8f5e9;">
-                    <td style="padding: 3px;">✅ Regulares:</td>
-                    <td style="padding: 3px; text-align: right;">{int(row['corretores_regulares'])}</td>
-                </tr>
-                <tr style="background-color: #ffebee;">
-                    <td style="padding: 3px;">⚠️ Irregulares:</td>
-                    <td style="padding: 3px; text-align: right;">{int(row['corretores_irregulares'])}</td>
-                </tr>
-            </table>
-        </div>
-        
-        <div style="margin: 10px 0;">
-            <h4 style="margin: 5px 0; color: #ff7f0e;">🏢 Imobiliárias</h4>
-            <table style="width: 100%; border-collapse: collapse;">
-                <tr>
-                    <td style="padding: 3px;"><strong>Total:</strong></td>
-                    <td style="padding: 3px; text-align: right;">{int(row['imobiliarias_total'])}</td>
-                </tr>
-                <tr style="background-color: #e8f5e9;">
-                    <td style="padding: 3px;">✅ Regulares:</td>
-                    <td style="padding: 3px; text-align: right;">{int(row['imobiliarias_regulares'])}</td>
-                </tr>
-                <tr style="background-color: #ffebee;">
-                    <td style="padding: 3px;">⚠️ Irregulares:</td>
-                    <td style="padding: 3px; text-align: right;">{int(row['imobiliarias_irregulares'])}</td>
-                </tr>
-            </table>
-        </div>
-        
-        <div style="margin-top: 10px; padding-top: 10px; border-top: 1px solid #ccc;">
-            <strong>Total de Profissionais: {int(row['total_profissionais'])}</strong>
-        </div>
-    </div>
+    return _montar_popup_html(row['cidade'], *(int(row[coluna]) for coluna in COLUNAS_CONTAGEM))
+
+
+def classificar_marcadores(totais):
+    """
+    Define cor e ícone dos marcadores com base na quantidade de profissionais.
+    
+    Args:
+        totais: Array/Série com o total de corretores + imobiliárias por cidade.
+    
+    Returns:
+        Tupla (array de cores, array de ícones).
+    """
+    totais = np.asarray(totais)
+    condicoes = [totais >= limite for limite, _, _ in FAIXAS_MARCADOR]
+    cores = np.select(condicoes, [cor for _, cor, _ in FAIXAS_MARCADOR], default=MARCADOR_PADRAO[0])
+    icones = np.select(condicoes, [icone for _, _, icone in FAIXAS_MARCADOR], default=MARCADOR_PADRAO[1])
+    return cores, icones
+
+
+# CSS compartilhado por todos os popups (gerados no Python ou no navegador)
+CSS_POPUP = """
+<style>
+.ci-popup { font-family: Arial, sans-serif; width: 280px; }
+.ci-popup h3 { margin: 0 0 8px 0; color: #1f77b4; border-bottom: 2px solid #1f77b4; padding-bottom: 4px; }
+.ci-popup h4 { margin: 6px 0 2px 0; }
+.ci-popup h4.cor { color: #2ca02c; }
+.ci-popup h4.imob { color: #ff7f0e; }
+.ci-popup table { width: 100%; border-collapse: collapse; }
+.ci-popup td { padding: 2px 3px; }
+.ci-popup td.n { text-align: right; }
+.ci-popup tr.ok { background-color: #e8f5e9; }
+.ci-popup tr.irr { background-color: #ffebee; }
+.ci-popup .total { margin-top: 8px; padding-top: 6px; border-top: 1px solid #ccc; font-weight: bold; }
+</style>
+"""
+
+# Callback JS do FastMarkerCluster: cria o marcador e monta o popup só no clique.
+# Linha: [lat, lon, cidade, cor, ícone, cor_total, cor_reg, cor_irreg,
+#         imob_total, imob_reg, imob_irreg, total_profissionais]
+CALLBACK_MARCADOR_CLUSTER = """
+function (row) {
+    var esc = function (t) {
+        return String(t).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+    };
+    var tabela = function (titulo, classe, total, reg, irreg) {
+        return '<h4 class="' + classe + '">' + titulo + '</h4><table>' +
+            '<tr><td><strong>Total:</strong></td><td class="n">' + total + '</td></tr>' +
+            '<tr class="ok"><td>✅ Regulares:</td><td class="n">' + reg + '</td></tr>' +
+            '<tr class="irr"><td>⚠️ Irregulares:</td><td class="n">' + irreg + '</td></tr></table>';
+    };
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.setIcon(L.AwesomeMarkers.icon({icon: row[4], markerColor: row[3], prefix: 'glyphicon'}));
+    marker.bindTooltip(esc(row[2]) + ' (' + row[11] + ' profissionais)');
+    marker.bindPopup(function () {
+        return '<div class="ci-popup"><h3>📍 ' + esc(row[2]) + '</h3>' +
+            tabela('👤 Corretores', 'cor', row[5], row[6], row[7]) +
+            tabela('🏢 Imobiliárias', 'imob', row[8], row[9], row[10]) +
+            '<div class="total">Total de Profissionais: ' + row[11] + '</div></div>';
+    }, {maxWidth: 350});
+    return marker;
+}
+"""
+
+
+@st.cache_resource
+def criar_mapa_base(desenho=False, limites=None):
+    """
+    Cria o mapa base (tiles, CSS dos popups) uma única vez por processo.
+    Use sempre uma cópia (copy.deepcopy), pois o folium altera o mapa ao renderizar.
+    
+    Args:
+        desenho: Se True, inclui a ferramenta de desenho de polígonos/retângulos.
+        limites: ((lat_min, lon_min), (lat_max, lon_max)) a enquadrar; se None,
+            centraliza na Bahia.
+    
+    Returns:
+        Objeto folium.Map sem marcadores.
+    """
+    if limites is None:
+        mapa = folium.Map(location=COORDENADAS_CENTRO_BAHIA, zoom_start=7, tiles='OpenStreetMap')
+    else:
+        (lat_min, lon_min), (lat_max, lon_max) = limites
+        mapa = folium.Map(
+            location=((lat_min + lat_max) / 2, (lon_min + lon_max) / 2),
+            zoom_start=7,
+            tiles='OpenStreetMap'
+        )
+        mapa.fit_bounds([[lat_min, lon_min], [lat_max, lon_max]])
+    mapa.get_root().header.add_child(folium.Element(CSS_POPUP))
+    
+    if desenho:
+        Draw(
+            export=False,
+            draw_options={
+                'polyline': False,
+                'circle': False,
+                'circlemarker': False,
+                'marker': False
+            },
+            edit_options={'edit': False}
+        ).add_to(mapa)
+    
+    return mapa
+
+
+def adicionar_rota(camada, rota):
+    """
+    Desenha a rota de visita (polyline + ponto de partida) na camada.
+    
+    Args:
+        camada: FeatureGroup onde a rota será desenhada.
+        rota: DataFrame retornado por planejar_rota.
+    """
+    pontos = rota[['latitude', 'longitude']].to_numpy().tolist()
+    
+    folium.PolyLine(
+        pontos,
+        color='#d62728',
+        weight=3,
+        opacity=0.8,
+        tooltip=f"Rota: {len(rota) - 1} trechos, {rota['distancia_acumulada_km'].iloc[-1]:,.0f} km"
+    ).add_to(camada)
+    
+    folium.CircleMarker(
+        pontos[0],
+        radius=9,
+        color='#d62728',
+        fill=True,
+        fill_opacity=1,
+        tooltip=f"Partida: {rota['cidade'].iloc[0]}"
+    ).add_to(camada)
+
+
+def adicionar_viagens(camada, roteiro, base, retornar=True):
     """
-    return html
+    Desenha cada viagem como uma polyline de cor própria, saindo da base.
+    
+    Args:
+        camada: FeatureGroup onde as viagens serão desenhadas.
+        roteiro: DataFrame retornado por planejar_viagens.
+        base: Linha com cidade, latitude e longitude da base.
+        retornar: Se True, fecha cada viagem de volta à base.
+    """
+    ponto_base = [base['latitude'], base['longitude']]
+    
+    for viagem, trechos in roteiro.groupby('viagem'):
+        pontos = [ponto_base] + trechos[['latitude', 'longitude']].to_numpy().tolist()
+        if retornar:
+            pontos.append(ponto_base)
+        
+        folium.PolyLine(
+            pontos,
+            color=CORES_VIAGENS[(viagem - 1) % len(CORES_VIAGENS)],
+            weight=3,
+            opacity=0.8,
+            tooltip=f"Viagem {viagem}: {len(trechos)} cidades em {trechos['dia'].max()} dia(s)"
+        ).add_to(camada)
+    
+    folium.CircleMarker(
+        ponto_base,
+        radius=9,
+        color='#d62728',
+        fill=True,
+        fill_opacity=1,
+        tooltip=f"Base: {base['cidade']}"
+    ).add_to(camada)
 
 
-def criar_mapa(df_filtrado):
+def criar_camada_marcadores(df_filtrado, agrupar=False, rota=None, viagens=None):
     """
-    Cria o mapa interativo com os marcadores das cidades.
+    Cria a camada (FeatureGroup) com os marcadores das cidades.
     
     Args:
         df_filtrado: DataFrame com dados filtrados para exibir.
+        agrupar: Se True, usa agrupamento de marcadores no navegador
+            (FastMarkerCluster) e gera o HTML do popup apenas no clique,
+            reduzindo bastante o tamanho da página.
+        rota: DataFrame retornado por planejar_rota, desenhado como polyline (opcional).
+        viagens: Tupla (roteiro, base, retornar) das viagens planejadas (opcional).
     
     Returns:
-        Objeto folium.Map.
+        Objeto folium.FeatureGroup.
     """
-    # Criar mapa base
-    mapa = folium.Map(
-        location=COORDENADAS_CENTRO_BAHIA,
-        zoom_start=7,
-        tiles='OpenStreetMap'
-    )
+    camada = folium.FeatureGroup(name="Cidades")
     
-    # Adicionar marcadores
-    for _, row in df_filtrado.iterrows():
-        # Definir cor do marcador baseado na quantidade de profissionais
-        if row['total_profissionais'] >= 100:
-            cor = 'red'
-            icone = 'star'
-        elif row['total_profissionais'] >= 50:
-            cor = 'orange'
-            icone = 'info-sign'
-        elif row['total_profissionais'] >= 20:
-            cor = 'blue'
-            icone = 'user'
-        else:
-            cor = 'green'
-            icone = 'map-marker'
+    if rota is not None and not rota.empty:
+        adicionar_rota(camada, rota)
+    
+    if viagens is not None and not viagens[0].empty:
+        adicionar_viagens(camada, *viagens)
+    
+    # Colunas extraídas uma única vez como listas Python (sem criar uma Série por linha)
+    latitudes = df_filtrado['latitude'].tolist()
+    longitudes = df_filtrado['longitude'].tolist()
+    cidades = df_filtrado['cidade'].tolist()
+    cores, icones = classificar_marcadores(df_filtrado['total_profissionais'].to_numpy())
+    contagens = df_filtrado[COLUNAS_CONTAGEM].to_numpy(dtype=int).tolist()
+    
+    if agrupar:
+        dados = [
+            [lat, lon, cidade, cor, icone, *contagem]
+            for lat, lon, cidade, cor, icone, contagem
+            in zip(latitudes, longitudes, cidades, cores.tolist(), icones.tolist(), contagens)
+        ]
         
-        # Criar popup HTML
-        popup_html = criar_popup_html(row)
+        FastMarkerCluster(
+            dados,
+            callback=CALLBACK_MARCADOR_CLUSTER,
+            disableClusteringAtZoom=10
+        ).add_to(camada)
         
-        # Adicionar marcador
+        return camada
+    
+    # Adicionar marcadores
+    for lat, lon, cidade, cor, icone, contagem in zip(
+        latitudes, longitudes, cidades, cores.tolist(), icones.tolist(), contagens
+    ):
         folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            popup=folium.Popup(popup_html, max_width=350),
-            tooltip=f"{row['cidade']} ({int(row['total_profissionais'])} profissionais)",
+            location=[lat, lon],
+            popup=folium.Popup(_montar_popup_html(cidade, *contagem), max_width=350),
+            tooltip=criar_tooltip(cidade, contagem[-1]),
             icon=folium.Icon(color=cor, icon=icone, prefix='glyphicon')
-        ).add_to(mapa)
+        ).add_to(camada)
     
-    return mapa
+    return camada
+
+
+def localizar_partida(df_municipios, codigo_ibge):
+    """Linha (cidade, latitude, longitude) do município usado como partida/base"""
+    partida = df_municipios.loc[df_municipios['codigo_ibge'] == codigo_ibge].iloc[0]
+    return pd.Series({
+        'cidade': partida['nome'],
+        'latitude': partida['latitude'],
+        'longitude': partida['longitude'],
+        'codigo_ibge': partida['codigo_ibge']
+    })
+
+
+@st.cache_resource
+def obter_indice_espacial(df_municipios):
+    """Índice espacial (grade) sobre os municípios carregados, construído uma vez"""
+    return IndiceEspacial(df_municipios)
+
+
+@st.cache_resource
+def obter_matriz_distancias(codigo_uf):
+    """
+    Matriz de distâncias pré-calculada entre os municípios de uma UF (memory-mapped).
+    Rotas com cidades de outras UFs usam haversine (ver rotas._distancias_pontos).
+    """
+    return carregar_matriz(codigo_uf)
+
+
+def selecionar_municipio(rotulo, df_municipios):
+    """
+    Seletor de município na sidebar (valor = codigo_ibge), com "Nome - UF" como
+    rótulo e a capital da UF padrão (ou a primeira capital) pré-selecionada.
+    """
+    ordenado = df_municipios.sort_values(['nome', 'codigo_uf'])
+    codigos = ordenado['codigo_ibge'].tolist()
+    rotulos = dict(zip(codigos, ordenado['nome'] + ' - ' + ordenado['codigo_uf'].map(sigla_uf)))
+    
+    capitais = ordenado[ordenado['capital'] == 1].sort_values(
+        'codigo_uf', key=lambda uf: uf != CODIGO_UF_PADRAO, kind='stable'
+    )
+    padrao = codigos.index(capitais['codigo_ibge'].iloc[0]) if not capitais.empty else 0
+    
+    return st.sidebar.selectbox(rotulo, codigos, index=padrao, format_func=rotulos.get)
+
+
+@st.cache_data
+def calcular_rota(df_filtrado, df_municipios, codigo_partida, top_n, peso, retornar):
+    """
+    Calcula (com cache) a rota otimizada de visita.
+    
+    Args:
+        df_filtrado: DataFrame consolidado já filtrado.
+        df_municipios: DataFrame de municípios (para localizar a partida).
+        codigo_partida: Código IBGE do município de partida.
+        top_n: Quantidade de cidades a visitar (as de maior peso).
+        peso: Coluna usada para priorizar as cidades.
+        retornar: Se True, a rota volta à cidade de partida.
+    
+    Returns:
+        DataFrame com a ordem de visita.
+    """
+    inicio = localizar_partida(df_municipios, codigo_partida)
+    return planejar_rota(
+        df_filtrado, inicio, top_n=top_n, peso=peso, retornar=retornar,
+        matriz=obter_matriz_distancias(uf_do_municipio(codigo_partida))
+    )
+
+
+@st.cache_data
+def calcular_viagens(df_filtrado, df_municipios, codigo_base, n_viagens, dias_por_viagem,
+                     max_km_dia, max_cidades_dia, peso, retornar):
+    """
+    Divide (com cache por conjunto de parâmetros) as cidades em várias viagens.
+    
+    Args:
+        df_filtrado: DataFrame consolidado já filtrado.
+        df_municipios: DataFrame de municípios (para localizar a base).
+        codigo_base: Código IBGE do município de onde partem as viagens.
+        n_viagens: Número de viagens.
+        dias_por_viagem: Dias de cada viagem.
+        max_km_dia: Distância máxima por dia (km em linha reta).
+        max_cidades_dia: Máximo de cidades visitadas por dia.
+        peso: Coluna usada para priorizar as cidades.
+        retornar: Se True, cada viagem volta à base.
+    
+    Returns:
+        Tupla (roteiro, cidades não alocadas), ver planejar_viagens.
+    """
+    base = localizar_partida(df_municipios, codigo_base)
+    return planejar_viagens(
+        df_filtrado, base, n_viagens, dias_por_viagem, max_km_dia, max_cidades_dia,
+        peso=peso, retornar=retornar, matriz=obter_matriz_distancias(uf_do_municipio(codigo_base))
+    )
+
 
 
 # =====================================================================
@@ -448,13 +716,25 @@ def main():
     # Continuar com página principal (mapa e dados)
     st.sidebar.subheader("🔍 Filtros de Visualização")
     
-    # Carregar dados
+    # Estado (ou Brasil inteiro)
+    opcoes_uf = [BRASIL] + list(UFS)
+    uf_selecionada = st.sidebar.selectbox(
+        "🗺️ Estado",
+        opcoes_uf,
+        index=opcoes_uf.index(CODIGO_UF_PADRAO),
+        format_func=lambda codigo: "Brasil (todas as UFs)" if codigo == BRASIL else f"{sigla_uf(codigo)} - {UFS[codigo][1]}"
+    )
+    codigos_uf_selecionados = tuple(UFS) if uf_selecionada == BRASIL else (uf_selecionada,)
+    
+    # Carregar dados (o consolidado do ETL offline dispensa planilhas e matching)
     with st.spinner("📊 Carregando dados..."):
-        df_municipios = carregar_municipios_bahia()
-        df_corretores, df_imobiliarias = carregar_dados_fonte()
+        df_municipios = carregar_municipios(codigos_uf_selecionados)
+        df_consolidado = carregar_consolidado_etl(codigos_uf_selecionados)
+        if df_consolidado is None:
+            df_corretores, df_imobiliarias = carregar_dados_fonte()
     
     # Verificar se os dados foram carregados
-    if df_municipios.empty or df_corretores.empty or df_imobiliarias.empty:
+    if df_municipios.empty or (df_consolidado is None and (df_corretores.empty or df_imobiliarias.empty)):
         st.error("❌ Não foi possível carregar todos os dados necessários.")
         st.info("💡 Verifique as configurações do Google Sheets no arquivo .env")
         
@@ -464,8 +744,11 @@ def main():
         return
     
     # Consolidar dados
-    with st.spinner("🔄 Processando e consolidando dados..."):
-        df_consolidado = consolidar_dados(df_municipios, df_corretores, df_imobiliarias)
+    if df_consolidado is None:
+        with st.spinner("🔄 Processando e consolidando dados..."):
+            df_consolidado = consolidar_dados(
+                df_municipios, df_corretores, df_imobiliarias, get_city_alias_map()
+            )
     
     if df_consolidado.empty:
         st.error("❌ Não foi possível consolidar os dados.")
@@ -491,11 +774,122 @@ def main():
         help="Filtre cidades com pelo menos este número de imobiliárias"
     )
     
+    # Filtro geográfico (índice espacial sobre os municípios)
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("📍 Filtro Geográfico")
+    
+    filtro_geografico = st.sidebar.selectbox(
+        "Tipo de filtro",
+        list(FILTROS_GEOGRAFICOS),
+        format_func=lambda filtro: FILTROS_GEOGRAFICOS[filtro]
+    )
+    
+    codigos_geograficos = None
+    if filtro_geografico != 'nenhum':
+        indice = obter_indice_espacial(df_municipios)
+        
+        if filtro_geografico == 'poligono':
+            desenhos = (st.session_state.get("mapa_bahia") or {}).get('all_drawings')
+            if desenhos:
+                codigos_geograficos = codigos_em_desenhos(indice, desenhos)
+            else:
+                st.sidebar.info("✏️ Desenhe um polígono ou retângulo no mapa")
+        else:
+            codigo_centro = selecionar_municipio("Cidade de referência", df_municipios)
+            centro = localizar_partida(df_municipios, codigo_centro)
+            
+            if filtro_geografico == 'raio':
+                raio_km = st.sidebar.slider("Raio (km)", min_value=10, max_value=800, value=150, step=10)
+                codigos_geograficos = indice.no_raio(centro['latitude'], centro['longitude'], raio_km).index
+            else:
+                k = st.sidebar.slider(
+                    "Quantidade de cidades",
+                    min_value=1,
+                    max_value=50,
+                    value=10,
+                    help="Inclui a própria cidade de referência"
+                )
+                codigos_geograficos = indice.mais_proximos(centro['latitude'], centro['longitude'], k).index
+    
+    # Modo de renderização do mapa
+    agrupar_marcadores = st.sidebar.toggle(
+        "Agrupar marcadores (mapa leve)",
+        value=True,
+        help="Agrupa cidades próximas e monta os detalhes apenas ao clicar. "
+             "Recomendado para conexões lentas."
+    )
+    
     # Aplicar filtros
-    df_filtrado = df_consolidado[
+    mascara = (
         (df_consolidado['corretores_total'] >= min_corretores) &
         (df_consolidado['imobiliarias_total'] >= min_imobiliarias)
-    ].copy()
+    )
+    if codigos_geograficos is not None:
+        mascara &= df_consolidado['codigo_ibge'].isin(codigos_geograficos)
+    df_filtrado = df_consolidado[mascara].copy()
+    
+    # Planejamento de rota
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("🧭 Planejamento de Rota")
+    
+    rota = None
+    viagens = None
+    modo_rota = st.sidebar.radio(
+        "Modo",
+        ["Desativado", "Rota única", "Viagens semanais"],
+        help="Viagens semanais dividem as cidades em várias viagens com limites por dia"
+    )
+    
+    if modo_rota != "Desativado" and len(df_filtrado) > 0:
+        codigo_partida = selecionar_municipio("Cidade de partida", df_municipios)
+        criterio = st.sidebar.selectbox(
+            "Priorizar por",
+            list(CRITERIOS_ROTA),
+            format_func=lambda coluna: CRITERIOS_ROTA[coluna]
+        )
+        
+        if modo_rota == "Rota única":
+            # slider exige min < max; com uma única cidade não há o que escolher
+            if len(df_filtrado) > 1:
+                top_n = st.sidebar.slider(
+                    "Cidades a visitar",
+                    min_value=1,
+                    max_value=len(df_filtrado),
+                    value=min(15, len(df_filtrado)),
+                    help="As cidades filtradas com maior valor no critério escolhido"
+                )
+            else:
+                top_n = len(df_filtrado)
+        else:
+            n_viagens = st.sidebar.slider("Número de viagens", min_value=1, max_value=20, value=4)
+            dias_por_viagem = st.sidebar.slider("Dias por viagem", min_value=1, max_value=7, value=5)
+            max_km_dia = st.sidebar.slider(
+                "Máximo de km por dia",
+                min_value=50,
+                max_value=800,
+                value=300,
+                step=25,
+                help="Distância em linha reta; a volta à base conta no último dia"
+            )
+            max_cidades_dia = st.sidebar.slider("Máximo de cidades por dia", min_value=1, max_value=6, value=2)
+        
+        retornar = st.sidebar.checkbox("Retornar à cidade de partida", value=True)
+        
+        if modo_rota == "Rota única":
+            rota = calcular_rota(df_filtrado, df_municipios, codigo_partida, top_n, criterio, retornar)
+            st.sidebar.caption(
+                f"🛣️ {len(rota) - 1} trechos | {rota['distancia_acumulada_km'].iloc[-1]:,.0f} km (linha reta)"
+            )
+        else:
+            roteiro, nao_alocadas = calcular_viagens(
+                df_filtrado, df_municipios, codigo_partida, n_viagens, dias_por_viagem,
+                max_km_dia, max_cidades_dia, criterio, retornar
+            )
+            viagens = (roteiro, localizar_partida(df_municipios, codigo_partida), retornar)
+            st.sidebar.caption(
+                f"🗓️ {roteiro['viagem'].nunique()} viagens | {len(roteiro)} cidades | "
+                f"{len(nao_alocadas)} não couberam nos limites"
+            )
     
     # KPIs
     st.subheader("📊 Indicadores Gerais")
@@ -573,10 +967,66 @@ def main():
     
     if len(df_filtrado) == 0:
         st.warning("⚠️ Nenhuma cidade atende aos critérios de filtro selecionados.")
-    else:
+    
+    # No filtro por polígono o mapa continua visível para redesenhar a área
+    if len(df_filtrado) > 0 or filtro_geografico == 'poligono':
         with st.spinner("🗺️ Gerando mapa interativo..."):
-            mapa = criar_mapa(df_filtrado)
-            st_folium(mapa, width=None, height=800, use_container_width=True)
+            # O mapa base não muda entre filtros (mesma key): o componente não é
+            # remontado e apenas a camada de marcadores é enviada ao navegador
+            desenho = filtro_geografico == 'poligono'
+            limites = (
+                (round(df_municipios['latitude'].min(), 2), round(df_municipios['longitude'].min(), 2)),
+                (round(df_municipios['latitude'].max(), 2), round(df_municipios['longitude'].max(), 2))
+            )
+            mapa = copy.deepcopy(criar_mapa_base(desenho, limites))
+            camada = criar_camada_marcadores(
+                df_filtrado, agrupar=agrupar_marcadores, rota=rota, viagens=viagens
+            )
+            st_folium(
+                mapa,
+                key="mapa_bahia",
+                feature_group_to_add=camada,
+                # Só devolve dados ao Python quando o filtro por polígono está ativo
+                returned_objects=['all_drawings'] if desenho else [],
+                width=None,
+                height=800,
+                use_container_width=True
+            )
+    
+        if rota is not None:
+            with st.expander("🧭 Roteiro de Visita"):
+                st.dataframe(
+                    rota[['ordem', 'cidade', 'distancia_trecho_km', 'distancia_acumulada_km']].rename(columns={
+                        'ordem': 'Ordem',
+                        'cidade': 'Cidade',
+                        'distancia_trecho_km': 'Trecho (km)',
+                        'distancia_acumulada_km': 'Acumulado (km)'
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+        
+        if viagens is not None:
+            with st.expander("🗓️ Roteiro das Viagens"):
+                st.dataframe(
+                    viagens[0][['viagem', 'dia', 'ordem', 'cidade', criterio,
+                                'distancia_trecho_km', 'km_dia']].rename(columns={
+                        'viagem': 'Viagem',
+                        'dia': 'Dia',
+                        'ordem': 'Ordem',
+                        'cidade': 'Cidade',
+                        criterio: CRITERIOS_ROTA[criterio],
+                        'distancia_trecho_km': 'Trecho (km)',
+                        'km_dia': 'Acumulado no dia (km)'
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+                if not nao_alocadas.empty:
+                    st.caption(
+                        f"Não couberam nos limites: {', '.join(nao_alocadas['cidade'].head(20))}"
+                        + ("..." if len(nao_alocadas) > 20 else "")
+                    )
     
     st.markdown("---")
     
@@ -584,12 +1034,13 @@ def main():
     with st.expander("📋 Ver Tabela de Dados Detalhada"):
         st.dataframe(
             df_filtrado[[
-                'cidade', 'corretores_total', 'corretores_regulares', 
+                'cidade', 'uf', 'corretores_total', 'corretores_regulares', 
                 'corretores_irregulares', 'imobiliarias_total', 
                 'imobiliarias_regulares', 'imobiliarias_irregulares',
                 'total_profissionais'
             ]].rename(columns={
                 'cidade': 'Cidade',
+                'uf': 'UF',
                 'corretores_total': 'Corretores (Total)',
                 'corretores_regulares': 'Corretores (Regulares)',
                 'corretores_irregulares': 'Corretores (Irregulares)',
@@ -606,17 +1057,23 @@ def main():
     st.subheader("🏆 Top 10 Cidades com Mais Profissionais")
     top10 = df_filtrado.nlargest(10, 'total_profissionais')
     
-    for idx, row in top10.iterrows():
-        col_cidade, col_corretores, col_imobiliarias = st.columns([2, 1, 1])
-        
-        with col_cidade:
-            st.write(f"**{row['cidade']}**")
-        
-        with col_corretores:
-            st.write(f"👤 {int(row['corretores_total'])} corretores")
-        
-        with col_imobiliarias:
-            st.write(f"🏢 {int(row['imobiliarias_total'])} imobiliárias")
+    st.dataframe(
+        top10[['cidade', 'uf', 'corretores_total', 'imobiliarias_total', 'total_profissionais']],
+        column_config={
+            'cidade': st.column_config.TextColumn("Cidade"),
+            'uf': st.column_config.TextColumn("UF"),
+            'corretores_total': st.column_config.NumberColumn("👤 Corretores"),
+            'imobiliarias_total': st.column_config.NumberColumn("🏢 Imobiliárias"),
+            'total_profissionais': st.column_config.ProgressColumn(
+                "Total de Profissionais",
+                format="%d",
+                min_value=0,
+                max_value=int(top10['total_profissionais'].max()) if len(top10) > 0 else 1
+            )
+        },
+        use_container_width=True,
+        hide_index=True
+    )
     
     # Rodapé
     st.markdown("---")
@@ -11,8 +11,13 @@ import streamlit as st
 import bcrypt
 from typing import Optional, Dict
 import os
+import time
 from dotenv import load_dotenv
-from user_database import get_user_database
+from user_database import BancoOcupado, get_user_database
+from auth_service import (
+    PARAMETRO_TOKEN, ServicoOcupado, TentativasExcedidas, emitir_token_sessao,
+    get_auth_service, ip_do_cliente, validade_sessao, verificar_token_sessao
+)
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -22,6 +27,12 @@ class Authenticator:
     """
     Classe para gerenciar autenticação de usuários no sistema.
     Suporta autenticação com banco de dados.
+    
+    A sessão é um token assinado (HMAC) no parâmetro ?sessao= da URL: cada
+    rerun valida o token em memória, sem bcrypt, e confere o usuário no cache
+    do AuthService (ativo, com o mesmo papel e a mesma geração de sessão); um
+    refresh do navegador mantém o login até a expiração ou o logout. Como o
+    token fica na URL (histórico, links copiados), o logout o revoga no banco.
     """
     
     def __init__(self, use_database: bool = True):
@@ -32,7 +43,6 @@ class Authenticator:
             use_database: Se True, usa banco de dados. Se False, usa .env/secrets (legado)
         """
         self.use_database = use_database
-        self.db = get_user_database() if use_database else None
         
         # Credenciais legado (fallback)
         use_secrets = False
@@ -57,9 +67,22 @@ class Authenticator:
             st.warning("⚠️ Configure as credenciais no arquivo .env!")
     
     
+    @property
+    def db(self):
+        """Banco de usuários (inicializado só quando um login é de fato tentado)"""
+        return get_user_database() if self.use_database else None
+    
+    
+    @property
+    def service(self):
+        """Serviço de autenticação (cache, limitador e pool bcrypt)"""
+        return get_auth_service(self.db)
+    
+    
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """
         Verifica se a senha fornecida corresponde ao hash armazenado.
+        A verificação bcrypt roda no pool limitado do AuthService.
         
         Args:
             plain_password: Senha em texto plano.
@@ -69,48 +92,41 @@ class Authenticator:
             True se a senha é válida, False caso contrário.
         """
         try:
-            return bcrypt.checkpw(
-                plain_password.encode('utf-8'),
-                hashed_password.encode('utf-8')
-            )
+            return self.service.verificar_senha(plain_password, hashed_password)
         except Exception as e:
             st.error(f"Erro ao verificar senha: {str(e)}")
             return False
     
     
-    def authenticate(self, username: str, password: str) -> Optional[Dict]:
+    def authenticate(self, username: str, password: str, ip: Optional[str] = None) -> Optional[Dict]:
         """
         Autentica um usuário com nome de usuário e senha.
+        Tentativas acima do limite (por usuário e por IP) são rejeitadas antes
+        de qualquer verificação bcrypt.
         
         Args:
             username: Nome de usuário.
             password: Senha em texto plano.
+            ip: IP do cliente, se conhecido.
         
         Returns:
             Dicionário com dados do usuário se autenticado, None caso contrário.
+        
+        Raises:
+            TentativasExcedidas: Limite de tentativas atingido.
+            ServicoOcupado: Fila de verificações bcrypt cheia.
+            BancoOcupado: Nenhuma conexão livre no pool do banco.
         """
-        if self.use_database and self.db:
-            # Buscar usuário no banco de dados
-            user = self.db.get_user(username)
-            
-            if user and user['active']:
-                if self.verify_password(password, user['password_hash']):
-                    return {
-                        'username': user['username'],
-                        'name': user['full_name'],
-                        'role': user['role']
-                    }
-        else:
+        legado = None
+        if not (self.use_database and self.db):
             # Fallback: credenciais do .env (modo legado)
-            if username == self.admin_username:
-                if self.verify_password(password, self.admin_password_hash):
-                    return {
-                        'username': self.admin_username,
-                        'name': self.admin_name,
-                        'role': 'admin'
-                    }
+            legado = {
+                'username': self.admin_username,
+                'password_hash': self.admin_password_hash,
+                'name': self.admin_name
+            }
         
-        return None
+        return self.service.autenticar(username, password, ip, credenciais_legado=legado)
     
     
     def login_form(self):
@@ -121,7 +137,7 @@ class Authenticator:
             True se o usuário está autenticado, False caso contrário.
         """
         # Verificar se já está autenticado
-        if 'authenticated' in st.session_state and st.session_state.authenticated:
+        if self.is_authenticated():
             return True
         
         # Renderizar formulário de login
@@ -152,16 +168,25 @@ class Authenticator:
                 
                 if submit:
                     if username and password:
-                        user = self.authenticate(username, password)
+                        erro = "❌ Usuário ou senha inválidos!"
+                        try:
+                            user = self.authenticate(username, password, ip_do_cliente())
+                        except TentativasExcedidas as e:
+                            user = None
+                            erro = f"⏳ Muitas tentativas de login. Aguarde {e.espera_segundos:.0f} segundos."
+                        except (ServicoOcupado, BancoOcupado):
+                            user = None
+                            erro = "⏳ Servidor ocupado. Tente novamente em instantes."
                         
                         if user:
                             # Autenticação bem-sucedida
                             st.session_state.authenticated = True
                             st.session_state.user = user
+                            st.query_params[PARAMETRO_TOKEN] = emitir_token_sessao(user)
                             st.success("✅ Login realizado com sucesso!")
                             st.rerun()
                         else:
-                            st.error("❌ Usuário ou senha inválidos!")
+                            st.error(erro)
                     else:
                         st.warning("⚠️ Preencha todos os campos!")
             
@@ -172,11 +197,26 @@ class Authenticator:
     
     
     def logout(self):
-        """Realiza o logout do usuário."""
+        """
+        Realiza o logout do usuário, revogando os tokens de sessão já emitidos
+        (em todos os dispositivos), inclusive cópias da URL.
+        """
+        sessao = verificar_token_sessao(st.query_params.get(PARAMETRO_TOKEN))
+        if sessao is not None:
+            # Sem revogar, a URL copiada continuaria válida: manter o login e pedir nova tentativa
+            try:
+                encerrada = self.service.encerrar_sessoes(sessao['username'])
+            except BancoOcupado:
+                st.error("⏳ Servidor ocupado. Tente sair novamente em instantes.")
+                return
+            if not encerrada:
+                return
         if 'authenticated' in st.session_state:
             del st.session_state.authenticated
         if 'user' in st.session_state:
             del st.session_state.user
+        if PARAMETRO_TOKEN in st.query_params:
+            del st.query_params[PARAMETRO_TOKEN]
         st.rerun()
     
     
@@ -192,14 +232,53 @@ class Authenticator:
         return None
     
     
+    def _descartar_sessao(self, token: Optional[str]):
+        """Remove a sessão do session_state e o token da URL"""
+        for chave in ('authenticated', 'user'):
+            if chave in st.session_state:
+                del st.session_state[chave]
+        if token is not None:
+            del st.query_params[PARAMETRO_TOKEN]
+    
+    
     def is_authenticated(self) -> bool:
         """
-        Verifica se há um usuário autenticado.
+        Verifica se há um usuário autenticado, validando o token de sessão da URL.
+        Usuário e papel vêm do token e são conferidos a cada rerun contra o
+        cadastro (em cache): usuários desativados ou com outro papel perdem a
+        sessão. O token é renovado quando passa da metade da validade.
         
         Returns:
             True se autenticado, False caso contrário.
         """
-        return 'authenticated' in st.session_state and st.session_state.authenticated
+        token = st.query_params.get(PARAMETRO_TOKEN)
+        sessao = verificar_token_sessao(token)
+        
+        if sessao is None:
+            # Token ausente, adulterado ou expirado: descartar a sessão
+            self._descartar_sessao(token)
+            return False
+        
+        renovar = sessao['exp'] - time.time() < validade_sessao() / 2
+        try:
+            valida = self.service.validar_sessao(sessao)
+        except BancoOcupado:
+            # Sem conexão livre neste rerun: vale o token, sem renovação
+            valida, renovar = True, False
+        
+        if not valida:
+            self._descartar_sessao(token)
+            return False
+        
+        user = {'username': sessao['username'], 'name': sessao['name'], 'role': sessao['role'],
+                'geracao': sessao['geracao']}
+        st.session_state.authenticated = True
+        st.session_state.user = user
+        
+        if renovar:
+            st.query_params[PARAMETRO_TOKEN] = emitir_token_sessao(user)
+        
+        return True
 
 
 def generate_password_hash(password: str) -> str:
@@ -0,0 +1,442 @@
+"""
+Serviço de Autenticação
+Cache curto de usuários ativos, limitação de tentativas (token bucket por
+usuário e por IP), verificação bcrypt em um pool limitado de threads e
+tokens de sessão assinados (HMAC)
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+import bcrypt
+import streamlit as st
+
+from user_database import UserDatabase
+
+
+# Parâmetro da URL que carrega o token de sessão
+PARAMETRO_TOKEN = "sessao"
+
+
+def _get_config(key: str, default: str) -> str:
+    """Lê configuração de st.secrets (Cloud) ou variável de ambiente (.env)"""
+    try:
+        if hasattr(st, 'secrets') and st.secrets and key in st.secrets:
+            return str(st.secrets.get(key))
+    except:
+        pass
+    return os.getenv(key, default)
+
+
+class TentativasExcedidas(Exception):
+    """Tentativa de login rejeitada pelo limitador (antes de qualquer bcrypt)"""
+
+    def __init__(self, espera_segundos: float):
+        super().__init__(f"Muitas tentativas de login. Aguarde {espera_segundos:.0f} s.")
+        self.espera_segundos = espera_segundos
+
+
+class ServicoOcupado(Exception):
+    """Fila de verificações bcrypt cheia"""
+
+
+class LimitadorTokenBucket:
+    """
+    Token bucket por chave (usuário ou IP).
+
+    Cada chave começa com `capacidade` fichas e recupera `taxa` fichas por
+    segundo; cada tentativa consome uma. As chaves menos usadas são
+    descartadas quando há mais de `max_chaves` (memória limitada sob ataques
+    com nomes de usuário aleatórios).
+    """
+
+    def __init__(self, capacidade: float, taxa: float, max_chaves: int = 10000):
+        self.capacidade = capacidade
+        self.taxa = taxa
+        self.max_chaves = max_chaves
+        self._baldes: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, chave: str) -> float:
+        """
+        Consome uma ficha da chave.
+
+        Returns:
+            0 se a tentativa foi permitida; caso contrário, os segundos até a
+            próxima ficha.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            fichas, atualizado_em = self._baldes.pop(chave, (self.capacidade, agora))
+            fichas = min(self.capacidade, fichas + (agora - atualizado_em) * self.taxa)
+
+            espera = 0.0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = (1 - fichas) / self.taxa
+
+            self._baldes[chave] = (fichas, agora)
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+
+        return espera
+
+    def liberar(self, chave: str):
+        """Restaura a chave (ex.: após login bem-sucedido)"""
+        with self._lock:
+            self._baldes.pop(chave, None)
+
+
+class CacheUsuarios:
+    """
+    Cache com TTL curto dos registros de usuários ativos.
+
+    Cada entrada guarda a versão de UserDatabase.users_version do momento da
+    leitura, de modo que qualquer alteração de usuário feita neste processo
+    (senha, papel, ativação) invalida o cache imediatamente; o TTL limita o
+    atraso para alterações feitas por outros processos.
+    """
+
+    def __init__(self, ttl_segundos: float):
+        self.ttl = ttl_segundos
+        self._entradas: Dict[str, Tuple[float, int, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def obter(self, username: str, versao: int, carregar: Callable[[str], Optional[Dict]]) -> Optional[Dict]:
+        """
+        Retorna o usuário ativo do cache ou chama carregar(username).
+        Usuários inexistentes ou inativos não são armazenados.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(username)
+            if entrada and entrada[0] > agora and entrada[1] == versao:
+                return entrada[2]
+
+        user = carregar(username)
+
+        with self._lock:
+            if user and user['active']:
+                self._entradas[username] = (agora + self.ttl, versao, user)
+            else:
+                self._entradas.pop(username, None)
+        return user
+
+    def invalidar(self, username: Optional[str] = None):
+        """Remove um usuário (ou todos) do cache"""
+        with self._lock:
+            if username is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(username, None)
+
+
+def custo_bcrypt(password_hash: str) -> Optional[int]:
+    """Fator de custo embutido no hash ('$2b$12$...' -> 12)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class AuthService:
+    """
+    Camada de autenticação entre o formulário de login e o banco.
+
+    Ordem de uma tentativa: limitador (usuário e IP) -> cache de usuários ->
+    bcrypt no pool de threads (bcrypt libera o GIL) -> rehash, quando o custo
+    do hash difere de BCRYPT_ROUNDS.
+    """
+
+    def __init__(self, db: Optional[UserDatabase] = None):
+        """
+        Args:
+            db: Banco de usuários; None para o modo legado (.env/secrets).
+        """
+        self.db = db
+        self.bcrypt_rounds = db.bcrypt_rounds if db else int(_get_config('BCRYPT_ROUNDS', '12'))
+        self.timeout = float(_get_config('AUTH_BCRYPT_TIMEOUT', '10'))
+
+        self.cache = CacheUsuarios(float(_get_config('AUTH_USER_CACHE_TTL', '60')))
+        # Modo legado (sem banco): geração de sessão do administrador, só em memória
+        self._geracao_legado = 0
+
+        # Padrão: 5 tentativas por usuário (1 nova a cada 30 s) e 20 por IP (1 a cada 3 s)
+        self.limite_usuario = LimitadorTokenBucket(
+            float(_get_config('AUTH_RATE_USER_BURST', '5')),
+            1 / float(_get_config('AUTH_RATE_USER_INTERVAL', '30'))
+        )
+        self.limite_ip = LimitadorTokenBucket(
+            float(_get_config('AUTH_RATE_IP_BURST', '20')),
+            1 / float(_get_config('AUTH_RATE_IP_INTERVAL', '3'))
+        )
+
+        # Pool limitado: no máximo `workers` verificações simultâneas e
+        # `fila` aguardando; o excedente é rejeitado em vez de enfileirado
+        workers = int(_get_config('AUTH_BCRYPT_WORKERS', '2'))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._vagas = threading.BoundedSemaphore(workers + int(_get_config('AUTH_BCRYPT_QUEUE', '8')))
+
+    def _executar_bcrypt(self, funcao, *args):
+        """
+        Executa uma função bcrypt no pool, respeitando o limite da fila.
+
+        Raises:
+            ServicoOcupado: Fila cheia ou resultado não obtido em AUTH_BCRYPT_TIMEOUT segundos.
+        """
+        if not self._vagas.acquire(blocking=False):
+            raise ServicoOcupado("Servidor ocupado. Tente novamente em instantes.")
+
+        try:
+            future = self._executor.submit(funcao, *args)
+        except Exception:
+            self._vagas.release()
+            raise
+        future.add_done_callback(lambda _: self._vagas.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            # Ainda na fila (ou lento demais): desistir libera a vaga se não começou
+            future.cancel()
+            raise ServicoOcupado("Servidor ocupado. Tente novamente em instantes.")
+
+    def verificar_senha(self, senha: str, password_hash: str) -> bool:
+        """Verifica a senha contra o hash bcrypt (no pool de threads)"""
+        if not password_hash:
+            return False
+        try:
+            return self._executar_bcrypt(bcrypt.checkpw, senha.encode('utf-8'), password_hash.encode('utf-8'))
+        except ValueError:
+            # Hash malformado
+            return False
+
+    def gerar_hash(self, senha: str) -> str:
+        """Gera um hash bcrypt com o custo configurado (no pool de threads)"""
+        salt = bcrypt.gensalt(rounds=self.bcrypt_rounds)
+        return self._executar_bcrypt(bcrypt.hashpw, senha.encode('utf-8'), salt).decode('utf-8')
+
+    def _verificar_limites(self, username: str, ip: Optional[str]):
+        """Consome uma ficha do usuário e do IP; levanta TentativasExcedidas se esgotadas"""
+        espera = self.limite_usuario.consumir(username.lower())
+        if ip:
+            espera = max(espera, self.limite_ip.consumir(ip))
+        if espera:
+            raise TentativasExcedidas(espera)
+
+    def _rehash_se_necessario(self, user: Dict, senha: str):
+        """Regrava o hash quando o custo armazenado difere de BCRYPT_ROUNDS"""
+        if custo_bcrypt(user['password_hash']) == self.bcrypt_rounds:
+            return
+        try:
+            self.db.set_password_hash(user['username'], self.gerar_hash(senha))
+        except ServicoOcupado:
+            # Fica para o próximo login
+            pass
+
+    def autenticar(self, username: str, senha: str, ip: Optional[str] = None,
+                   credenciais_legado: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Autentica um usuário.
+
+        Args:
+            username: Nome de usuário.
+            senha: Senha em texto plano.
+            ip: IP do cliente (limitador por IP), se conhecido.
+            credenciais_legado: {username, password_hash, name} do .env/secrets,
+                usado quando não há banco de dados.
+
+        Returns:
+            Dicionário {username, name, role, geracao} se autenticado, None caso contrário.
+
+        Raises:
+            TentativasExcedidas: Limite de tentativas do usuário ou do IP atingido.
+            ServicoOcupado: Fila de verificações bcrypt cheia.
+            BancoOcupado: Nenhuma conexão livre no pool do banco.
+        """
+        self._verificar_limites(username, ip)
+
+        if self.db is None:
+            legado = credenciais_legado or {}
+            if username == legado.get('username') and self.verificar_senha(senha, legado.get('password_hash', '')):
+                self.limite_usuario.liberar(username.lower())
+                return {'username': legado['username'], 'name': legado.get('name', ''), 'role': 'admin',
+                        'geracao': self._geracao_legado}
+            return None
+
+        user = self.cache.obter(username, self.db.users_version, self.db.get_user)
+        if not user or not user['active'] or not self.verificar_senha(senha, user['password_hash']):
+            return None
+
+        self.limite_usuario.liberar(username.lower())
+        self._rehash_se_necessario(user, senha)
+
+        return {
+            'username': user['username'],
+            'name': user['full_name'],
+            'role': user['role'],
+            'geracao': user['session_generation']
+        }
+
+    def validar_sessao(self, sessao: Dict) -> bool:
+        """
+        Confere se o usuário de um token de sessão ainda existe, está ativo,
+        mantém o papel do token e não encerrou as sessões depois da emissão
+        (logout, desativação ou rebaixamento invalidam o token).
+
+        Usa o cache de usuários: o banco é consultado no máximo uma vez por
+        usuário a cada AUTH_USER_CACHE_TTL segundos, e alterações feitas neste
+        processo valem imediatamente.
+
+        Raises:
+            BancoOcupado: Nenhuma conexão livre no pool do banco.
+        """
+        if self.db is None:
+            return sessao['geracao'] == self._geracao_legado
+
+        user = self.cache.obter(sessao['username'], self.db.users_version, self.db.get_user)
+        return bool(user and user['active'] and user['role'] == sessao['role']
+                    and user['session_generation'] == sessao['geracao'])
+
+    def encerrar_sessoes(self, username: str) -> bool:
+        """
+        Encerra todas as sessões do usuário (logout): tokens emitidos antes,
+        inclusive cópias da URL, deixam de ser aceitos por validar_sessao.
+        No modo legado a geração fica em memória e volta a zero ao reiniciar.
+
+        Returns:
+            True se as sessões foram encerradas.
+
+        Raises:
+            BancoOcupado: Nenhuma conexão livre no pool do banco.
+        """
+        if self.db is None:
+            self._geracao_legado += 1
+            return True
+        return self.db.revoke_sessions(username)
+
+
+# Instâncias globais (por modo: com banco ou legado)
+_servicos: Dict[bool, AuthService] = {}
+_servicos_lock = threading.Lock()
+
+
+def get_auth_service(db: Optional[UserDatabase] = None) -> AuthService:
+    """Retorna a instância singleton do serviço de autenticação"""
+    with _servicos_lock:
+        chave = db is not None
+        if chave not in _servicos:
+            _servicos[chave] = AuthService(db)
+        return _servicos[chave]
+
+
+def ip_do_cliente() -> Optional[str]:
+    """
+    IP do cliente da sessão atual.
+
+    Atrás de AUTH_TRUSTED_PROXIES proxies (padrão 1, como no Streamlit Cloud),
+    usa o endereço que o proxy confiável mais externo acrescentou ao
+    X-Forwarded-For, contando da direita: as entradas à esquerda vêm do
+    próprio cliente e podem ser forjadas. Sem o cabeçalho (ou com menos
+    entradas que proxies), usa st.context.ip_address.
+    """
+    try:
+        contexto = st.context
+        proxies = int(_get_config('AUTH_TRUSTED_PROXIES', '1'))
+        encaminhado = [ip.strip() for ip in (contexto.headers.get('X-Forwarded-For') or '').split(',') if ip.strip()]
+        if proxies > 0 and len(encaminhado) >= proxies:
+            return encaminhado[-proxies]
+        return getattr(contexto, 'ip_address', None)
+    except Exception:
+        return None
+
+
+# =====================================================================
+# TOKENS DE SESSÃO
+# =====================================================================
+
+def _b64(dados: bytes) -> str:
+    """Base64 para URL, sem padding"""
+    return base64.urlsafe_b64encode(dados).rstrip(b'=').decode('ascii')
+
+
+@lru_cache(maxsize=1)
+def _segredo_sessao() -> bytes:
+    """
+    Chave HMAC dos tokens (SESSION_SECRET). Sem ela, usa uma chave aleatória
+    do processo: as sessões continuam funcionando, mas expiram ao reiniciar o app.
+    """
+    segredo = _get_config('SESSION_SECRET', '')
+    return segredo.encode('utf-8') if segredo else secrets.token_bytes(32)
+
+
+@lru_cache(maxsize=1)
+def validade_sessao() -> float:
+    """Validade dos tokens de sessão em segundos (SESSION_TTL_HOURS)"""
+    return float(_get_config('SESSION_TTL_HOURS', '8')) * 3600
+
+
+def _assinar(corpo: str) -> str:
+    return _b64(hmac.new(_segredo_sessao(), corpo.encode('utf-8'), hashlib.sha256).digest())
+
+
+def emitir_token_sessao(user: Dict) -> str:
+    """
+    Gera um token de sessão assinado: base64(JSON).base64(HMAC-SHA256).
+
+    Args:
+        user: Dicionário {username, name, role, geracao} retornado por AuthService.autenticar.
+
+    Returns:
+        Token com usuário, nome, papel, geração de sessão e expiração.
+    """
+    carga = {
+        'u': user['username'],
+        'n': user['name'],
+        'r': user['role'],
+        'g': user['geracao'],
+        'exp': int(time.time() + validade_sessao())
+    }
+    corpo = _b64(json.dumps(carga, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+    return f"{corpo}.{_assinar(corpo)}"
+
+
+def verificar_token_sessao(token: Optional[str]) -> Optional[Dict]:
+    """
+    Valida assinatura e expiração de um token de sessão, sem acessar o banco.
+
+    Returns:
+        Dicionário {username, name, role, geracao, exp} ou None se inválido/expirado.
+    """
+    try:
+        corpo, assinatura = token.split('.')
+    except (AttributeError, ValueError):
+        return None
+
+    # Comparar bytes: o token vem da URL e pode ter caracteres não ASCII
+    if not hmac.compare_digest(assinatura.encode('utf-8'), _assinar(corpo).encode('ascii')):
+        return None
+
+    try:
+        carga = json.loads(base64.urlsafe_b64decode(corpo + '=' * (-len(corpo) % 4)))
+    except ValueError:
+        return None
+
+    if carga.get('exp', 0) < time.time():
+        return None
+
+    return {'username': carga['u'], 'name': carga['n'], 'role': carga['r'],
+            'geracao': carga.get('g', 0), 'exp': carga['exp']}
@@ -0,0 +1,120 @@
+"""
+Micro-benchmark da Camada de Marcadores
+Compara a montagem dos marcadores por iterrows (implementação anterior) com a
+iteração por colunas + np.select usada em app.criar_camada_marcadores
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+
+Uso:
+    python benchmark_mapa.py                # 400 e 5.000 cidades
+    python benchmark_mapa.py 400 20000      # tamanhos personalizados
+"""
+
+import sys
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+from folium.plugins import FastMarkerCluster
+
+import app
+
+
+REPETICOES = 5
+
+
+def gerar_cidades(n: int, semente: int = 0) -> pd.DataFrame:
+    """DataFrame sintético no formato de consolidar_dados, com n cidades na Bahia"""
+    rng = np.random.default_rng(semente)
+    corretores_regulares = rng.integers(0, 120, n)
+    corretores_irregulares = rng.integers(0, 40, n)
+    imobiliarias_regulares = rng.integers(0, 30, n)
+    imobiliarias_irregulares = rng.integers(0, 10, n)
+
+    df = pd.DataFrame({
+        'cidade': [f"Cidade {i}" for i in range(n)],
+        'latitude': rng.uniform(-18.3, -8.6, n),
+        'longitude': rng.uniform(-46.6, -37.4, n),
+        'corretores_regulares': corretores_regulares,
+        'corretores_irregulares': corretores_irregulares,
+        'corretores_total': corretores_regulares + corretores_irregulares,
+        'imobiliarias_regulares': imobiliarias_regulares,
+        'imobiliarias_irregulares': imobiliarias_irregulares,
+        'imobiliarias_total': imobiliarias_regulares + imobiliarias_irregulares,
+    })
+    df['total_profissionais'] = df['corretores_total'] + df['imobiliarias_total']
+    return df
+
+
+def _classificar_marcador(total_profissionais):
+    """Classificação escalar (uma chamada por linha), como na implementação anterior"""
+    if total_profissionais >= 100:
+        return 'red', 'star'
+    elif total_profissionais >= 50:
+        return 'orange', 'info-sign'
+    elif total_profissionais >= 20:
+        return 'blue', 'user'
+    return 'green', 'map-marker'
+
+
+def camada_iterrows(df: pd.DataFrame, agrupar: bool) -> folium.FeatureGroup:
+    """Implementação anterior: iterrows/to_dict + classificação escalar"""
+    camada = folium.FeatureGroup(name="Cidades")
+
+    if agrupar:
+        dados = [
+            [
+                row['latitude'], row['longitude'], row['cidade'],
+                *_classificar_marcador(row['total_profissionais']),
+                *(int(row[coluna]) for coluna in app.COLUNAS_CONTAGEM)
+            ]
+            for row in df.to_dict('records')
+        ]
+        FastMarkerCluster(dados, callback=app.CALLBACK_MARCADOR_CLUSTER).add_to(camada)
+        return camada
+
+    for _, row in df.iterrows():
+        cor, icone = _classificar_marcador(row['total_profissionais'])
+        folium.Marker(
+            location=[row['latitude'], row['longitude']],
+            popup=folium.Popup(app.criar_popup_html(row), max_width=350),
+            tooltip=app.criar_tooltip(row['cidade'], int(row['total_profissionais'])),
+            icon=folium.Icon(color=cor, icon=icone, prefix='glyphicon')
+        ).add_to(camada)
+    return camada
+
+
+def cronometrar(funcao, *args) -> float:
+    """Melhor tempo (ms) entre REPETICOES execuções, com o cache de popups limpo"""
+    tempos = []
+    for _ in range(REPETICOES):
+        app._montar_popup_html.cache_clear()
+        app.criar_tooltip.cache_clear()
+        inicio = time.perf_counter()
+        funcao(*args)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tempos)
+
+
+def main(tamanhos):
+    print(f"{'cidades':>8} {'modo':>10} {'iterrows (ms)':>14} {'colunas (ms)':>13} {'ganho':>7}")
+
+    for n in tamanhos:
+        df = gerar_cidades(n)
+
+        for agrupar in (False, True):
+            antes = cronometrar(camada_iterrows, df, agrupar)
+            depois = cronometrar(app.criar_camada_marcadores, df, agrupar)
+            modo = 'agrupado' if agrupar else 'marcadores'
+            print(f"{n:>8} {modo:>10} {antes:>14.1f} {depois:>13.1f} {antes / depois:>6.1f}x")
+
+        totais = df['total_profissionais'].to_numpy()
+        antes = cronometrar(lambda: [_classificar_marcador(t) for t in totais])
+        depois = cronometrar(app.classificar_marcadores, totais)
+        print(f"{n:>8} {'classif.':>10} {antes:>14.2f} {depois:>13.2f} {antes / depois:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [400, 5000])
@@ -0,0 +1,213 @@
+"""
+Módulo de Matching de Cidades em Lote
+Associa nomes de cidades das planilhas aos municípios do IBGE de forma vetorizada
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+"""
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from typing import Dict, Optional, Tuple
+
+
+FUZZY_THRESHOLD = 85
+
+COLUNAS_MATCH = ['CIDADE_NORMALIZADA', 'municipio_idx', 'score_match', 'origem_match']
+
+
+def _casar_aliases(pendentes: pd.Series, aliases: Dict[str, Tuple[int, float, bool]],
+                   posicoes_ibge: pd.Series) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Resolve pelos aliases os nomes pendentes cujo município existe na referência.
+
+    Returns:
+        Tupla (matches com origem 'alias', nomes que continuam pendentes).
+    """
+    conhecidos = pendentes[pendentes.isin(list(aliases))]
+    idx_alias = conhecidos.map(lambda alias: aliases[alias][0]).map(posicoes_ibge)
+    validos = idx_alias.notna()
+
+    matches = pd.DataFrame({
+        'CIDADE_NORMALIZADA': conhecidos[validos],
+        'municipio_idx': idx_alias[validos],
+        'score_match': conhecidos[validos].map(lambda alias: aliases[alias][1]).astype(float),
+        'origem_match': 'alias'
+    })
+    return matches, pendentes[~pendentes.isin(conhecidos[validos])]
+
+
+def casar_cidades_em_lote(nomes: pd.Series, df_municipios: pd.DataFrame,
+                          threshold: int = FUZZY_THRESHOLD,
+                          aliases: Optional[Dict[str, Tuple[int, float, bool]]] = None) -> pd.DataFrame:
+    """
+    Associa uma coluna inteira de nomes de cidades aos municípios de referência.
+
+    Aliases fixados por um administrador são aplicados primeiro (corrigem até
+    um match exato); em seguida os matches exatos são resolvidos por hash join
+    e consulta-se o restante da tabela de aliases. Apenas os nomes únicos
+    restantes passam por uma única chamada de `process.cdist` (WRatio).
+
+    Args:
+        nomes: Série com os valores de CIDADE_NORMALIZADA.
+        df_municipios: DataFrame de municípios com a coluna 'nome_normalizado'.
+        threshold: Score mínimo de similaridade (0-100).
+        aliases: Mapa alias -> (codigo_ibge, score, fixado) já resolvido anteriormente.
+
+    Returns:
+        DataFrame com uma linha por nome único e as colunas
+        CIDADE_NORMALIZADA, municipio_idx (posição em df_municipios),
+        score_match e origem_match ('exato', 'alias' ou 'fuzzy').
+        Nomes sem correspondência não aparecem no resultado.
+    """
+    nomes_unicos = pd.Series(nomes.dropna().unique(), dtype=object)
+
+    if nomes_unicos.empty or df_municipios.empty:
+        return pd.DataFrame(columns=COLUNAS_MATCH)
+
+    referencia = df_municipios['nome_normalizado'].tolist()
+    partes = []
+    pendentes = nomes_unicos
+
+    # Aliases persistidos: alias -> codigo_ibge -> posição
+    usar_aliases = bool(aliases) and 'codigo_ibge' in df_municipios.columns
+    if usar_aliases:
+        posicoes_ibge = pd.Series(np.arange(len(referencia)), index=df_municipios['codigo_ibge'].to_numpy())
+        posicoes_ibge = posicoes_ibge[~posicoes_ibge.index.duplicated(keep='first')]
+
+        fixados = {alias: valor for alias, valor in aliases.items() if valor[2]}
+        if fixados:
+            matches, pendentes = _casar_aliases(pendentes, fixados, posicoes_ibge)
+            partes.append(matches)
+
+    # Hash join: nome normalizado -> posição (primeira ocorrência)
+    posicoes = pd.Series(np.arange(len(referencia)), index=referencia)
+    posicoes = posicoes[~posicoes.index.duplicated(keep='first')]
+
+    idx_exato = pendentes.map(posicoes)
+    partes.append(pd.DataFrame({
+        'CIDADE_NORMALIZADA': pendentes[idx_exato.notna()],
+        'municipio_idx': idx_exato[idx_exato.notna()],
+        'score_match': 100.0,
+        'origem_match': 'exato'
+    }))
+    pendentes = pendentes[idx_exato.isna()]
+
+    if usar_aliases and not pendentes.empty:
+        matches, pendentes = _casar_aliases(pendentes, aliases, posicoes_ibge)
+        partes.append(matches)
+
+    # Fuzzy matching apenas para os nomes que sobraram
+    pendentes = pendentes.tolist()
+
+    if pendentes:
+        scores = process.cdist(
+            pendentes,
+            referencia,
+            scorer=fuzz.WRatio,
+            dtype=np.uint8,
+            workers=-1
+        )
+        melhor_idx = scores.argmax(axis=1)
+        melhor_score = scores[np.arange(len(pendentes)), melhor_idx].astype(float)
+        aceitos = melhor_score >= threshold
+
+        fuzzy = pd.DataFrame({
+            'CIDADE_NORMALIZADA': np.asarray(pendentes, dtype=object)[aceitos],
+            'municipio_idx': melhor_idx[aceitos],
+            'score_match': melhor_score[aceitos],
+            'origem_match': 'fuzzy'
+        })
+        partes.append(fuzzy)
+
+    resultado = pd.concat(partes, ignore_index=True)
+    resultado['municipio_idx'] = resultado['municipio_idx'].astype(int)
+    return resultado[COLUNAS_MATCH]
+
+
+def aliases_por_uf(aliases: Optional[Dict[Tuple[int, str], Tuple[int, float, bool]]]
+                   ) -> Dict[int, Dict[str, Tuple[int, float, bool]]]:
+    """
+    Agrupa o mapa (codigo_uf, alias) -> (codigo_ibge, score, fixado) por UF.
+
+    Returns:
+        Dicionário codigo_uf -> {alias: (codigo_ibge, score, fixado)}, no formato
+        esperado por casar_cidades_em_lote.
+    """
+    agrupados: Dict[int, Dict[str, Tuple[int, float, bool]]] = {}
+    for (codigo_uf, alias), valor in (aliases or {}).items():
+        agrupados.setdefault(int(codigo_uf), {})[alias] = valor
+    return agrupados
+
+
+def anexar_municipios(df: pd.DataFrame, df_municipios: pd.DataFrame,
+                      threshold: int = FUZZY_THRESHOLD,
+                      aliases: Optional[Dict[Tuple[int, str], Tuple[int, float, bool]]] = None) -> pd.DataFrame:
+    """
+    Anexa nome oficial, coordenadas e score de match a um DataFrame de registros.
+
+    O matching é feito UF a UF: cada nome só é comparado com os municípios da
+    UF da própria linha, então o custo do fuzzy cresce com o tamanho de cada
+    estado e não com o total nacional.
+
+    Args:
+        df: DataFrame com as colunas CODIGO_UF e CIDADE_NORMALIZADA.
+        df_municipios: DataFrame de municípios com codigo_uf e coordenadas.
+        threshold: Score mínimo de similaridade (0-100).
+        aliases: Mapa (codigo_uf, alias) -> (codigo_ibge, score, fixado) já resolvido anteriormente.
+
+    Returns:
+        DataFrame apenas com as linhas que encontraram município, acrescido das
+        colunas cidade, latitude, longitude, codigo_ibge, score_match e
+        origem_match.
+    """
+    municipios = df_municipios.reset_index(drop=True)
+    posicoes_por_uf = {int(uf): posicoes for uf, posicoes in municipios.groupby('codigo_uf').indices.items()}
+    aliases_uf = aliases_por_uf(aliases)
+
+    partes = []
+    for codigo_uf, nomes in df.groupby('CODIGO_UF')['CIDADE_NORMALIZADA']:
+        posicoes = posicoes_por_uf.get(int(codigo_uf))
+        if posicoes is None:
+            continue
+
+        matches = casar_cidades_em_lote(nomes, municipios.iloc[posicoes], threshold,
+                                        aliases_uf.get(int(codigo_uf)))
+        # Posição dentro da UF -> posição em df_municipios
+        matches['municipio_idx'] = posicoes[matches['municipio_idx'].to_numpy(dtype=int)]
+        matches['CODIGO_UF'] = int(codigo_uf)
+        partes.append(matches)
+
+    if not partes:
+        return df.iloc[0:0].assign(cidade=None, latitude=None, longitude=None, codigo_ibge=None,
+                                   score_match=None, origem_match=None)
+
+    matches = pd.concat(partes, ignore_index=True)
+    info = municipios.loc[matches['municipio_idx'], ['nome', 'latitude', 'longitude', 'codigo_ibge']]
+    matches = pd.concat([matches, info.reset_index(drop=True)], axis=1)
+    matches = matches.rename(columns={'nome': 'cidade'}).drop(columns='municipio_idx')
+
+    return df.merge(matches, on=['CODIGO_UF', 'CIDADE_NORMALIZADA'], how='inner')
+
+
+def novos_aliases(df_match: pd.DataFrame) -> list:
+    """
+    Extrai os nomes resolvidos por fuzzy matching para persistência como aliases.
+
+    Args:
+        df_match: DataFrame retornado por anexar_municipios.
+
+    Returns:
+        Lista de tuplas (alias, codigo_ibge, score).
+    """
+    if df_match.empty or 'codigo_ibge' not in df_match.columns:
+        return []
+
+    # A mesma grafia pode existir em mais de uma UF: a chave é (UF, alias)
+    fuzzy = df_match.loc[
+        df_match['origem_match'] == 'fuzzy',
+        ['CODIGO_UF', 'CIDADE_NORMALIZADA', 'codigo_ibge', 'score_match']
+    ].drop_duplicates(['CODIGO_UF', 'CIDADE_NORMALIZADA'])
+
+    return list(fuzzy.drop(columns='CODIGO_UF').itertuples(index=False, name=None))
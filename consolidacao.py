@@ -0,0 +1,201 @@
+"""
+Módulo de Consolidação
+Associa os registros das planilhas aos municípios e soma as contagens por município.
+Usado pelo app (Streamlit) e pelo ETL offline (etl_consolidado.py)
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from city_matching import FUZZY_THRESHOLD, anexar_municipios
+from municipios_index import carregar_municipios_uf
+from normalizacao import normalizar_nomes
+from sheets_snapshot import DIRETORIO_SNAPSHOTS, carregar_snapshot, salvar_snapshot
+from ufs import sigla_uf
+
+
+# Incrementar sempre que as colunas do DataFrame consolidado mudarem
+VERSAO_CONSOLIDADO = 1
+
+# Nome do artefato gravado pelo ETL (ver sheets_snapshot)
+NOME_ARTEFATO = f"consolidado_v{VERSAO_CONSOLIDADO}"
+
+CAMINHO_RELATORIO = DIRETORIO_SNAPSHOTS / "relatorio_matching.csv"
+
+# Matches por fuzzy abaixo deste score entram no relatório para revisão
+LIMIAR_SCORE_BAIXO = 92
+
+COLUNAS_SOMADAS = [
+    'corretores_total', 'corretores_regulares', 'corretores_irregulares',
+    'imobiliarias_total', 'imobiliarias_regulares', 'imobiliarias_irregulares'
+]
+
+
+def preparar_municipios(codigos_uf: Iterable[int]) -> pd.DataFrame:
+    """
+    Carrega os municípios das UFs informadas (uma fatia do índice por UF)
+    e acrescenta a coluna nome_normalizado usada no matching.
+    """
+    df = pd.concat([carregar_municipios_uf(codigo) for codigo in codigos_uf], ignore_index=True)
+    df['nome_normalizado'] = normalizar_nomes(df['nome'])
+    return df
+
+
+def _agregar_por_municipio(df_match: pd.DataFrame, prefixo: str) -> pd.DataFrame:
+    """
+    Soma as contagens de um DataFrame já associado a municípios por codigo_ibge.
+
+    Args:
+        df_match: DataFrame retornado por anexar_municipios.
+        prefixo: Prefixo das colunas de saída ("corretores" ou "imobiliarias").
+
+    Returns:
+        DataFrame com uma linha por município.
+    """
+    return df_match.groupby('codigo_ibge', as_index=False, sort=False).agg(
+        cidade=('cidade', 'first'),
+        latitude=('latitude', 'first'),
+        longitude=('longitude', 'first'),
+        **{
+            f'{prefixo}_total': ('QUANTIDADE', 'sum'),
+            f'{prefixo}_regulares': ('REGULAR', 'sum'),
+            f'{prefixo}_irregulares': ('IRREGULAR', 'sum'),
+        }
+    )
+
+
+def consolidar(df_municipios: pd.DataFrame, df_corretores: pd.DataFrame,
+               df_imobiliarias: pd.DataFrame,
+               aliases: Optional[Dict[Tuple[int, str], Tuple[int, float, bool]]] = None,
+               threshold: int = FUZZY_THRESHOLD) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Consolida corretores e imobiliárias em um DataFrame por município.
+
+    O matching é restrito à UF de cada registro (ver anexar_municipios):
+    hash join para exatos, aliases persistidos e uma chamada cdist por UF
+    para o resto.
+
+    Args:
+        df_municipios: DataFrame de preparar_municipios (uma ou mais UFs).
+        df_corretores: Registros de corretores processados (CODIGO_UF, CIDADE_NORMALIZADA, ...).
+        df_imobiliarias: Registros de imobiliárias processados.
+        aliases: Mapa (codigo_uf, alias) -> (codigo_ibge, score, fixado) já resolvido anteriormente.
+        threshold: Score mínimo do fuzzy matching.
+
+    Returns:
+        Tupla (consolidado, corretores_match, imobiliarias_match); os dois
+        últimos são as linhas associadas a municípios, usadas para persistir
+        aliases e montar o relatório de matching.
+    """
+    corretores_match = anexar_municipios(df_corretores, df_municipios, threshold, aliases)
+    imobiliarias_match = anexar_municipios(df_imobiliarias, df_municipios, threshold, aliases)
+
+    # Somar por município (várias grafias podem resolver para a mesma cidade)
+    corretores = _agregar_por_municipio(corretores_match, 'corretores')
+    imobiliarias = _agregar_por_municipio(imobiliarias_match, 'imobiliarias')
+
+    # Outer join único em codigo_ibge, com zero para o lado ausente
+    df_consolidado = corretores.merge(
+        imobiliarias,
+        on='codigo_ibge',
+        how='outer',
+        suffixes=('', '_imob')
+    )
+
+    for col in ['cidade', 'latitude', 'longitude']:
+        df_consolidado[col] = df_consolidado[col].fillna(df_consolidado[f'{col}_imob'])
+    df_consolidado = df_consolidado.drop(columns=['cidade_imob', 'latitude_imob', 'longitude_imob'])
+
+    df_consolidado[COLUNAS_SOMADAS] = df_consolidado[COLUNAS_SOMADAS].fillna(0).astype(int)
+    df_consolidado['uf'] = (df_consolidado['codigo_ibge'] // 100000).map(sigla_uf)
+
+    # Calcular totais combinados
+    df_consolidado['total_profissionais'] = (
+        df_consolidado['corretores_total'] +
+        df_consolidado['imobiliarias_total']
+    )
+
+    # Ordenar por total de profissionais (decrescente)
+    df_consolidado = df_consolidado.sort_values('total_profissionais', ascending=False)
+
+    return df_consolidado.reset_index(drop=True), corretores_match, imobiliarias_match
+
+
+def relatorio_matching(registros: Dict[str, pd.DataFrame], matches: Dict[str, pd.DataFrame],
+                       limiar_score: float = LIMIAR_SCORE_BAIXO) -> pd.DataFrame:
+    """
+    Lista as cidades das planilhas sem correspondência ou associadas por
+    fuzzy com score baixo, para revisão (e eventual alias fixado no admin).
+
+    Args:
+        registros: Tipo ("corretores"/"imobiliarias") -> registros processados.
+        matches: Tipo -> DataFrame retornado por anexar_municipios.
+        limiar_score: Matches por fuzzy abaixo deste score são reportados.
+
+    Returns:
+        DataFrame com tipo, uf, CIDADE_NORMALIZADA, QUANTIDADE, situacao
+        ('sem_correspondencia' ou 'score_baixo'), cidade, codigo_ibge e
+        score_match, das maiores quantidades para as menores.
+    """
+    chaves = ['CODIGO_UF', 'CIDADE_NORMALIZADA']
+    partes = []
+
+    for tipo, df in registros.items():
+        df_match = matches[tipo]
+
+        associados = df.merge(
+            df_match[chaves + ['cidade', 'codigo_ibge', 'score_match', 'origem_match']],
+            on=chaves,
+            how='left'
+        )
+        sem_match = associados['codigo_ibge'].isna()
+        score_baixo = (associados['origem_match'] == 'fuzzy') & (associados['score_match'] < limiar_score)
+
+        reportar = associados[sem_match | score_baixo].copy()
+        reportar['situacao'] = 'score_baixo'
+        reportar.loc[reportar['codigo_ibge'].isna(), 'situacao'] = 'sem_correspondencia'
+        reportar['tipo'] = tipo
+        partes.append(reportar)
+
+    colunas = ['tipo', 'uf', 'CIDADE_NORMALIZADA', 'QUANTIDADE', 'situacao',
+               'cidade', 'codigo_ibge', 'score_match']
+    relatorio = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=chaves)
+    if relatorio.empty:
+        return pd.DataFrame(columns=colunas)
+
+    relatorio['uf'] = relatorio['CODIGO_UF'].map(sigla_uf)
+    relatorio['codigo_ibge'] = relatorio['codigo_ibge'].astype('Int64')
+    return relatorio.sort_values('QUANTIDADE', ascending=False, kind='stable')[colunas].reset_index(drop=True)
+
+
+def salvar_artefato(df_consolidado: pd.DataFrame, relatorio: pd.DataFrame) -> bool:
+    """
+    Grava o DataFrame consolidado (artefato lido pelo app) e o relatório de
+    matching (CSV) em dados/cache.
+
+    Returns:
+        True se o consolidado foi gravado.
+    """
+    if not salvar_snapshot(NOME_ARTEFATO, df_consolidado):
+        return False
+
+    try:
+        relatorio.to_csv(CAMINHO_RELATORIO, index=False, encoding='utf-8-sig')
+    except OSError:
+        pass
+    return True
+
+
+def carregar_artefato() -> Optional[Tuple[pd.DataFrame, datetime]]:
+    """
+    Lê o consolidado gravado pelo ETL.
+
+    Returns:
+        Tupla (DataFrame, momento da geração em UTC) ou None se não houver artefato.
+    """
+    return carregar_snapshot(NOME_ARTEFATO)
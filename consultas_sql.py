@@ -0,0 +1,151 @@
+"""
+Camada de Consultas SQL
+Compila cada instrução uma única vez por dialeto e a executa como prepared
+statement no PostgreSQL (cache de statements da conexão no SQLite)
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+
+As instruções são escritas uma única vez no dialeto canônico: parâmetros
+com '?' e ILIKE para buscas sem diferenciar maiúsculas. Não use '?' dentro
+de literais de texto.
+"""
+
+import hashlib
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Set
+
+
+# Instruções aceitas por PREPARE no PostgreSQL (DDL é executado diretamente)
+_PREPARAVEIS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'VALUES')
+
+# Linhas por ida ao servidor em operações em lote no PostgreSQL
+TAMANHO_LOTE = 500
+
+
+class InstrucaoCompilada(NamedTuple):
+    """Instrução pronta para um dialeto"""
+    sql: str                        # texto executado (com %s/? ou EXECUTE nome (...))
+    nome: Optional[str] = None      # nome do prepared statement (PostgreSQL)
+    preparar: Optional[str] = None  # PREPARE nome AS ... (PostgreSQL)
+
+
+class Consultas:
+    """
+    Compila e executa instruções SQL para SQLite ou PostgreSQL.
+
+    No PostgreSQL cada instrução vira um prepared statement por conexão
+    (PREPARE na primeira execução, EXECUTE nas demais). No SQLite o texto
+    compilado é sempre o mesmo objeto, aproveitando o cache de statements
+    do sqlite3 (cached_statements).
+    """
+
+    def __init__(self, db_type: str, preparar: bool = False):
+        """
+        Args:
+            db_type: 'sqlite' ou 'postgres'.
+            preparar: Usar prepared statements no PostgreSQL (desligar atrás
+                de poolers em modo transação, como a porta 6543 do Supabase).
+        """
+        self.db_type = db_type
+        self.preparar = preparar and db_type == 'postgres'
+        self._compiladas: Dict[str, InstrucaoCompilada] = {}
+        self._preparadas: Dict[int, Set[str]] = {}  # id(conn) -> nomes preparados
+        self._lock = threading.Lock()
+
+    def compilar(self, sql: str) -> InstrucaoCompilada:
+        """Compila (uma única vez) uma instrução canônica para o dialeto"""
+        compilada = self._compiladas.get(sql)
+        if compilada is not None:
+            return compilada
+
+        texto = ' '.join(sql.split())
+        partes = texto.split('?')
+        n_params = len(partes) - 1
+
+        if self.db_type == 'sqlite':
+            compilada = InstrucaoCompilada(texto.replace(' ILIKE ', ' LIKE '))
+        elif self.preparar and texto.upper().startswith(_PREPARAVEIS):
+            nome = 'q_' + hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+            corpo = partes[0] + ''.join(f'${i}{parte}' for i, parte in enumerate(partes[1:], start=1))
+            argumentos = f" ({', '.join(['%s'] * n_params)})" if n_params else ''
+            compilada = InstrucaoCompilada(f"EXECUTE {nome}{argumentos}", nome, f"PREPARE {nome} AS {corpo}")
+        else:
+            compilada = InstrucaoCompilada('%s'.join(parte.replace('%', '%%') for parte in partes))
+
+        with self._lock:
+            self._compiladas[sql] = compilada
+        return compilada
+
+    def _garantir_preparada(self, cursor, compilada: InstrucaoCompilada):
+        """Executa o PREPARE na conexão do cursor, se ainda não foi feito"""
+        conn_id = id(cursor.connection)
+        preparadas = self._preparadas.get(conn_id)
+
+        if preparadas is None:
+            # Conexão nova ou estado desconhecido (após rollback): sincronizar com o servidor
+            cursor.execute("SELECT name FROM pg_prepared_statements")
+            preparadas = {row[0] for row in cursor.fetchall()}
+            self._preparadas[conn_id] = preparadas
+
+        if compilada.nome not in preparadas:
+            cursor.execute(compilada.preparar)
+            preparadas.add(compilada.nome)
+
+    def executar(self, cursor, sql: str, params: Sequence = ()):
+        """Executa uma instrução canônica com os parâmetros informados"""
+        compilada = self.compilar(sql)
+        if compilada.nome:
+            self._garantir_preparada(cursor, compilada)
+        cursor.execute(compilada.sql, tuple(params))
+        return cursor
+
+    def executar_muitos(self, cursor, sql: str, lista_params: Iterable[Sequence]) -> None:
+        """
+        Executa a mesma instrução para vários conjuntos de parâmetros.
+        No SQLite usa executemany; no PostgreSQL, execute_batch (várias
+        instruções por ida ao servidor, em páginas de TAMANHO_LOTE).
+        """
+        compilada = self.compilar(sql)
+
+        if self.db_type == 'sqlite':
+            cursor.executemany(compilada.sql, lista_params)
+            return
+
+        from psycopg2.extras import execute_batch
+
+        if compilada.nome:
+            self._garantir_preparada(cursor, compilada)
+        execute_batch(cursor, compilada.sql, [tuple(params) for params in lista_params], page_size=TAMANHO_LOTE)
+
+    def inserir_muitos(self, cursor, sql: str, lista_params: Iterable[Sequence]) -> int:
+        """
+        Executa um INSERT para vários conjuntos de parâmetros e retorna quantas
+        linhas esta chamada inseriu (linhas ignoradas por ON CONFLICT DO NOTHING
+        não contam). Só o grupo VALUES (?, ...) pode ter parâmetros, sem
+        parênteses internos.
+        No SQLite usa executemany (rowcount soma as linhas inseridas); no
+        PostgreSQL, execute_values com RETURNING (várias linhas por instrução,
+        em páginas de TAMANHO_LOTE), sem prepared statement.
+        """
+        if self.db_type == 'sqlite':
+            cursor.executemany(self.compilar(sql).sql, lista_params)
+            return cursor.rowcount
+
+        from psycopg2.extras import execute_values
+
+        texto = ' '.join(sql.split())
+        inicio = texto.upper().index('VALUES (') + len('VALUES ')
+        fim = texto.index(')', inicio) + 1
+        n_params = texto.count('?', inicio, fim)
+        comando = texto[:inicio].replace('%', '%%') + '%s' + texto[fim:].replace('%', '%%') + ' RETURNING 1'
+
+        inseridas = execute_values(
+            cursor, comando, [tuple(params) for params in lista_params],
+            template='(' + ', '.join(['%s'] * n_params) + ')', page_size=TAMANHO_LOTE, fetch=True
+        )
+        return len(inseridas)
+
+    def esquecer(self, conn):
+        """Descarta o que se sabe sobre os prepared statements da conexão"""
+        self._preparadas.pop(id(conn), None)
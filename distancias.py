@@ -0,0 +1,207 @@
+"""
+Matriz de Distâncias Pré-calculada
+Distâncias entre todos os pares de municípios de uma UF (float32, memory-mapped)
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+
+Uso:
+    python distancias.py          # (re)constrói a matriz da Bahia
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from municipios_index import CAMINHO_JSON, carregar_municipios_uf
+from rotas import matriz_distancias
+
+
+DIRETORIO_MATRIZES = Path("dados")
+
+# Distâncias rodoviárias opcionais (codigo_origem, codigo_destino, km) que
+# substituem a linha reta para o par, nos dois sentidos
+CAMINHO_DISTANCIAS_RODOVIARIAS = Path("dados/distancias_rodoviarias.csv")
+
+# Incrementar sempre que o layout da matriz mudar
+VERSAO_MATRIZ = 1
+
+
+def _caminhos(codigo_uf: int):
+    """Caminhos do array (.npy) e dos metadados (.json) da matriz de uma UF"""
+    base = DIRETORIO_MATRIZES / f"distancias_{int(codigo_uf)}"
+    return base.with_suffix('.npy'), base.with_suffix('.json')
+
+
+def _assinatura(caminho: Path) -> Optional[Dict]:
+    """Tamanho e mtime de um arquivo de origem (None se não existir)"""
+    try:
+        stat = caminho.stat()
+    except FileNotFoundError:
+        return None
+    return {'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _aplicar_distancias_rodoviarias(matriz: np.ndarray, posicao: Dict[int, int],
+                                    caminho_csv: Path) -> int:
+    """
+    Sobrescreve na matriz os pares presentes no CSV de distâncias rodoviárias.
+
+    Returns:
+        Quantidade de pares aplicados (pares com municípios de outra UF são ignorados).
+    """
+    if not caminho_csv.exists():
+        return 0
+
+    df = pd.read_csv(caminho_csv, dtype={'codigo_origem': int, 'codigo_destino': int, 'km': float})
+    origem = df['codigo_origem'].map(posicao)
+    destino = df['codigo_destino'].map(posicao)
+    validos = origem.notna() & destino.notna()
+
+    i = origem[validos].astype(int).to_numpy()
+    j = destino[validos].astype(int).to_numpy()
+    km = df.loc[validos, 'km'].to_numpy(dtype=np.float32)
+
+    matriz[i, j] = km
+    matriz[j, i] = km
+    return int(validos.sum())
+
+
+def construir_matriz(codigo_uf: int,
+                     caminho_json: Path = CAMINHO_JSON,
+                     caminho_csv: Path = CAMINHO_DISTANCIAS_RODOVIARIAS) -> Dict:
+    """
+    Calcula e grava a matriz de distâncias (km) entre os municípios de uma UF.
+
+    As linhas/colunas seguem a ordem de codigo_ibge do índice de municípios.
+    Pares presentes no CSV de distâncias rodoviárias substituem a linha reta.
+
+    Args:
+        codigo_uf: Código IBGE da UF (ex.: 29 para Bahia).
+        caminho_json: JSON de municípios (origem das coordenadas).
+        caminho_csv: CSV opcional de distâncias rodoviárias.
+
+    Returns:
+        Metadados gravados junto da matriz.
+    """
+    municipios = carregar_municipios_uf(codigo_uf, caminho_json=caminho_json)
+    codigos = municipios['codigo_ibge'].astype(int).tolist()
+    posicao = {codigo: i for i, codigo in enumerate(codigos)}
+
+    matriz = matriz_distancias(municipios['latitude'], municipios['longitude']).astype(np.float32)
+    pares_rodoviarios = _aplicar_distancias_rodoviarias(matriz, posicao, caminho_csv)
+
+    meta = {
+        'versao': VERSAO_MATRIZ,
+        'codigo_uf': int(codigo_uf),
+        'fonte': _assinatura(caminho_json),
+        'rodoviarias': _assinatura(caminho_csv),
+        'pares_rodoviarios': pares_rodoviarios,
+        'codigos': codigos
+    }
+
+    # Escrita atômica: arquivos temporários + os.replace
+    caminho_matriz, caminho_meta = _caminhos(codigo_uf)
+    tmp_matriz = caminho_matriz.with_name(caminho_matriz.name + '.tmp')
+    tmp_meta = caminho_meta.with_name(caminho_meta.name + '.tmp')
+    with open(tmp_matriz, 'wb') as f:
+        np.save(f, matriz)
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_matriz, caminho_matriz)
+    os.replace(tmp_meta, caminho_meta)
+
+    return meta
+
+
+class MatrizDistancias:
+    """
+    Consulta de distâncias entre municípios a partir da matriz pré-calculada.
+    Buscas por raio e vizinhos mais próximos ficam em indice_espacial.IndiceEspacial.
+    """
+
+    def __init__(self, matriz: np.ndarray, codigos: Iterable[int]):
+        """
+        Args:
+            matriz: Matriz n x n (km), tipicamente memory-mapped.
+            codigos: codigo_ibge de cada linha/coluna, na mesma ordem.
+        """
+        self.matriz = matriz
+        self.codigos = np.asarray(list(codigos), dtype=np.int64)
+        self.posicao = {int(codigo): i for i, codigo in enumerate(self.codigos)}
+
+    def __contains__(self, codigo_ibge) -> bool:
+        return int(codigo_ibge) in self.posicao
+
+    def distancia(self, origem: int, destino: int) -> float:
+        """Distância (km) entre dois municípios"""
+        return float(self.matriz[self.posicao[int(origem)], self.posicao[int(destino)]])
+
+    def submatriz(self, codigos: Iterable[int]) -> np.ndarray:
+        """
+        Matriz de distâncias (float64) entre os municípios informados, na ordem dada.
+        Útil para o planejamento de rotas.
+        """
+        indices = np.array([self.posicao[int(codigo)] for codigo in codigos], dtype=np.intp)
+        return np.asarray(self.matriz[np.ix_(indices, indices)], dtype=float)
+
+
+def _ler_meta(codigo_uf: int, caminho_json: Path, caminho_csv: Path) -> Optional[Dict]:
+    """Retorna os metadados se a matriz estiver em dia com as fontes, senão None"""
+    _, caminho_meta = _caminhos(codigo_uf)
+    try:
+        with open(caminho_meta, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if meta.get('versao') != VERSAO_MATRIZ:
+        return None
+    if meta.get('fonte') != _assinatura(caminho_json):
+        return None
+    if meta.get('rodoviarias') != _assinatura(caminho_csv):
+        return None
+    return meta
+
+
+def carregar_matriz(codigo_uf: int,
+                    caminho_json: Path = CAMINHO_JSON,
+                    caminho_csv: Path = CAMINHO_DISTANCIAS_RODOVIARIAS) -> MatrizDistancias:
+    """
+    Abre a matriz de distâncias de uma UF (memory-mapped).
+
+    A matriz é reconstruída se não existir ou se o JSON de municípios ou o CSV
+    de distâncias rodoviárias tiverem mudado. Se não for possível gravá-la, é
+    calculada em memória.
+
+    Args:
+        codigo_uf: Código IBGE da UF (ex.: 29 para Bahia).
+
+    Returns:
+        MatrizDistancias pronta para consulta.
+    """
+    caminho_matriz, _ = _caminhos(codigo_uf)
+    meta = _ler_meta(codigo_uf, caminho_json, caminho_csv)
+
+    if meta is None or not caminho_matriz.exists():
+        try:
+            meta = construir_matriz(codigo_uf, caminho_json, caminho_csv)
+        except OSError:
+            municipios = carregar_municipios_uf(codigo_uf, caminho_json=caminho_json)
+            codigos = municipios['codigo_ibge'].astype(int).tolist()
+            matriz = matriz_distancias(municipios['latitude'], municipios['longitude']).astype(np.float32)
+            _aplicar_distancias_rodoviarias(matriz, {c: i for i, c in enumerate(codigos)}, caminho_csv)
+            return MatrizDistancias(matriz, codigos)
+
+    return MatrizDistancias(np.load(caminho_matriz, mmap_mode='r'), meta['codigos'])
+
+
+if __name__ == "__main__":
+    print("⏳ Construindo matriz de distâncias da Bahia...")
+    meta = construir_matriz(29)
+    n = len(meta['codigos'])
+    print(f"✅ Matriz {n}x{n} gravada ({meta['pares_rodoviarios']} pares rodoviários)")
@@ -0,0 +1,124 @@
+# 🔄 Script Auxiliar - ETL do Consolidado
+# Pré-calcula o DataFrame consolidado (planilhas x municípios) fora do app.
+# O app passa a apenas ler o artefato gravado em dados/cache, sem consultar
+# o Google Sheets nem executar o fuzzy matching a cada sessão.
+#
+# Uso:
+#     python etl_consolidado.py            # Google Sheets (configuração do .env)
+#     python etl_consolidado.py --excel    # arquivos dados/Corretores.xlsx e dados/Imobiliárias.xlsx
+
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from city_matching import novos_aliases
+from consolidacao import (
+    CAMINHO_RELATORIO, LIMIAR_SCORE_BAIXO, NOME_ARTEFATO,
+    consolidar, preparar_municipios, relatorio_matching, salvar_artefato
+)
+from google_sheets import get_sheets_loader
+from ufs import UFS
+from user_database import get_city_alias_map, get_user_database
+
+
+ARQUIVOS_EXCEL = {
+    "Corretores": Path("dados/Corretores.xlsx"),
+    "Imobiliárias": Path("dados/Imobiliárias.xlsx"),
+}
+
+
+def carregar_fontes(usar_excel):
+    """
+    Carrega e processa as planilhas de corretores e imobiliárias.
+
+    Args:
+        usar_excel: Se True, lê os arquivos Excel locais em vez do Google Sheets.
+
+    Returns:
+        Tupla (df_corretores, df_imobiliarias) processados por _processar_dados.
+    """
+    loader = get_sheets_loader()
+    # Sem interface: os motivos das falhas (credenciais, API, tempo limite) vão para o terminal
+    loader.notificar = lambda nivel, mensagem: print(f"   {mensagem}")
+
+    if not usar_excel:
+        return loader.carregar_todos()
+
+    resultados = []
+    for nome_tipo, caminho in ARQUIVOS_EXCEL.items():
+        if not caminho.exists():
+            print(f"❌ Arquivo não encontrado: {caminho}")
+            resultados.append(pd.DataFrame())
+            continue
+        resultados.append(loader._processar_dados(pd.read_excel(caminho), nome_tipo))
+
+    return tuple(resultados)
+
+
+def executar(usar_excel=False):
+    """
+    Executa o ETL: carrega as fontes, consolida, persiste os aliases novos e
+    grava o artefato e o relatório de matching.
+
+    Returns:
+        Código de saída (0 em caso de sucesso).
+    """
+    inicio = time.perf_counter()
+
+    print("⏳ Carregando municípios...")
+    df_municipios = preparar_municipios(UFS)
+
+    print(f"⏳ Carregando planilhas ({'Excel' if usar_excel else 'Google Sheets'})...")
+    df_corretores, df_imobiliarias = carregar_fontes(usar_excel)
+
+    if df_corretores.empty or df_imobiliarias.empty:
+        print("❌ Não foi possível carregar corretores e imobiliárias!")
+        return 1
+
+    print("⏳ Consolidando...")
+    df_consolidado, corretores_match, imobiliarias_match = consolidar(
+        df_municipios, df_corretores, df_imobiliarias, get_city_alias_map()
+    )
+
+    # Persistir as grafias resolvidas por fuzzy matching
+    aliases_novos = novos_aliases(pd.concat([corretores_match, imobiliarias_match]))
+    if aliases_novos:
+        get_user_database().save_city_aliases(aliases_novos)
+
+    relatorio = relatorio_matching(
+        {"corretores": df_corretores, "imobiliarias": df_imobiliarias},
+        {"corretores": corretores_match, "imobiliarias": imobiliarias_match}
+    )
+
+    if not salvar_artefato(df_consolidado, relatorio):
+        print("❌ Erro ao gravar o consolidado em dados/cache!")
+        return 1
+
+    sem_correspondencia = (relatorio['situacao'] == 'sem_correspondencia').sum()
+    score_baixo = (relatorio['situacao'] == 'score_baixo').sum()
+
+    print()
+    print("✅ Consolidado gerado com sucesso!")
+    print()
+    print(f"   Municípios com dados:      {len(df_consolidado)}")
+    print(f"   Total de profissionais:    {int(df_consolidado['total_profissionais'].sum())}")
+    print(f"   Aliases novos:             {len(aliases_novos)}")
+    print(f"   Sem correspondência:       {sem_correspondencia}")
+    print(f"   Score abaixo de {LIMIAR_SCORE_BAIXO}:       {score_baixo}")
+    print(f"   Tempo:                     {time.perf_counter() - inicio:.1f} s")
+    print()
+    print(f"📦 Artefato: {NOME_ARTEFATO} (dados/cache)")
+    print(f"📝 Relatório de matching: {CAMINHO_RELATORIO}")
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("🔄 ETL DO CONSOLIDADO - CRECI Itinerante")
+    print("=" * 60)
+    print()
+
+    sys.exit(executar(usar_excel="--excel" in sys.argv[1:]))
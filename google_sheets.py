@@ -9,17 +9,62 @@ Data: Janeiro 2026
 import streamlit as st
 import pandas as pd
 import gspread
+from gspread.utils import numericise_all, rowcol_to_a1
 from google.oauth2 import service_account
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import requests
+import threading
 import time
 import json
+import logging
+from normalizacao import normalizar_nomes
+from ufs import codigos_uf
+from sheets_snapshot import salvar_snapshot
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def notificar_streamlit(nivel: str, mensagem: str):
+    """
+    Exibe uma mensagem do loader na interface do Streamlit.
+    
+    Args:
+        nivel: 'erro', 'aviso', 'info' ou 'sucesso' (este na sidebar).
+        mensagem: Texto já formatado.
+    """
+    exibir = {
+        'erro': st.error,
+        'aviso': st.warning,
+        'info': st.info,
+        'sucesso': st.sidebar.success
+    }[nivel]
+    exibir(mensagem)
+
+
+def notificar_log(nivel: str, mensagem: str):
+    """
+    Registra uma mensagem do loader no log (threads sem contexto do Streamlit,
+    como a atualização em segundo plano, onde st.* seria descartado).
+    
+    Args:
+        nivel: 'erro', 'aviso', 'info' ou 'sucesso'.
+        mensagem: Texto já formatado.
+    """
+    nivel_log = {
+        'erro': logging.ERROR,
+        'aviso': logging.WARNING,
+        'info': logging.INFO,
+        'sucesso': logging.INFO
+    }[nivel]
+    logger.log(nivel_log, mensagem)
+
 
 class GoogleSheetsLoader:
     """
@@ -44,6 +89,7 @@ class GoogleSheetsLoader:
             self.sheet_name_corretores = st.secrets.get('SHEET_NAME_CORRETORES', 'Corretores')
             self.sheet_name_imobiliarias = st.secrets.get('SHEET_NAME_IMOBILIARIAS', 'Imobiliárias')
             self.timeout = int(st.secrets.get('SHEETS_TIMEOUT', '30'))
+            self.append_only = str(st.secrets.get('SHEETS_APPEND_ONLY', 'false')).lower() == 'true'
         else:
             # Fallback: variáveis de ambiente locais
             self.credentials_file = os.getenv('GOOGLE_CREDENTIALS_FILE', 'google_credentials.json')
@@ -52,9 +98,28 @@ class GoogleSheetsLoader:
             self.sheet_name_corretores = os.getenv('SHEET_NAME_CORRETORES', 'Corretores')
             self.sheet_name_imobiliarias = os.getenv('SHEET_NAME_IMOBILIARIAS', 'Imobiliárias')
             self.timeout = int(os.getenv('SHEETS_TIMEOUT', '30'))
+            self.append_only = os.getenv('SHEETS_APPEND_ONLY', 'false').lower() == 'true'
         
         self.client = None
         self._authenticated = False
+        
+        # Destino das mensagens de erro/aviso: a interface do Streamlit por padrão;
+        # scripts sem interface (ex.: etl_consolidado.py) trocam por print.
+        # A thread de atualização em segundo plano usa notificar_log (por thread)
+        self._notificacao_thread = threading.local()
+        self.notificar = notificar_streamlit
+        
+        # Snapshots locais para sincronização incremental
+        # (sheet_id, worksheet) -> {modificado_em, cabecalho, registros}
+        self._snapshots: Dict[Tuple[str, str], Dict] = {}
+        # data_type -> versão da última planilha carregada
+        self._versoes: Dict[str, Optional[Tuple]] = {}
+        # data_type -> (versão, DataFrame processado)
+        self._processados: Dict[str, Tuple[Tuple, pd.DataFrame]] = {}
+        
+        # Atualização dos snapshots em disco em segundo plano
+        self._lock_atualizacao = threading.Lock()
+        self._thread_atualizacao: Optional[threading.Thread] = None
     
     
     def _get_credentials_dict(self) -> Optional[Dict]:
@@ -85,7 +150,7 @@ class GoogleSheetsLoader:
             return None
             
         except Exception as e:
-            st.error(f"❌ Erro ao carregar credenciais: {str(e)}")
+            self.notificar('erro', f"❌ Erro ao carregar credenciais: {str(e)}")
             return None
     
     
@@ -102,8 +167,8 @@ class GoogleSheetsLoader:
             credentials_dict = self._get_credentials_dict()
             
             if not credentials_dict:
-                st.error("❌ Credenciais não encontradas!")
-                st.info("💡 Local: adicione google_credentials.json | Cloud: configure Streamlit Secrets")
+                self.notificar('erro', "❌ Credenciais não encontradas!")
+                self.notificar('info', "💡 Local: adicione google_credentials.json | Cloud: configure Streamlit Secrets")
                 return False
             
             # Definir o escopo de acesso
@@ -119,12 +184,15 @@ class GoogleSheetsLoader:
             )
             
             self.client = gspread.authorize(credentials)
+            
+            # Aplicar SHEETS_TIMEOUT a cada requisição HTTP do cliente
+            self.client.set_timeout(self.timeout)
             self._authenticated = True
             
             return True
             
         except Exception as e:
-            st.error(f"❌ Erro ao autenticar com Google Sheets: {str(e)}")
+            self.notificar('erro', f"❌ Erro ao autenticar com Google Sheets: {str(e)}")
             return False
     
     
@@ -148,104 +216,304 @@ class GoogleSheetsLoader:
             return None
     
     
-    def load_sheet_data(self, sheet_url: str, worksheet_name: str, data_type: str) -> pd.DataFrame:
+    def _baixar_registros(self, sheet_url: str, worksheet_name: str) -> Tuple[List[Dict], Optional[Tuple]]:
         """
-        Carrega dados de uma planilha do Google Sheets.
+        Baixa os registros brutos de uma worksheet (sem chamadas de UI).
+        Seguro para execução em threads de trabalho.
+        
+        Antes de baixar, consulta o modifiedTime da planilha na Drive API: se não
+        mudou desde o último download, devolve o snapshot local sem abrir a
+        planilha. Com SHEETS_APPEND_ONLY=true, apenas as linhas novas são baixadas.
         
         Args:
             sheet_url: URL da planilha do Google Sheets.
             worksheet_name: Nome da aba/worksheet dentro da planilha.
-            data_type: Tipo de dado (para mensagens de log).
         
         Returns:
-            DataFrame com os dados ou DataFrame vazio em caso de erro.
+            Tupla (registros, versão). A versão identifica o conteúdo baixado
+            e é None quando o modifiedTime não pôde ser obtido.
+        
+        Raises:
+            ValueError: Se a URL da planilha for inválida.
         """
+        sheet_id = self._extract_sheet_id(sheet_url)
+        
+        if not sheet_id:
+            raise ValueError(f"URL inválida: {sheet_url}")
+        
+        chave = (sheet_id, worksheet_name)
+        snapshot = self._snapshots.get(chave)
+        
         try:
-            # Autenticar se ainda não foi feito
-            if not self._authenticated:
-                if not self.authenticate():
-                    return pd.DataFrame()
-            
-            # Extrair ID da planilha
-            sheet_id = self._extract_sheet_id(sheet_url)
-            
-            if not sheet_id:
-                st.error(f"❌ URL inválida para {data_type}: {sheet_url}")
-                return pd.DataFrame()
+            modificado_em = self.client.get_file_drive_metadata(sheet_id).get('modifiedTime')
+        except Exception:
+            modificado_em = None
+        
+        # Nada mudou desde o último download
+        if snapshot and modificado_em and snapshot['modificado_em'] == modificado_em:
+            return snapshot['registros'], (sheet_id, worksheet_name, modificado_em)
+        
+        spreadsheet = self.client.open_by_key(sheet_id)
+        
+        # Tentar abrir a worksheet específica ou a primeira
+        try:
+            worksheet = spreadsheet.worksheet(worksheet_name)
+        except gspread.WorksheetNotFound:
+            worksheet = spreadsheet.get_worksheet(0)
+        
+        registros = None
+        cabecalho = None
+        
+        if snapshot and self.append_only:
+            registros, cabecalho = self._baixar_linhas_novas(worksheet, snapshot)
+        
+        if registros is None:
+            registros = worksheet.get_all_records()
+            cabecalho = list(registros[0].keys()) if registros else []
+        
+        if modificado_em:
+            self._snapshots[chave] = {
+                'modificado_em': modificado_em,
+                'cabecalho': cabecalho,
+                'registros': registros
+            }
+            return registros, (sheet_id, worksheet_name, modificado_em)
+        
+        return registros, None
+    
+    
+    def _baixar_linhas_novas(self, worksheet, snapshot: Dict) -> Tuple[Optional[List[Dict]], Optional[List]]:
+        """
+        Baixa apenas as linhas adicionadas após o snapshot (planilhas append-only).
+        
+        Args:
+            worksheet: Worksheet já aberta.
+            snapshot: Snapshot anterior da mesma worksheet.
+        
+        Returns:
+            Tupla (registros, cabeçalho), ou (None, None) se o cabeçalho mudou
+            e for necessário um download completo.
+        """
+        cabecalho = worksheet.row_values(1)
+        
+        if not snapshot['cabecalho'] or cabecalho != snapshot['cabecalho']:
+            return None, None
+        
+        # Linha 1 é o cabeçalho; os registros começam na linha 2
+        primeira_nova = len(snapshot['registros']) + 2
+        ultima_coluna = rowcol_to_a1(1, len(cabecalho)).rstrip('0123456789')
+        linhas = worksheet.get(f"A{primeira_nova}:{ultima_coluna}")
+        
+        novos = [
+            dict(zip(cabecalho, numericise_all(linha + [''] * (len(cabecalho) - len(linha)))))
+            for linha in linhas
+        ]
+        
+        return snapshot['registros'] + novos, cabecalho
+    
+    
+    def _registros_para_dataframe(self, data: List[Dict], data_type: str) -> pd.DataFrame:
+        """
+        Converte os registros baixados em DataFrame e informa o resultado na sidebar.
+        
+        Args:
+            data: Registros retornados por _baixar_registros.
+            data_type: Tipo de dado (para mensagens de log).
+        
+        Returns:
+            DataFrame com os dados ou DataFrame vazio se não houver registros.
+        """
+        if not data:
+            self.notificar('aviso', f"⚠️ Nenhum dado encontrado em {data_type}")
+            return pd.DataFrame()
+        
+        df = pd.DataFrame(data)
+        
+        self.notificar('sucesso', f"✅ {len(df)} registros de {data_type} carregados do Google Sheets")
+        
+        return df
+    
+    
+    def _reportar_erro(self, erro: Exception, data_type: str):
+        """Exibe a mensagem de erro adequada para uma falha de carregamento"""
+        if isinstance(erro, gspread.exceptions.APIError):
+            self.notificar('erro', f"❌ Erro na API do Google Sheets para {data_type}: {str(erro)}")
+            self.notificar('info', "💡 Verifique se a Service Account tem permissão de acesso à planilha.")
+        elif isinstance(erro, ValueError):
+            self.notificar('erro', f"❌ {data_type}: {str(erro)}")
+        elif isinstance(erro, (TimeoutError, FuturesTimeoutError, requests.exceptions.Timeout)):
+            self.notificar('erro', f"❌ Tempo limite ({self.timeout}s) excedido ao carregar {data_type}")
+        else:
+            self.notificar('erro', f"❌ Erro ao carregar {data_type}: {str(erro)}")
+    
+    
+    def load_sheets_concurrently(self, fontes: Dict[str, Tuple[str, str]]) -> Dict[str, pd.DataFrame]:
+        """
+        Carrega várias planilhas ao mesmo tempo, compartilhando o cliente autenticado.
+        
+        Os downloads rodam em um pool de threads; mensagens de UI são emitidas
+        apenas na thread principal. Cada download respeita SHEETS_TIMEOUT.
+        
+        Args:
+            fontes: Dicionário data_type -> (sheet_url, worksheet_name).
+        
+        Returns:
+            Dicionário data_type -> DataFrame (vazio em caso de erro).
+        """
+        resultados = {data_type: pd.DataFrame() for data_type in fontes}
+        
+        # Autenticar uma única vez, antes de disparar as threads
+        if not self._authenticated:
+            if not self.authenticate():
+                return resultados
+        
+        with st.spinner(f"📥 Carregando {', '.join(fontes)} do Google Sheets..."):
+            executor = ThreadPoolExecutor(max_workers=len(fontes))
+            futures = {
+                data_type: executor.submit(self._baixar_registros, url, worksheet)
+                for data_type, (url, worksheet) in fontes.items()
+            }
             
-            # Abrir a planilha
-            with st.spinner(f"📥 Carregando dados de {data_type} do Google Sheets..."):
-                spreadsheet = self.client.open_by_key(sheet_id)
-                
-                # Tentar abrir a worksheet específica ou a primeira
+            prazo = time.monotonic() + self.timeout
+            for data_type, future in futures.items():
                 try:
-                    worksheet = spreadsheet.worksheet(worksheet_name)
-                except gspread.WorksheetNotFound:
-                    worksheet = spreadsheet.get_worksheet(0)
-                
-                # Carregar todos os dados
-                data = worksheet.get_all_records()
-                
-                if not data:
-                    st.warning(f"⚠️ Nenhum dado encontrado em {data_type}")
-                    return pd.DataFrame()
-                
-                df = pd.DataFrame(data)
-                
-                st.sidebar.success(f"✅ {len(df)} registros de {data_type} carregados do Google Sheets")
-                
-                return df
-                
-        except gspread.exceptions.APIError as e:
-            st.error(f"❌ Erro na API do Google Sheets para {data_type}: {str(e)}")
-            st.info("💡 Verifique se a Service Account tem permissão de acesso à planilha.")
-            return pd.DataFrame()
+                    data, self._versoes[data_type] = future.result(timeout=max(0, prazo - time.monotonic()))
+                    resultados[data_type] = self._registros_para_dataframe(data, data_type)
+                except Exception as e:
+                    self._versoes[data_type] = None
+                    self._reportar_erro(e, data_type)
             
-        except Exception as e:
-            st.error(f"❌ Erro ao carregar {data_type}: {str(e)}")
-            return pd.DataFrame()
+            # Não bloquear a execução esperando downloads que excederam o prazo
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return resultados
     
     
     @st.cache_data(ttl=300)  # Cache por 5 minutos
-    def carregar_corretores(_self) -> pd.DataFrame:
+    def carregar_todos(_self) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
-        Carrega dados de corretores do Google Sheets.
+        Carrega corretores e imobiliárias em paralelo do Google Sheets.
         
         Returns:
-            DataFrame com dados de corretores.
+            Tupla (df_corretores, df_imobiliarias) já processados.
         """
-        if not _self.sheet_corretores:
-            st.error("❌ URL da planilha de Corretores não configurada no .env")
-            return pd.DataFrame()
+        fontes = {}
+        
+        if _self.sheet_corretores:
+            fontes["Corretores"] = (_self.sheet_corretores, _self.sheet_name_corretores)
+        else:
+            _self.notificar('erro', "❌ URL da planilha de Corretores não configurada no .env")
+        
+        if _self.sheet_imobiliarias:
+            fontes["Imobiliárias"] = (_self.sheet_imobiliarias, _self.sheet_name_imobiliarias)
+        else:
+            _self.notificar('erro', "❌ URL da planilha de Imobiliárias não configurada no .env")
+        
+        if not fontes:
+            return pd.DataFrame(), pd.DataFrame()
         
-        df = _self.load_sheet_data(
-            _self.sheet_corretores,
-            _self.sheet_name_corretores,
-            "Corretores"
+        resultados = _self.load_sheets_concurrently(fontes)
+        
+        df_corretores = _self._processar_se_mudou(
+            resultados.get("Corretores", pd.DataFrame()), "Corretores"
+        )
+        df_imobiliarias = _self._processar_se_mudou(
+            resultados.get("Imobiliárias", pd.DataFrame()), "Imobiliárias"
         )
         
-        return _self._processar_dados(df, "Corretores")
+        # Gravar snapshots locais para os próximos cold starts
+        salvar_snapshot("corretores", df_corretores)
+        salvar_snapshot("imobiliarias", df_imobiliarias)
+        
+        return df_corretores, df_imobiliarias
     
     
-    @st.cache_data(ttl=300)  # Cache por 5 minutos
-    def carregar_imobiliarias(_self) -> pd.DataFrame:
+    @property
+    def notificar(self) -> Callable[[str, str], None]:
+        """Destino das mensagens: o da thread atual, se houver, senão o do loader"""
+        return getattr(self._notificacao_thread, 'notificar', None) or self._notificar
+    
+    
+    @notificar.setter
+    def notificar(self, funcao: Callable[[str, str], None]):
+        self._notificar = funcao
+    
+    
+    def atualizar_em_segundo_plano(self) -> bool:
         """
-        Carrega dados de imobiliárias do Google Sheets.
+        Dispara a atualização dos snapshots locais em uma thread daemon.
+        Não faz nada se já houver uma atualização em andamento.
         
         Returns:
-            DataFrame com dados de imobiliárias.
+            True se uma nova atualização foi iniciada.
         """
-        if not _self.sheet_imobiliarias:
-            st.error("❌ URL da planilha de Imobiliárias não configurada no .env")
-            return pd.DataFrame()
+        with self._lock_atualizacao:
+            if self._thread_atualizacao is not None and self._thread_atualizacao.is_alive():
+                return False
+            
+            self._thread_atualizacao = threading.Thread(
+                target=self._atualizar_snapshots,
+                name="atualizacao-snapshots-sheets",
+                daemon=True
+            )
+            self._thread_atualizacao.start()
+            return True
+    
+    
+    def _atualizar_snapshots(self):
+        """Baixa e processa as planilhas fora da execução do Streamlit e grava os snapshots"""
+        # Fora do ScriptRunContext, st.error/st.warning seriam descartados
+        self._notificacao_thread.notificar = notificar_log
         
-        df = _self.load_sheet_data(
-            _self.sheet_imobiliarias,
-            _self.sheet_name_imobiliarias,
-            "Imobiliárias"
-        )
+        fontes = [
+            ("Corretores", "corretores", self.sheet_corretores, self.sheet_name_corretores),
+            ("Imobiliárias", "imobiliarias", self.sheet_imobiliarias, self.sheet_name_imobiliarias),
+        ]
+        
+        try:
+            if not self._authenticated and not self.authenticate():
+                return
+            
+            for data_type, nome, url, worksheet in fontes:
+                if not url:
+                    continue
+                
+                try:
+                    data, self._versoes[data_type] = self._baixar_registros(url, worksheet)
+                except Exception as e:
+                    # Mantém o snapshot anterior; nova tentativa no próximo ciclo
+                    self.notificar('aviso', f"⚠️ Atualização de {data_type} falhou: {str(e)}")
+                    continue
+                
+                salvar_snapshot(nome, self._processar_se_mudou(pd.DataFrame(data), data_type))
+        
+        except Exception as e:
+            self.notificar('erro', f"❌ Erro na atualização em segundo plano: {str(e)}")
+    
+    
+    def _processar_se_mudou(self, df: pd.DataFrame, nome_tipo: str) -> pd.DataFrame:
+        """
+        Executa _processar_dados apenas se a planilha mudou desde o último carregamento.
+        
+        Args:
+            df: DataFrame com dados brutos.
+            nome_tipo: Tipo de dado (chave da versão carregada).
+        
+        Returns:
+            DataFrame processado.
+        """
+        versao = self._versoes.get(nome_tipo)
+        anterior = self._processados.get(nome_tipo)
+        
+        if versao is not None and anterior is not None and anterior[0] == versao:
+            return anterior[1].copy()
+        
+        df_processado = self._processar_dados(df, nome_tipo)
+        
+        if versao is not None and not df_processado.empty:
+            self._processados[nome_tipo] = (versao, df_processado.copy())
         
-        return _self._processar_dados(df, "Imobiliárias")
+        return df_processado
     
     
     def _processar_dados(self, df: pd.DataFrame, nome_tipo: str) -> pd.DataFrame:
@@ -271,14 +539,16 @@ class GoogleSheetsLoader:
             colunas_faltantes = [col for col in colunas_esperadas if col not in df.columns]
             
             if colunas_faltantes:
-                st.warning(f"⚠️ Colunas faltantes em {nome_tipo}: {colunas_faltantes}")
+                self.notificar('aviso', f"⚠️ Colunas faltantes em {nome_tipo}: {colunas_faltantes}")
                 return pd.DataFrame()
             
-            # Filtrar apenas Bahia
-            df = df[df['UF'].str.upper().isin(['BA', 'BAHIA'])].copy()
+            # Código IBGE da UF (linhas com UF não reconhecida são descartadas)
+            df['CODIGO_UF'] = codigos_uf(df['UF'])
+            df = df[df['CODIGO_UF'].notna()].copy()
+            df['CODIGO_UF'] = df['CODIGO_UF'].astype(int)
             
             # Normalizar nomes de cidades
-            df['CIDADE_NORMALIZADA'] = df['CIDADE'].str.upper().str.strip()
+            df['CIDADE_NORMALIZADA'] = normalizar_nomes(df['CIDADE'])
             
             # Garantir que colunas numéricas existam
             for col in ['QUANTIDADE', 'REGULAR', 'IRREGULAR']:
@@ -287,8 +557,8 @@ class GoogleSheetsLoader:
                 else:
                     df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
             
-            # Consolidar duplicatas (somar quantidades)
-            df_consolidado = df.groupby('CIDADE_NORMALIZADA', as_index=False).agg({
+            # Consolidar duplicatas (somar quantidades) dentro de cada UF
+            df_consolidado = df.groupby(['CODIGO_UF', 'CIDADE_NORMALIZADA'], as_index=False).agg({
                 'QUANTIDADE': 'sum',
                 'REGULAR': 'sum',
                 'IRREGULAR': 'sum'
@@ -297,7 +567,7 @@ class GoogleSheetsLoader:
             return df_consolidado
             
         except Exception as e:
-            st.error(f"❌ Erro ao processar dados de {nome_tipo}: {str(e)}")
+            self.notificar('erro', f"❌ Erro ao processar dados de {nome_tipo}: {str(e)}")
             return pd.DataFrame()
 
 
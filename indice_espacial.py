@@ -0,0 +1,185 @@
+"""
+Índice Espacial de Municípios
+Grade regular (em graus) para consultas por raio, K mais próximos e polígono
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+"""
+
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from rotas import RAIO_TERRA_KM
+
+
+# Tamanho da célula da grade em graus (~55 km no equador)
+TAMANHO_CELULA_GRAUS = 0.5
+
+# Comprimento de 1 grau de latitude em km
+KM_POR_GRAU = np.pi * RAIO_TERRA_KM / 180
+
+
+def _haversine(lat, lon, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Distância (km) de um ponto a vários pontos"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class IndiceEspacial:
+    """
+    Índice em grade sobre os municípios.
+
+    Os pontos são ordenados pela célula da grade e cada célula guarda o
+    intervalo [início, fim) correspondente, de modo que uma consulta só
+    calcula distâncias para os municípios das células vizinhas.
+    """
+
+    def __init__(self, df_municipios: pd.DataFrame,
+                 tamanho_celula: float = TAMANHO_CELULA_GRAUS):
+        """
+        Args:
+            df_municipios: DataFrame com codigo_ibge, latitude e longitude.
+            tamanho_celula: Lado da célula da grade em graus.
+        """
+        self.tamanho_celula = tamanho_celula
+
+        celula_lat = np.floor(df_municipios['latitude'].to_numpy() / tamanho_celula).astype(np.int64)
+        celula_lon = np.floor(df_municipios['longitude'].to_numpy() / tamanho_celula).astype(np.int64)
+        ordem = np.lexsort((celula_lon, celula_lat))
+
+        self.codigos = df_municipios['codigo_ibge'].to_numpy()[ordem]
+        self.latitudes = df_municipios['latitude'].to_numpy(dtype=float)[ordem]
+        self.longitudes = df_municipios['longitude'].to_numpy(dtype=float)[ordem]
+
+        chaves = np.column_stack([celula_lat[ordem], celula_lon[ordem]])
+        unicas, inicios, contagens = np.unique(chaves, axis=0, return_index=True, return_counts=True)
+        self.celulas = {
+            (int(la), int(lo)): (int(inicio), int(inicio + contagem))
+            for (la, lo), inicio, contagem in zip(unicas, inicios, contagens)
+        }
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+    def _candidatos(self, lat: float, lon: float, raio_km: float) -> np.ndarray:
+        """Posições dos municípios nas células que cobrem o círculo (lat, lon, raio)"""
+        delta_lat = raio_km / KM_POR_GRAU
+        # Na longitude o grau encolhe com cos(lat); usa a latitude mais próxima do polo
+        cos_lat = max(np.cos(np.radians(min(abs(lat) + delta_lat, 89.0))), 1e-6)
+        delta_lon = delta_lat / cos_lat
+
+        passo = self.tamanho_celula
+        lat_min, lat_max = int(np.floor((lat - delta_lat) / passo)), int(np.floor((lat + delta_lat) / passo))
+        lon_min, lon_max = int(np.floor((lon - delta_lon) / passo)), int(np.floor((lon + delta_lon) / passo))
+
+        partes = [
+            np.arange(*self.celulas[(celula_lat, celula_lon)])
+            for celula_lat in range(lat_min, lat_max + 1)
+            for celula_lon in range(lon_min, lon_max + 1)
+            if (celula_lat, celula_lon) in self.celulas
+        ]
+        return np.concatenate(partes) if partes else np.empty(0, dtype=np.int64)
+
+    def no_raio(self, lat: float, lon: float, raio_km: float) -> pd.Series:
+        """
+        Municípios a até raio_km do ponto.
+
+        Returns:
+            Série distancia_km indexada por codigo_ibge, do mais próximo ao mais distante.
+        """
+        posicoes = self._candidatos(lat, lon, raio_km)
+        distancias = _haversine(lat, lon, self.latitudes[posicoes], self.longitudes[posicoes])
+        dentro = distancias <= raio_km
+
+        resultado = pd.Series(distancias[dentro], index=self.codigos[posicoes][dentro], name='distancia_km')
+        return resultado.sort_values(kind='stable')
+
+    def mais_proximos(self, lat: float, lon: float, k: int) -> pd.Series:
+        """
+        Os k municípios mais próximos do ponto (inclui um município localizado
+        exatamente no ponto).
+
+        O raio de busca dobra até haver k candidatos; como o k-ésimo mais
+        próximo entre eles limita a resposta, uma última busca com esse raio
+        garante o resultado exato.
+
+        Returns:
+            Série distancia_km indexada por codigo_ibge, do mais próximo ao mais distante.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return pd.Series(dtype=float, name='distancia_km')
+
+        raio = self.tamanho_celula * KM_POR_GRAU
+        while len(self._candidatos(lat, lon, raio)) < k and raio < 2 * np.pi * RAIO_TERRA_KM:
+            raio *= 2
+
+        posicoes = self._candidatos(lat, lon, raio)
+        distancias = _haversine(lat, lon, self.latitudes[posicoes], self.longitudes[posicoes])
+        return self.no_raio(lat, lon, float(np.partition(distancias, k - 1)[k - 1])).head(k)
+
+    def no_poligono(self, vertices: Sequence[Sequence[float]]) -> np.ndarray:
+        """
+        Municípios dentro de um polígono (teste de cruzamento de raios vetorizado).
+
+        Args:
+            vertices: Lista de pares [longitude, latitude] (ordem GeoJSON).
+
+        Returns:
+            Array de codigo_ibge dos municípios dentro do polígono.
+        """
+        poligono = np.asarray(vertices, dtype=float)
+        if len(poligono) < 3:
+            return np.empty(0, dtype=self.codigos.dtype)
+
+        x, y = self.longitudes, self.latitudes
+
+        # Pré-filtro pela caixa envolvente
+        caixa = (
+            (x >= poligono[:, 0].min()) & (x <= poligono[:, 0].max()) &
+            (y >= poligono[:, 1].min()) & (y <= poligono[:, 1].max())
+        )
+        x, y = x[caixa], y[caixa]
+
+        dentro = np.zeros(len(x), dtype=bool)
+        x1, y1 = poligono[:, 0], poligono[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+        for ax, ay, bx, by in zip(x1, y1, x2, y2):
+            cruza = (ay > y) != (by > y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_intersecao = ax + (y - ay) * (bx - ax) / (by - ay)
+            dentro ^= cruza & (x < x_intersecao)
+
+        return self.codigos[caixa][dentro]
+
+
+def codigos_em_desenhos(indice: IndiceEspacial, desenhos: Iterable[dict]) -> np.ndarray:
+    """
+    Municípios dentro de qualquer um dos polígonos desenhados no mapa.
+
+    Args:
+        indice: Índice espacial dos municípios.
+        desenhos: Features GeoJSON retornadas pelo plugin de desenho do folium.
+
+    Returns:
+        Array de codigo_ibge (sem repetição).
+    """
+    partes = []
+    for desenho in desenhos or []:
+        geometria = (desenho or {}).get('geometry') or {}
+        if geometria.get('type') == 'Polygon':
+            aneis = [geometria['coordinates'][0]]
+        elif geometria.get('type') == 'MultiPolygon':
+            aneis = [poligono[0] for poligono in geometria['coordinates']]
+        else:
+            continue
+        partes.extend(indice.no_poligono(anel) for anel in aneis)
+
+    if not partes:
+        return np.empty(0, dtype=indice.codigos.dtype)
+    return np.unique(np.concatenate(partes))
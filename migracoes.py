@@ -0,0 +1,209 @@
+"""
+Migrações do Banco de Usuários
+Migrações numeradas e idempotentes (SQLite e PostgreSQL), registradas na
+tabela schema_version
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+
+Para alterar o esquema, acrescente uma função ao final de MIGRACOES com o
+próximo número; nunca edite uma migração já publicada.
+"""
+
+from typing import Callable, List, Tuple
+
+
+# Chave do advisory lock do PostgreSQL (processos migrando ao mesmo tempo)
+LOCK_MIGRACOES = 7261001
+
+
+def _criar_users(cursor, db_type: str):
+    """Tabela de usuários"""
+    if db_type == 'postgres':
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                full_name VARCHAR(100) NOT NULL,
+                role VARCHAR(20) DEFAULT 'user',
+                active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                role TEXT DEFAULT 'user',
+                active INTEGER DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+
+def _criar_city_aliases(cursor, db_type: str):
+    """
+    Tabela de aliases de cidades, com chave (codigo_uf, alias).
+
+    Bancos criados antes do modo nacional têm a chave apenas em alias: a
+    tabela antiga é renomeada, recriada e os dados copiados, com a UF
+    derivada do código IBGE.
+    """
+    if db_type == 'postgres':
+        ddl = """
+            CREATE TABLE IF NOT EXISTS city_aliases (
+                codigo_uf INTEGER NOT NULL,
+                alias VARCHAR(150) NOT NULL,
+                codigo_ibge INTEGER NOT NULL,
+                score REAL,
+                pinned BOOLEAN DEFAULT FALSE,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (codigo_uf, alias)
+            )
+        """
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'city_aliases'
+        """)
+    else:
+        ddl = """
+            CREATE TABLE IF NOT EXISTS city_aliases (
+                codigo_uf INTEGER NOT NULL,
+                alias TEXT NOT NULL,
+                codigo_ibge INTEGER NOT NULL,
+                score REAL,
+                pinned INTEGER DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (codigo_uf, alias)
+            )
+        """
+        cursor.execute("SELECT name FROM pragma_table_info('city_aliases')")
+
+    colunas = {row[0] for row in cursor.fetchall()}
+
+    if colunas and 'codigo_uf' not in colunas:
+        cursor.execute("ALTER TABLE city_aliases RENAME TO city_aliases_sem_uf")
+        cursor.execute(ddl)
+        cursor.execute("""
+            INSERT INTO city_aliases (codigo_uf, alias, codigo_ibge, score, pinned, updated_at)
+            SELECT codigo_ibge / 100000, alias, codigo_ibge, score, pinned, updated_at
+            FROM city_aliases_sem_uf
+        """)
+        cursor.execute("DROP TABLE city_aliases_sem_uf")
+    else:
+        cursor.execute(ddl)
+
+
+def _indice_listagem_paginada(cursor, db_type: str):
+    """Índice da listagem paginada (keyset em created_at, id)"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_created_at_id
+        ON users (created_at DESC, id DESC)
+    """)
+
+
+def _indices_login_e_filtros(cursor, db_type: str):
+    """
+    Índices do login e dos filtros do admin.
+
+    O login (WHERE username = ?) já usa o índice da restrição UNIQUE. Os
+    seletores filtram por active e ordenam por username; a listagem filtra
+    por role ou active e pagina por (created_at, id).
+    """
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_active_username
+        ON users (active, username)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_role_created_at_id
+        ON users (role, created_at DESC, id DESC)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_active_created_at_id
+        ON users (active, created_at DESC, id DESC)
+    """)
+
+
+def _geracao_sessao(cursor, db_type: str):
+    """
+    Geração de sessão por usuário: assinada nos tokens e incrementada no
+    logout e na desativação, o que invalida os tokens emitidos antes.
+    """
+    if db_type == 'postgres':
+        cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS session_generation INTEGER NOT NULL DEFAULT 0")
+        return
+
+    cursor.execute("SELECT name FROM pragma_table_info('users')")
+    if 'session_generation' not in {row[0] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE users ADD COLUMN session_generation INTEGER NOT NULL DEFAULT 0")
+
+
+# (versão, descrição, função(cursor, db_type)) em ordem crescente de versão
+MIGRACOES: List[Tuple[int, str, Callable]] = [
+    (1, "tabela users", _criar_users),
+    (2, "tabela city_aliases com chave (codigo_uf, alias)", _criar_city_aliases),
+    (3, "índice users (created_at, id)", _indice_listagem_paginada),
+    (4, "índices users (active, username), (role, created_at, id), (active, created_at, id)",
+     _indices_login_e_filtros),
+    (5, "coluna users.session_generation", _geracao_sessao),
+]
+
+
+def versao_esquema(db) -> int:
+    """Maior versão aplicada (0 se o banco nunca foi migrado)"""
+    with db._connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                versao INTEGER PRIMARY KEY,
+                descricao VARCHAR(200) NOT NULL,
+                aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT MAX(versao) FROM schema_version")
+        return cursor.fetchone()[0] or 0
+
+
+def aplicar_migracoes(db) -> List[int]:
+    """
+    Aplica as migrações pendentes, cada uma em sua própria transação.
+
+    No PostgreSQL um advisory lock serializa processos concorrentes; no
+    SQLite as migrações são idempotentes e o registro em schema_version
+    ignora versões já gravadas por outro processo.
+
+    Args:
+        db: Instância de UserDatabase.
+
+    Returns:
+        Versões aplicadas nesta execução (vazia se o esquema já estava atualizado).
+    """
+    atual = versao_esquema(db)
+    aplicadas = []
+
+    for versao, descricao, aplicar in MIGRACOES:
+        if versao <= atual:
+            continue
+
+        with db._connection() as conn:
+            cursor = conn.cursor()
+
+            if db.db_type == 'postgres':
+                db.consultas.executar(cursor, "SELECT pg_advisory_xact_lock(?)", (LOCK_MIGRACOES,))
+                db.consultas.executar(cursor, "SELECT 1 FROM schema_version WHERE versao = ?", (versao,))
+                if cursor.fetchone():
+                    continue
+
+            aplicar(cursor, db.db_type)
+            db.consultas.executar(cursor, """
+                INSERT INTO schema_version (versao, descricao) VALUES (?, ?)
+                ON CONFLICT (versao) DO NOTHING
+            """, (versao, descricao))
+
+        aplicadas.append(versao)
+
+    return aplicadas
@@ -0,0 +1,160 @@
+"""
+Índice Binário de Municípios
+Pré-compila dados/municipios.json em um array NumPy por UF (memory-mapped)
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+
+Uso:
+    python municipios_index.py          # (re)constrói o índice
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+CAMINHO_JSON = Path("dados/municipios.json")
+CAMINHO_INDICE = Path("dados/municipios_index.npy")
+CAMINHO_META = Path("dados/municipios_index.json")
+
+# Incrementar sempre que o layout do array mudar
+VERSAO_INDICE = 1
+
+COLUNAS_INDICE = ['codigo_ibge', 'nome', 'latitude', 'longitude', 'capital', 'codigo_uf']
+
+
+def _assinatura_fonte(caminho_json: Path) -> Dict:
+    """Tamanho e mtime do JSON de origem, usados para detectar índice desatualizado"""
+    stat = caminho_json.stat()
+    return {'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _ler_json(caminho_json: Path) -> pd.DataFrame:
+    """Lê o JSON completo de municípios (caminho lento)"""
+    with open(caminho_json, 'r', encoding='utf-8-sig') as f:
+        municipios = json.load(f)
+    return pd.DataFrame(municipios)
+
+
+def construir_indice(caminho_json: Path = CAMINHO_JSON,
+                     caminho_indice: Path = CAMINHO_INDICE,
+                     caminho_meta: Path = CAMINHO_META) -> pd.DataFrame:
+    """
+    Constrói o índice binário a partir do JSON de municípios.
+
+    O array é ordenado por codigo_uf e o arquivo de metadados guarda o
+    intervalo [início, fim) de cada UF, permitindo carregar apenas as
+    linhas de um estado.
+
+    Args:
+        caminho_json: Arquivo JSON de origem.
+        caminho_indice: Destino do array NumPy (.npy).
+        caminho_meta: Destino dos metadados (.json).
+
+    Returns:
+        DataFrame completo (todas as UFs) já com as colunas do índice.
+    """
+    df = _ler_json(caminho_json)[COLUNAS_INDICE]
+    df = df.sort_values(['codigo_uf', 'codigo_ibge'], kind='stable').reset_index(drop=True)
+
+    tamanho_nome = int(df['nome'].str.len().max())
+    dtype = np.dtype([
+        ('codigo_ibge', '<i4'),
+        ('nome', f'<U{tamanho_nome}'),
+        ('latitude', '<f8'),
+        ('longitude', '<f8'),
+        ('capital', '<i1'),
+        ('codigo_uf', '<i1'),
+    ])
+
+    registros = np.empty(len(df), dtype=dtype)
+    for coluna in COLUNAS_INDICE:
+        registros[coluna] = df[coluna].to_numpy()
+
+    # Intervalos por UF (o array está ordenado por codigo_uf)
+    ufs, inicios, contagens = np.unique(registros['codigo_uf'], return_index=True, return_counts=True)
+    intervalos = {
+        str(int(uf)): [int(inicio), int(inicio + contagem)]
+        for uf, inicio, contagem in zip(ufs, inicios, contagens)
+    }
+
+    meta = {
+        'versao': VERSAO_INDICE,
+        'fonte': _assinatura_fonte(caminho_json),
+        'ufs': intervalos
+    }
+
+    # Escrita atômica: arquivos temporários + os.replace
+    tmp_indice = caminho_indice.with_name(caminho_indice.name + '.tmp')
+    tmp_meta = caminho_meta.with_name(caminho_meta.name + '.tmp')
+    with open(tmp_indice, 'wb') as f:
+        np.save(f, registros)
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_indice, caminho_indice)
+    os.replace(tmp_meta, caminho_meta)
+
+    return df
+
+
+def _ler_meta(caminho_json: Path, caminho_meta: Path) -> Optional[Dict]:
+    """Retorna os metadados se o índice estiver em dia com o JSON, senão None"""
+    try:
+        with open(caminho_meta, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if meta.get('versao') != VERSAO_INDICE:
+        return None
+    if meta.get('fonte') != _assinatura_fonte(caminho_json):
+        return None
+    return meta
+
+
+def carregar_municipios_uf(codigo_uf: int,
+                           caminho_json: Path = CAMINHO_JSON,
+                           caminho_indice: Path = CAMINHO_INDICE,
+                           caminho_meta: Path = CAMINHO_META) -> pd.DataFrame:
+    """
+    Carrega apenas os municípios de uma UF a partir do índice binário.
+
+    Se o índice não existir ou estiver desatualizado em relação ao JSON, ele é
+    reconstruído. Se não for possível gravá-lo (ex.: sistema de arquivos somente
+    leitura), os dados são servidos diretamente do JSON.
+
+    Args:
+        codigo_uf: Código IBGE da UF (ex.: 29 para Bahia).
+
+    Returns:
+        DataFrame com codigo_ibge, nome, latitude, longitude, capital e codigo_uf.
+    """
+    meta = _ler_meta(caminho_json, caminho_meta)
+
+    if meta is None or not caminho_indice.exists():
+        try:
+            df = construir_indice(caminho_json, caminho_indice, caminho_meta)
+        except OSError:
+            df = _ler_json(caminho_json)[COLUNAS_INDICE]
+        return df[df['codigo_uf'] == codigo_uf].reset_index(drop=True)
+
+    intervalo = meta['ufs'].get(str(int(codigo_uf)))
+    if intervalo is None:
+        return pd.DataFrame(columns=COLUNAS_INDICE)
+
+    registros = np.load(caminho_indice, mmap_mode='r')
+    inicio, fim = intervalo
+    fatia = registros[inicio:fim]
+
+    return pd.DataFrame({coluna: np.asarray(fatia[coluna]) for coluna in COLUNAS_INDICE})
+
+
+if __name__ == "__main__":
+    print(f"⏳ Construindo índice a partir de {CAMINHO_JSON}...")
+    df = construir_indice()
+    print(f"✅ {len(df)} municípios indexados em {CAMINHO_INDICE}")
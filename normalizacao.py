@@ -0,0 +1,81 @@
+"""
+Módulo de Normalização de Nomes de Cidades
+Pipeline vetorizado compartilhado pelos loaders (Google Sheets e Excel) e pelos municípios
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+"""
+
+import unicodedata
+from typing import Dict, Optional
+
+import pandas as pd
+
+
+# Abreviações comuns nas planilhas -> forma por extenso (já sem acentos)
+ABREVIACOES_PADRAO: Dict[str, str] = {
+    'S': 'SAO',
+    'STO': 'SANTO',
+    'STA': 'SANTA',
+    'STOS': 'SANTOS',
+    'N S': 'NOSSA SENHORA',
+    'NSA': 'NOSSA SENHORA',
+    'NS': 'NOSSA SENHORA',
+    'PRES': 'PRESIDENTE',
+    'GOV': 'GOVERNADOR',
+    'CEL': 'CORONEL',
+    'DR': 'DOUTOR',
+}
+
+
+def _remover_acentos(texto: str) -> str:
+    """Remove acentos via decomposição Unicode NFKD"""
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return decomposto.encode('ascii', 'ignore').decode('ascii')
+
+
+def normalizar_nomes(nomes: pd.Series,
+                     abreviacoes: Optional[Dict[str, str]] = None) -> pd.Series:
+    """
+    Normaliza uma coluna de nomes de cidades.
+
+    Etapas: maiúsculas, remoção de acentos (NFKD), troca de pontuação por
+    espaço, colapso de espaços e expansão de abreviações por palavra inteira.
+    A remoção de acentos é feita uma única vez por valor distinto.
+
+    Args:
+        nomes: Série com nomes brutos.
+        abreviacoes: Tabela abreviação -> forma por extenso
+            (padrão: ABREVIACOES_PADRAO).
+
+    Returns:
+        Série normalizada, com o mesmo índice da entrada.
+    """
+    if abreviacoes is None:
+        abreviacoes = ABREVIACOES_PADRAO
+
+    texto = nomes.astype('string').str.upper()
+
+    # Acentos: aplicar apenas sobre os valores únicos
+    unicos = texto.dropna().unique()
+    sem_acento = {valor: _remover_acentos(valor) for valor in unicos}
+    texto = texto.map(sem_acento, na_action='ignore').astype('string')
+
+    texto = (
+        texto
+        .str.replace(r"[^A-Z0-9 ]", ' ', regex=True)
+        .str.replace(r"\s+", ' ', regex=True)
+        .str.strip()
+    )
+
+    if abreviacoes:
+        # Chaves mais longas primeiro, para "N S" ter prioridade sobre "S"
+        chaves = sorted(abreviacoes, key=len, reverse=True)
+        padrao = r"\b(" + '|'.join(chave.replace(' ', r'\s') for chave in chaves) + r")\b"
+        texto = texto.str.replace(
+            padrao,
+            lambda m: abreviacoes[m.group(1)],
+            regex=True
+        )
+
+    return texto.astype(object)
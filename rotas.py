@@ -0,0 +1,430 @@
+"""
+Módulo de Planejamento de Rotas
+Otimiza a ordem de visita às cidades (vizinho mais próximo + 2-opt/Or-opt)
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+"""
+
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+RAIO_TERRA_KM = 6371.0088
+
+# Melhoria mínima (km) para aceitar um movimento de busca local
+EPSILON_KM = 1e-6
+
+
+def matriz_distancias(latitudes, longitudes) -> np.ndarray:
+    """
+    Calcula a matriz de distâncias (haversine, em km) entre todos os pontos.
+
+    Args:
+        latitudes: Sequência de latitudes em graus.
+        longitudes: Sequência de longitudes em graus.
+
+    Returns:
+        Matriz n x n (float64) de distâncias em km.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _distancias_pontos(pontos: pd.DataFrame, matriz=None) -> np.ndarray:
+    """
+    Matriz de distâncias entre os pontos: usa a matriz pré-calculada
+    (distancias.MatrizDistancias) quando todos os codigo_ibge estiverem nela,
+    senão calcula pela fórmula de haversine.
+    """
+    if matriz is not None and 'codigo_ibge' in pontos:
+        codigos = pontos['codigo_ibge']
+        if codigos.notna().all() and all(codigo in matriz for codigo in codigos):
+            return matriz.submatriz(codigos)
+    return matriz_distancias(pontos['latitude'], pontos['longitude'])
+
+
+def _sem_partida(df: pd.DataFrame, inicio: pd.Series) -> pd.DataFrame:
+    """Remove o ponto de partida das cidades a visitar (por codigo_ibge, se houver)"""
+    if 'codigo_ibge' in df and pd.notna(inicio.get('codigo_ibge')):
+        return df[df['codigo_ibge'] != inicio['codigo_ibge']]
+    return df[df['cidade'] != inicio['cidade']]
+
+
+def _vizinho_mais_proximo(dist: np.ndarray, inicio: int) -> list:
+    """Constrói uma rota inicial sempre indo para a cidade não visitada mais próxima"""
+    n = len(dist)
+    visitado = np.zeros(n, dtype=bool)
+    visitado[inicio] = True
+    rota = [inicio]
+
+    atual = inicio
+    for _ in range(n - 1):
+        candidatos = np.where(visitado, np.inf, dist[atual])
+        atual = int(candidatos.argmin())
+        visitado[atual] = True
+        rota.append(atual)
+
+    return rota
+
+
+def _dois_opt(seq: np.ndarray, d: np.ndarray) -> bool:
+    """
+    Aplica movimentos 2-opt (inversão de trechos) até não haver melhoria.
+    As extremidades de seq são fixas. Avalia todos os j de cada i de uma vez.
+
+    Returns:
+        True se a rota foi alterada.
+    """
+    m = len(seq)
+    alterou = False
+    melhorou = True
+
+    while melhorou:
+        melhorou = False
+        for i in range(1, m - 2):
+            a, b = seq[i - 1], seq[i]
+            j = np.arange(i + 1, m - 1)
+            c, prox = seq[j], seq[j + 1]
+
+            delta = d[a, c] + d[b, prox] - d[a, b] - d[c, prox]
+            k = int(delta.argmin())
+
+            if delta[k] < -EPSILON_KM:
+                fim = j[k]
+                seq[i:fim + 1] = seq[i:fim + 1][::-1]
+                melhorou = alterou = True
+
+    return alterou
+
+
+def _or_opt(seq: np.ndarray, d: np.ndarray) -> tuple:
+    """
+    Aplica movimentos Or-opt: realoca trechos de 1 a 3 cidades (em qualquer
+    sentido) para a melhor posição da rota. As extremidades são fixas.
+
+    Returns:
+        Tupla (nova sequência, True se a rota foi alterada).
+    """
+    alterou = False
+    melhorou = True
+
+    while melhorou:
+        melhorou = False
+        for tamanho in (1, 2, 3):
+            i = 1
+            while i + tamanho < len(seq):
+                trecho = seq[i:i + tamanho]
+                anterior, proximo = seq[i - 1], seq[i + tamanho]
+                ganho_remocao = d[anterior, trecho[0]] + d[trecho[-1], proximo] - d[anterior, proximo]
+
+                resto = np.concatenate([seq[:i], seq[i + tamanho:]])
+                u, v = resto[:-1], resto[1:]
+                custo_direto = d[u, trecho[0]] + d[trecho[-1], v] - d[u, v]
+                custo_invertido = d[u, trecho[-1]] + d[trecho[0], v] - d[u, v]
+                custo = np.minimum(custo_direto, custo_invertido)
+
+                k = int(custo.argmin())
+                if custo[k] - ganho_remocao < -EPSILON_KM:
+                    novo_trecho = trecho if custo_direto[k] <= custo_invertido[k] else trecho[::-1]
+                    seq = np.concatenate([resto[:k + 1], novo_trecho, resto[k + 1:]])
+                    melhorou = alterou = True
+                i += 1
+
+    return seq, alterou
+
+
+def otimizar_ordem(dist: np.ndarray, inicio: int = 0, retornar: bool = True,
+                   max_rodadas: int = 20) -> list:
+    """
+    Calcula uma ordem de visita de baixo custo para todos os pontos da matriz.
+
+    Construção por vizinho mais próximo seguida de busca local 2-opt e Or-opt
+    até convergir (ou atingir max_rodadas).
+
+    Args:
+        dist: Matriz n x n de distâncias.
+        inicio: Índice do ponto de partida.
+        retornar: Se True, a rota volta ao ponto de partida.
+        max_rodadas: Limite de rodadas alternando 2-opt e Or-opt.
+
+    Returns:
+        Lista de índices na ordem de visita, começando em `inicio`
+        (sem repetir o ponto de partida no final).
+    """
+    n = len(dist)
+    if n <= 2:
+        return [inicio] + [i for i in range(n) if i != inicio]
+
+    # Sentinela n: distância zero para todos, representa o "fim livre" da rota aberta
+    d = np.zeros((n + 1, n + 1), dtype=float)
+    d[:n, :n] = dist
+
+    rota = _vizinho_mais_proximo(dist, inicio)
+    seq = np.array(rota + [inicio if retornar else n])
+
+    for _ in range(max_rodadas):
+        alterou_2opt = _dois_opt(seq, d)
+        seq, alterou_or = _or_opt(seq, d)
+        if not (alterou_2opt or alterou_or):
+            break
+
+    return [int(x) for x in seq[:-1]]
+
+
+def planejar_rota(df: pd.DataFrame, inicio: pd.Series,
+                  cidades: Optional[Iterable[str]] = None,
+                  top_n: Optional[int] = None,
+                  peso: str = 'total_profissionais',
+                  retornar: bool = True,
+                  matriz=None) -> pd.DataFrame:
+    """
+    Planeja a rota de visita a partir do DataFrame consolidado.
+
+    Args:
+        df: DataFrame de consolidar_dados (cidade, latitude, longitude, ...).
+        inicio: Linha com cidade, latitude e longitude do ponto de partida.
+        cidades: Nomes das cidades a visitar (opcional).
+        top_n: Visitar apenas as N cidades de maior `peso` (opcional).
+        peso: Coluna usada para priorizar as cidades no top_n.
+        retornar: Se True, a rota termina no ponto de partida.
+        matriz: MatrizDistancias pré-calculada (opcional; exige codigo_ibge
+            em `df` e em `inicio`).
+
+    Returns:
+        DataFrame na ordem de visita (partida na primeira linha), com as colunas
+        ordem, distancia_trecho_km e distancia_acumulada_km. Se retornar=True,
+        a última linha repete o ponto de partida.
+    """
+    selecao = df
+    if cidades is not None:
+        selecao = selecao[selecao['cidade'].isin(list(cidades))]
+    selecao = _sem_partida(selecao, inicio)
+    if top_n is not None:
+        selecao = selecao.nlargest(top_n, peso)
+
+    partida = pd.DataFrame([{
+        'cidade': inicio['cidade'],
+        'latitude': inicio['latitude'],
+        'longitude': inicio['longitude'],
+        'codigo_ibge': inicio.get('codigo_ibge')
+    }])
+    pontos = pd.concat([partida, selecao], ignore_index=True)
+
+    dist = _distancias_pontos(pontos, matriz)
+    ordem = otimizar_ordem(dist, inicio=0, retornar=retornar)
+    if retornar:
+        ordem.append(0)
+
+    rota = pontos.iloc[ordem].reset_index(drop=True)
+    trechos = np.concatenate([[0.0], dist[ordem[:-1], ordem[1:]]])
+
+    rota.insert(0, 'ordem', np.arange(len(rota)))
+    rota['distancia_trecho_km'] = trechos.round(1)
+    rota['distancia_acumulada_km'] = trechos.cumsum().round(1)
+
+    return rota
+
+
+def _kmeans(pontos: np.ndarray, k: int, semente: int = 0, max_iter: int = 100) -> np.ndarray:
+    """
+    K-means simples (inicialização k-means++) em NumPy.
+
+    Args:
+        pontos: Matriz n x 2 de coordenadas projetadas.
+        k: Número de grupos.
+        semente: Semente do gerador aleatório (resultado determinístico).
+
+    Returns:
+        Matriz k x 2 com os centróides.
+    """
+    rng = np.random.default_rng(semente)
+    centros = [pontos[rng.integers(len(pontos))]]
+
+    for _ in range(1, k):
+        d2 = ((pontos[:, None, :] - np.array(centros)[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        probabilidades = d2 / d2.sum() if d2.sum() > 0 else np.full(len(pontos), 1 / len(pontos))
+        centros.append(pontos[rng.choice(len(pontos), p=probabilidades)])
+
+    centros = np.array(centros, dtype=float)
+
+    for _ in range(max_iter):
+        rotulos = ((pontos[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        novos = np.array([
+            pontos[rotulos == c].mean(axis=0) if (rotulos == c).any() else centros[c]
+            for c in range(k)
+        ])
+        if np.allclose(novos, centros):
+            break
+        centros = novos
+
+    return centros
+
+
+def _atribuir_com_capacidade(pontos: np.ndarray, centros: np.ndarray,
+                             capacidade: int) -> np.ndarray:
+    """
+    Atribui cada ponto (já em ordem de prioridade) ao centróide mais próximo
+    que ainda tenha capacidade. Pontos excedentes recebem -1.
+    """
+    rotulos = np.full(len(pontos), -1)
+    ocupacao = np.zeros(len(centros), dtype=int)
+    distancias = ((pontos[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2)
+
+    for i in range(len(pontos)):
+        for c in np.argsort(distancias[i]):
+            if ocupacao[c] < capacidade:
+                rotulos[i] = c
+                ocupacao[c] += 1
+                break
+
+    return rotulos
+
+
+def _dividir_em_dias(ordem: list, dist: np.ndarray, dias: int,
+                     max_km_dia: float, max_cidades_dia: int, retornar: bool) -> list:
+    """
+    Divide a ordem de visita de uma viagem em dias.
+
+    Cada dia começa onde o anterior terminou (pernoite na última cidade) e
+    termina quando atingir max_cidades_dia ou quando o próximo trecho
+    ultrapassar max_km_dia. Cidades cujo trecho sozinho já excede max_km_dia
+    são puladas (inalcançáveis em um dia). No último dia, a volta à base
+    também precisa caber no limite de km, para cada cidade do dia.
+
+    Returns:
+        Lista de tuplas (posição na ordem, dia) para as cidades que couberam
+        no número de dias; as demais ficam de fora.
+    """
+    alocacao = []
+    dia, km_dia, cidades_dia = 1, 0.0, 0
+    anterior = ordem[0]
+
+    for posicao, ponto in enumerate(ordem[1:], start=1):
+        trecho = dist[anterior, ponto]
+        volta = dist[ponto, ordem[0]] if retornar else 0.0
+
+        if trecho > max_km_dia:
+            continue
+
+        # Fecha o dia se a cidade não couber
+        if cidades_dia >= max_cidades_dia or km_dia + trecho > max_km_dia:
+            dia, km_dia, cidades_dia = dia + 1, 0.0, 0
+        if dia > dias:
+            break
+
+        if dia == dias and km_dia + trecho + volta > max_km_dia:
+            continue
+
+        alocacao.append((posicao, dia))
+        km_dia += trecho
+        cidades_dia += 1
+        anterior = ponto
+
+    return alocacao
+
+
+def planejar_viagens(df: pd.DataFrame, base: pd.Series, n_viagens: int,
+                     dias_por_viagem: int, max_km_dia: float, max_cidades_dia: int,
+                     peso: str = 'total_profissionais', retornar: bool = True,
+                     semente: int = 0, matriz=None) -> tuple:
+    """
+    Divide as cidades em várias viagens respeitando limites diários.
+
+    As cidades são ordenadas por `peso` e apenas as que cabem na capacidade
+    total (viagens x dias x cidades/dia) são consideradas. Os grupos são
+    formados por k-means sobre latitude/longitude, com atribuição limitada à
+    capacidade de cada viagem, e cada grupo recebe uma rota otimizada a partir
+    da base, depois dividida em dias.
+
+    Args:
+        df: DataFrame de consolidar_dados.
+        base: Linha com cidade, latitude e longitude da base (partida).
+        n_viagens: Número de viagens.
+        dias_por_viagem: Dias disponíveis em cada viagem.
+        max_km_dia: Distância máxima (linha reta) percorrida por dia.
+        max_cidades_dia: Máximo de cidades visitadas por dia.
+        peso: Coluna usada para priorizar as cidades.
+        retornar: Se True, cada viagem termina na base.
+        semente: Semente do k-means (mesmos parâmetros -> mesmo resultado).
+        matriz: MatrizDistancias pré-calculada (opcional), como em planejar_rota.
+
+    Returns:
+        Tupla (roteiro, nao_alocadas). `roteiro` tem uma linha por cidade
+        visitada com viagem (numeradas de 1 em diante, sem lacunas), dia, ordem,
+        distancia_trecho_km e km_dia; `nao_alocadas` tem as cidades candidatas
+        que não couberam, inclusive as inalcançáveis dentro de max_km_dia.
+    """
+    capacidade = dias_por_viagem * max_cidades_dia
+    candidatas = _sem_partida(df, base).sort_values(peso, ascending=False)
+    candidatas = candidatas.head(n_viagens * capacidade).reset_index(drop=True)
+
+    colunas_roteiro = ['viagem', 'dia', 'ordem', 'cidade', 'latitude', 'longitude', peso,
+                       'distancia_trecho_km', 'km_dia']
+    if candidatas.empty:
+        return pd.DataFrame(columns=colunas_roteiro), candidatas
+
+    # Projeção equiretangular local: distâncias euclidianas ~ proporcionais a km
+    lat0 = np.radians(candidatas['latitude'].mean())
+    pontos = np.column_stack([
+        candidatas['latitude'].to_numpy(),
+        candidatas['longitude'].to_numpy() * np.cos(lat0)
+    ])
+
+    k = min(n_viagens, len(candidatas))
+    centros = _kmeans(pontos, k, semente)
+    rotulos = _atribuir_com_capacidade(pontos, centros, capacidade)
+
+    partes = []
+    alocadas = np.zeros(len(candidatas), dtype=bool)
+
+    # Numerar as viagens pela distância do centróide à base
+    base_proj = np.array([base['latitude'], base['longitude'] * np.cos(lat0)])
+    ordem_viagens = np.argsort(((centros - base_proj) ** 2).sum(axis=1))
+
+    for grupo in ordem_viagens:
+        indices = np.flatnonzero(rotulos == grupo)
+        if len(indices) == 0:
+            continue
+
+        pontos_grupo = pd.concat([
+            pd.DataFrame([{
+                'latitude': base['latitude'],
+                'longitude': base['longitude'],
+                'codigo_ibge': base.get('codigo_ibge')
+            }]),
+            candidatas.iloc[indices][['latitude', 'longitude']
+                                     + (['codigo_ibge'] if 'codigo_ibge' in candidatas else [])]
+        ], ignore_index=True)
+        dist = _distancias_pontos(pontos_grupo, matriz)
+
+        ordem = otimizar_ordem(dist, inicio=0, retornar=retornar)
+        alocacao = _dividir_em_dias(ordem, dist, dias_por_viagem, max_km_dia,
+                                    max_cidades_dia, retornar)
+        if not alocacao:
+            continue
+
+        # Cidades puladas não entram nos trechos: cada uma parte da anterior alocada
+        pontos_rota = [ordem[posicao] for posicao, _ in alocacao]
+        anteriores = [ordem[0]] + pontos_rota[:-1]
+        selecionadas = indices[np.array(pontos_rota) - 1]
+        alocadas[selecionadas] = True
+
+        viagem = candidatas.iloc[selecionadas][['cidade', 'latitude', 'longitude', peso]].copy()
+        viagem.insert(0, 'ordem', np.arange(1, len(viagem) + 1))
+        viagem.insert(0, 'dia', [dia for _, dia in alocacao])
+        viagem.insert(0, 'viagem', len(partes) + 1)
+        viagem['distancia_trecho_km'] = dist[anteriores, pontos_rota].round(1)
+        viagem['km_dia'] = viagem.groupby('dia')['distancia_trecho_km'].cumsum().round(1)
+        partes.append(viagem)
+
+    roteiro = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=colunas_roteiro)
+    return roteiro[colunas_roteiro], candidatas[~alocadas].reset_index(drop=True)
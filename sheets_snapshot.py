@@ -0,0 +1,178 @@
+"""
+Snapshots Locais dos Dados das Planilhas
+Grava cada carregamento bem-sucedido em disco (formato colunar NumPy .npz)
+para servir cold starts instantaneamente e como fallback offline
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+
+Uso:
+    python sheets_snapshot.py     # verifica o round trip gravação/leitura
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+DIRETORIO_SNAPSHOTS = Path("dados/cache")
+
+# Incrementar sempre que o layout do arquivo mudar
+VERSAO_SNAPSHOT = 3
+
+
+def _caminho(nome: str) -> Path:
+    """Caminho do snapshot de um tipo de dado ("corretores", "imobiliarias")"""
+    return DIRETORIO_SNAPSHOTS / f"{nome}.v{VERSAO_SNAPSHOT}.npz"
+
+
+def _coluna_para_array(serie: pd.Series) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Converte uma coluna em array sem pickle, mais a máscara de nulos.
+
+    Colunas NumPy nativas (int, float, bool, datetime) são gravadas como estão,
+    pois NaN/NaT já sobrevivem ao .npz. Texto vira unicode de tamanho fixo e
+    tipos anuláveis (Int64, boolean, ...) viram o dtype NumPy equivalente; em
+    ambos os casos os nulos são preenchidos e registrados na máscara.
+
+    Returns:
+        Tupla (valores, máscara de nulos ou None).
+    """
+    if not isinstance(serie.dtype, pd.api.extensions.ExtensionDtype) and serie.dtype != object:
+        return serie.to_numpy(), None
+
+    nulos = serie.isna().to_numpy()
+    tipo_numpy = getattr(serie.dtype, 'numpy_dtype', None)
+
+    if tipo_numpy is not None and tipo_numpy.kind in 'biuf':
+        valores = serie.to_numpy(dtype=tipo_numpy, na_value=0)
+    else:
+        valores = np.asarray(serie.astype(object).where(~nulos, '').to_numpy(), dtype=str)
+
+    return valores, (nulos if nulos.any() else None)
+
+
+def _array_para_coluna(valores: np.ndarray, tipo: str, nulos: Optional[np.ndarray]) -> pd.Series:
+    """Reconstrói a coluna gravada por _coluna_para_array com o dtype original"""
+    serie = pd.Series(valores)
+    if nulos is not None:
+        serie = serie.astype(object)
+        serie[nulos] = None
+    return serie.astype(tipo)
+
+
+def salvar_snapshot(nome: str, df: pd.DataFrame) -> bool:
+    """
+    Grava o DataFrame processado em disco, uma coluna por array.
+
+    Args:
+        nome: Tipo de dado ("corretores" ou "imobiliarias").
+        df: DataFrame já processado por _processar_dados.
+
+    Returns:
+        True se gravado com sucesso.
+    """
+    if df.empty:
+        return False
+
+    try:
+        DIRETORIO_SNAPSHOTS.mkdir(parents=True, exist_ok=True)
+
+        meta = {
+            'versao': VERSAO_SNAPSHOT,
+            'obtido_em': datetime.now(timezone.utc).isoformat(),
+            'colunas': list(df.columns),
+            'tipos': [str(tipo) for tipo in df.dtypes]
+        }
+
+        # Sem arrays object (e portanto sem pickle): nulos vão em máscaras à parte
+        arrays = {}
+        for i, col in enumerate(df.columns):
+            arrays[f"col_{i}"], nulos = _coluna_para_array(df[col])
+            if nulos is not None:
+                arrays[f"nulos_{i}"] = nulos
+
+        caminho = _caminho(nome)
+        tmp = caminho.with_name(caminho.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, caminho)
+        return True
+
+    except OSError:
+        return False
+
+
+def carregar_snapshot(nome: str) -> Optional[Tuple[pd.DataFrame, datetime]]:
+    """
+    Lê o último snapshot gravado de um tipo de dado.
+
+    Args:
+        nome: Tipo de dado ("corretores" ou "imobiliarias").
+
+    Returns:
+        Tupla (DataFrame, momento da coleta em UTC) ou None se não houver snapshot.
+    """
+    caminho = _caminho(nome)
+
+    try:
+        with np.load(caminho, allow_pickle=False) as arquivo:
+            meta = json.loads(str(arquivo['__meta__']))
+            df = pd.DataFrame({
+                col: _array_para_coluna(
+                    arquivo[f"col_{i}"],
+                    meta['tipos'][i],
+                    arquivo[f"nulos_{i}"] if f"nulos_{i}" in arquivo else None
+                )
+                for i, col in enumerate(meta['colunas'])
+            })
+    except (FileNotFoundError, KeyError, ValueError, TypeError, OSError):
+        return None
+
+    return df, datetime.fromisoformat(meta['obtido_em'])
+
+
+def idade_snapshot(nome: str) -> Optional[float]:
+    """
+    Idade do snapshot em segundos (pela data de modificação do arquivo).
+
+    Returns:
+        Segundos desde a última gravação ou None se não houver snapshot.
+    """
+    try:
+        return datetime.now().timestamp() - _caminho(nome).stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def versao_arquivo(nome: str) -> Optional[int]:
+    """mtime (ns) do snapshot, usado como chave de cache da leitura"""
+    try:
+        return _caminho(nome).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    # Round trip com nulos e tipos anuláveis, em um diretório temporário
+    exemplo = pd.DataFrame({
+        'CODIGO_UF': [29, 29, 35],
+        'CIDADE_NORMALIZADA': ['SALVADOR', None, 'SAO PAULO'],
+        'QUANTIDADE': pd.array([10, None, 3], dtype='Int64'),
+        'score_match': [100.0, np.nan, 91.5],
+        'ATIVO': pd.array([True, None, False], dtype='boolean'),
+    })
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        DIRETORIO_SNAPSHOTS = Path(diretorio)
+        salvar_snapshot("verificacao", exemplo)
+        lido, _ = carregar_snapshot("verificacao")
+
+    pd.testing.assert_frame_equal(lido, exemplo)
+    print(f"✅ Round trip do snapshot OK ({len(exemplo.columns)} colunas, nulos e dtypes preservados)")
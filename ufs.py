@@ -0,0 +1,76 @@
+"""
+Unidades da Federação
+Códigos IBGE, siglas e nomes das UFs e conversão da coluna UF das planilhas
+
+Autor: Engenheiro de Dados Sênior
+Data: Janeiro 2026
+"""
+
+from typing import Dict, Tuple
+
+import pandas as pd
+
+from normalizacao import normalizar_nomes
+
+
+# Código IBGE da UF -> (sigla, nome)
+UFS: Dict[int, Tuple[str, str]] = {
+    11: ('RO', 'Rondônia'),
+    12: ('AC', 'Acre'),
+    13: ('AM', 'Amazonas'),
+    14: ('RR', 'Roraima'),
+    15: ('PA', 'Pará'),
+    16: ('AP', 'Amapá'),
+    17: ('TO', 'Tocantins'),
+    21: ('MA', 'Maranhão'),
+    22: ('PI', 'Piauí'),
+    23: ('CE', 'Ceará'),
+    24: ('RN', 'Rio Grande do Norte'),
+    25: ('PB', 'Paraíba'),
+    26: ('PE', 'Pernambuco'),
+    27: ('AL', 'Alagoas'),
+    28: ('SE', 'Sergipe'),
+    29: ('BA', 'Bahia'),
+    31: ('MG', 'Minas Gerais'),
+    32: ('ES', 'Espírito Santo'),
+    33: ('RJ', 'Rio de Janeiro'),
+    35: ('SP', 'São Paulo'),
+    41: ('PR', 'Paraná'),
+    42: ('SC', 'Santa Catarina'),
+    43: ('RS', 'Rio Grande do Sul'),
+    50: ('MS', 'Mato Grosso do Sul'),
+    51: ('MT', 'Mato Grosso'),
+    52: ('GO', 'Goiás'),
+    53: ('DF', 'Distrito Federal'),
+}
+
+# Sigla ou nome normalizado (maiúsculas, sem acentos) -> código IBGE
+_CODIGO_POR_TEXTO: Dict[str, int] = {}
+for _codigo, (_sigla, _nome) in UFS.items():
+    _CODIGO_POR_TEXTO[_sigla] = _codigo
+    _CODIGO_POR_TEXTO[normalizar_nomes(pd.Series([_nome]), abreviacoes={}).iloc[0]] = _codigo
+
+
+def sigla_uf(codigo_uf: int) -> str:
+    """Sigla da UF a partir do código IBGE (ex.: 29 -> 'BA')"""
+    return UFS[int(codigo_uf)][0]
+
+
+def uf_do_municipio(codigo_ibge: int) -> int:
+    """Código da UF embutido nos dois primeiros dígitos do código IBGE do município"""
+    return int(codigo_ibge) // 100000
+
+
+def codigos_uf(valores: pd.Series) -> pd.Series:
+    """
+    Converte a coluna UF das planilhas (sigla ou nome, com ou sem acento) em
+    código IBGE da UF.
+
+    Args:
+        valores: Série com valores como 'BA', 'ba', 'Bahia' ou 'BAHIA'.
+
+    Returns:
+        Série Int64 com o código da UF (<NA> quando não reconhecido).
+    """
+    texto = normalizar_nomes(valores, abreviacoes={})
+    return texto.map(_CODIGO_POR_TEXTO).astype('Int64')
@@ -10,13 +10,24 @@ import streamlit as st
 import sqlite3
 import bcrypt
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 import os
+import re
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+from consultas_sql import Consultas
+from migracoes import aplicar_migracoes, versao_esquema
+
 load_dotenv()
 
 
+class BancoOcupado(Exception):
+    """Todas as conexões do pool em uso por mais de DB_POOL_TIMEOUT segundos"""
+
+
 class UserDatabase:
     """
     Gerencia usuários em banco de dados.
@@ -26,8 +37,25 @@ class UserDatabase:
     def __init__(self):
         """Inicializa conexão com banco de dados"""
         self.db_type = self._get_db_type()
-        self.conn = None
-        self._initialize_database()
+        
+        # Camada de conexões reutilizáveis
+        self._pool = None                  # PostgreSQL: ThreadedConnectionPool
+        self._vagas_pool = None            # PostgreSQL: semáforo com DB_POOL_MAX vagas
+        self._conn_times = {}              # PostgreSQL: id(conn) -> (criada_em, usada_em)
+        self._local = threading.local()    # SQLite: conexão por thread
+        self._lock = threading.Lock()
+        self.recycle_seconds = int(self._get_config('DB_POOL_RECYCLE', '1800'))
+        self.healthcheck_seconds = int(self._get_config('DB_HEALTHCHECK_INTERVAL', '30'))
+        self.pool_timeout = float(self._get_config('DB_POOL_TIMEOUT', '10'))
+        
+        # Custo bcrypt dos hashes novos (hashes antigos são regravados no login)
+        self.bcrypt_rounds = int(self._get_config('BCRYPT_ROUNDS', '12'))
+        
+        # Incrementado a cada alteração de usuário (invalida o cache do AuthService)
+        self.users_version = 0
+        
+        # SQL compilado uma vez por dialeto (prepared statements no PostgreSQL)
+        self.consultas = Consultas(self.db_type, preparar=self._usar_prepared_statements())
     
     
     def _get_db_type(self) -> str:
@@ -47,68 +75,218 @@ class UserDatabase:
         return 'sqlite'
     
     
-    def _get_connection(self):
-        """Retorna conexão com banco de dados"""
+    def _usar_prepared_statements(self) -> bool:
+        """
+        Prepared statements no PostgreSQL (DB_PREPARED_STATEMENTS, padrão false).
+        
+        Mesmo ligados, ficam desligados quando a DATABASE_URL aponta para um
+        pooler em modo transação (porta 6543 do Supabase ou pgbouncer): ali um
+        EXECUTE pode cair em outro backend, onde o PREPARE não existe.
+        """
+        if self._get_config('DB_PREPARED_STATEMENTS', 'false').lower() != 'true':
+            return False
+        
+        url = self._get_config('DATABASE_URL', '').lower()
+        return not (re.search(r'(:|port=)6543\b', url) or 'pgbouncer' in url)
+    
+    
+    def _get_config(self, key: str, default: str) -> str:
+        """Lê configuração de st.secrets (Cloud) ou variável de ambiente (.env)"""
+        try:
+            if hasattr(st, 'secrets') and st.secrets and key in st.secrets:
+                return str(st.secrets.get(key))
+        except:
+            pass
+        return os.getenv(key, default)
+    
+    
+    def _create_postgres_pool(self):
+        """Cria o pool de conexões PostgreSQL dimensionado pela configuração"""
+        from psycopg2.pool import ThreadedConnectionPool
+        
+        return ThreadedConnectionPool(
+            int(self._get_config('DB_POOL_MIN', '1')),
+            int(self._get_config('DB_POOL_MAX', '5')),
+            self._get_config('DATABASE_URL', '')
+        )
+    
+    
+    def _new_sqlite_connection(self) -> sqlite3.Connection:
+        """Abre conexão SQLite em modo WAL (uma por thread)"""
+        db_path = Path('data/users.db')
+        db_path.parent.mkdir(exist_ok=True)
+        
+        conn = sqlite3.connect(str(db_path), timeout=10, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    
+    def _is_healthy(self, conn) -> bool:
+        """Verifica se a conexão ainda responde"""
+        try:
+            if getattr(conn, 'closed', 0):
+                return False
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            if self.db_type == 'postgres':
+                # Encerrar a transação aberta pelo SELECT
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    
+    def _acquire_connection(self):
+        """
+        Obtém uma conexão reutilizável.
+        Conexões mais velhas que DB_POOL_RECYCLE são recicladas e conexões
+        ociosas há mais de DB_HEALTHCHECK_INTERVAL são testadas antes do uso.
+        
+        No PostgreSQL, com o pool esgotado, aguarda até DB_POOL_TIMEOUT segundos
+        por uma conexão livre (o getconn do psycopg2 falharia na hora).
+        
+        Raises:
+            BancoOcupado: Nenhuma conexão foi liberada dentro do prazo.
+        """
         if self.db_type == 'postgres':
-            import psycopg2
-            # Obter URL do banco
-            db_url = None
-            try:
-                if hasattr(st, 'secrets') and st.secrets:
-                    db_url = st.secrets.get('DATABASE_URL')
-            except:
-                pass
+            with self._lock:
+                if self._pool is None:
+                    self._pool = self._create_postgres_pool()
+                    self._vagas_pool = threading.BoundedSemaphore(self._pool.maxconn)
             
-            if not db_url:
-                db_url = os.getenv('DATABASE_URL')
+            if not self._vagas_pool.acquire(timeout=self.pool_timeout):
+                raise BancoOcupado("Banco de dados ocupado. Tente novamente em instantes.")
             
-            return psycopg2.connect(db_url)
-        else:
-            # SQLite local
-            db_path = Path('data/users.db')
-            db_path.parent.mkdir(exist_ok=True)
-            return sqlite3.connect(str(db_path))
+            try:
+                return self._getconn_saudavel()
+            except Exception:
+                self._vagas_pool.release()
+                raise
+        
+        now = time.monotonic()
+        
+        # SQLite: uma conexão de longa duração por thread
+        conn = getattr(self._local, 'conn', None)
+        created_at = getattr(self._local, 'created_at', now)
+        last_used = getattr(self._local, 'last_used', now)
+        
+        if conn is not None:
+            expired = now - created_at > self.recycle_seconds
+            needs_check = now - last_used > self.healthcheck_seconds
+            if expired or (needs_check and not self._is_healthy(conn)):
+                self._discard_connection(conn)
+                conn = None
+        
+        if conn is None:
+            conn = self._new_sqlite_connection()
+            self._local.conn = conn
+            self._local.created_at = now
+        
+        self._local.last_used = now
+        return conn
     
     
-    def _initialize_database(self):
-        """Cria tabela de usuários se não existir"""
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+    def _getconn_saudavel(self):
+        """Retira do pool PostgreSQL uma conexão válida (com uma vaga já reservada)"""
+        now = time.monotonic()
+        
+        # Tentar algumas vezes caso o pool entregue conexões mortas
+        for _ in range(self._pool.maxconn + 1):
+            conn = self._pool.getconn()
+            created_at, last_used = self._conn_times.get(id(conn), (now, now))
             
-            if self.db_type == 'postgres':
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id SERIAL PRIMARY KEY,
-                        username VARCHAR(50) UNIQUE NOT NULL,
-                        password_hash VARCHAR(255) NOT NULL,
-                        full_name VARCHAR(100) NOT NULL,
-                        role VARCHAR(20) DEFAULT 'user',
-                        active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-            else:
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        full_name TEXT NOT NULL,
-                        role TEXT DEFAULT 'user',
-                        active INTEGER DEFAULT 1,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
+            expired = now - created_at > self.recycle_seconds
+            needs_check = now - last_used > self.healthcheck_seconds
             
-            conn.commit()
+            if expired or conn.closed or (needs_check and not self._is_healthy(conn)):
+                self._conn_times.pop(id(conn), None)
+                self.consultas.esquecer(conn)
+                self._pool.putconn(conn, close=True)
+                continue
+            
+            self._conn_times[id(conn)] = (created_at, now)
+            return conn
+        
+        raise RuntimeError("Não foi possível obter uma conexão saudável do pool")
+    
+    
+    def _release_connection(self, conn, discard: bool = False):
+        """Devolve a conexão ao pool (ou a descarta se estiver com problema)"""
+        if self.db_type == 'postgres':
+            if discard or conn.closed:
+                self._conn_times.pop(id(conn), None)
+                self.consultas.esquecer(conn)
+            try:
+                self._pool.putconn(conn, close=discard or bool(conn.closed))
+            finally:
+                self._vagas_pool.release()
+        elif discard:
+            self._discard_connection(conn)
+    
+    
+    def _discard_connection(self, conn):
+        """Fecha a conexão SQLite da thread atual"""
+        try:
             conn.close()
+        except Exception:
+            pass
+        self._local.conn = None
+    
+    
+    @contextmanager
+    def _connection(self):
+        """
+        Context manager de conexão: faz commit ao final, rollback em caso de erro
+        e sempre devolve a conexão ao pool, evitando vazamentos.
+        """
+        conn = self._acquire_connection()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            # Após rollback, os prepared statements da conexão são ressincronizados
+            self.consultas.esquecer(conn)
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            if self._is_connection_error(e):
+                discard = True
+            raise
+        finally:
+            self._release_connection(conn, discard)
+    
+    
+    def _is_connection_error(self, error: Exception) -> bool:
+        """Indica se o erro invalida a conexão (rede, servidor reiniciado etc.)"""
+        if self.db_type == 'postgres':
+            import psycopg2
+            return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        return isinstance(error, sqlite3.OperationalError) and 'locked' not in str(error)
+    
+    
+    def _initialize_database(self) -> bool:
+        """
+        Aplica as migrações pendentes do esquema (ver migracoes.py) e cria o
+        admin padrão. Executado uma vez por processo (ver get_user_database)
+        ou no deploy, com `python user_database.py`.
+        
+        Returns:
+            True se inicializado com sucesso
+        """
+        try:
+            aplicar_migracoes(self)
             
             # Criar usuário admin padrão se não existir
             self._create_default_admin()
+            return True
             
         except Exception as e:
             st.error(f"❌ Erro ao inicializar banco de dados: {str(e)}")
+            return False
     
     
     def _create_default_admin(self):
@@ -148,27 +326,23 @@ class UserDatabase:
             True se criado com sucesso, False caso contrário
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            # Gerar hash da senha se necessário
+            # Gerar hash da senha se necessário (fora da conexão)
             if not from_hash:
-                password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+                password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.bcrypt_rounds)).decode('utf-8')
             else:
                 password_hash = password
             
-            cursor.execute("""
-                INSERT INTO users (username, password_hash, full_name, role)
-                VALUES (?, ?, ?, ?)
-            """ if self.db_type == 'sqlite' else """
-                INSERT INTO users (username, password_hash, full_name, role)
-                VALUES (%s, %s, %s, %s)
-            """, (username, password_hash, full_name, role))
-            
-            conn.commit()
-            conn.close()
-            return True
-            
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar(cursor, """
+                    INSERT INTO users (username, password_hash, full_name, role)
+                    VALUES (?, ?, ?, ?)
+                """, (username, password_hash, full_name, role))
+                
+                self.users_version += 1
+                return True
+                
         except Exception as e:
             st.error(f"❌ Erro ao criar usuário: {str(e)}")
             return False
@@ -183,70 +357,142 @@ class UserDatabase:
         
         Returns:
             Dicionário com dados do usuário ou None
+        
+        Raises:
+            BancoOcupado: Pool de conexões esgotado (ver DB_POOL_TIMEOUT).
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, username, password_hash, full_name, role, active
-                FROM users WHERE username = ?
-            """ if self.db_type == 'sqlite' else """
-                SELECT id, username, password_hash, full_name, role, active
-                FROM users WHERE username = %s
-            """, (username,))
-            
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return {
-                    'id': row[0],
-                    'username': row[1],
-                    'password_hash': row[2],
-                    'full_name': row[3],
-                    'role': row[4],
-                    'active': bool(row[5])
-                }
-            return None
-            
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar(cursor, """
+                    SELECT id, username, password_hash, full_name, role, active, session_generation
+                    FROM users WHERE username = ?
+                """, (username,))
+                
+                row = cursor.fetchone()
+                
+                if row:
+                    return {
+                        'id': row[0],
+                        'username': row[1],
+                        'password_hash': row[2],
+                        'full_name': row[3],
+                        'role': row[4],
+                        'active': bool(row[5]),
+                        'session_generation': row[6]
+                    }
+                return None
+                
+        except BancoOcupado:
+            # Não confundir com "usuário inexistente": quem chama avisa para tentar de novo
+            raise
         except Exception as e:
             st.error(f"❌ Erro ao buscar usuário: {str(e)}")
             return None
     
     
-    def list_users(self) -> List[Dict]:
+    def list_users_page(self, limit: int = 25, after: Optional[Tuple] = None,
+                        search: Optional[str] = None, role: Optional[str] = None,
+                        active: Optional[bool] = None) -> Tuple[List[Dict], Optional[Tuple]]:
         """
-        Lista todos os usuários.
+        Lista usuários com paginação por keyset (created_at, id) e filtros.
+        
+        Args:
+            limit: Quantidade máxima de usuários por página
+            after: Cursor (created_at, id) do último usuário da página anterior
+            search: Trecho de username ou nome completo (opcional)
+            role: Filtrar por papel (opcional)
+            active: Filtrar por status (opcional)
         
         Returns:
-            Lista de dicionários com dados dos usuários
+            Tupla (usuários da página, cursor da próxima página ou None)
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            conditions = []
+            params = []
             
-            cursor.execute("""
-                SELECT id, username, full_name, role, active, created_at
-                FROM users ORDER BY created_at DESC
-            """)
+            if search:
+                conditions.append("(username ILIKE ? OR full_name ILIKE ?)")
+                params.extend([f"%{search}%", f"%{search}%"])
             
-            rows = cursor.fetchall()
-            conn.close()
+            if role:
+                conditions.append("role = ?")
+                params.append(role)
             
-            users = []
-            for row in rows:
-                users.append({
+            if active is not None:
+                conditions.append("active = ?")
+                params.append(bool(active))
+            
+            if after is not None:
+                conditions.append("(created_at, id) < (?, ?)")
+                params.extend(after)
+            
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            
+            # Buscar um registro a mais para saber se existe próxima página
+            params.append(limit + 1)
+            
+            # Cada combinação de filtros gera um texto fixo, compilado uma única vez
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar(cursor, f"""
+                    SELECT id, username, full_name, role, active, created_at
+                    FROM users {where}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                """, params)
+                
+                rows = cursor.fetchall()
+            
+            users = [
+                {
                     'id': row[0],
                     'username': row[1],
                     'full_name': row[2],
                     'role': row[3],
                     'active': bool(row[4]),
                     'created_at': row[5]
-                })
+                }
+                for row in rows[:limit]
+            ]
             
-            return users
+            next_cursor = None
+            if len(rows) > limit:
+                last = users[-1]
+                next_cursor = (last['created_at'], last['id'])
             
+            return users, next_cursor
+            
+        except Exception as e:
+            st.error(f"❌ Erro ao listar usuários: {str(e)}")
+            return [], None
+    
+    
+    def list_usernames(self, active: Optional[bool] = None) -> List[str]:
+        """
+        Lista apenas os nomes de usuário (consulta leve para seletores).
+        
+        Args:
+            active: Filtrar por status (opcional)
+        
+        Returns:
+            Lista de usernames em ordem alfabética
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                if active is None:
+                    self.consultas.executar(cursor, "SELECT username FROM users ORDER BY username")
+                else:
+                    self.consultas.executar(
+                        cursor, "SELECT username FROM users WHERE active = ? ORDER BY username", (bool(active),)
+                    )
+                
+                return [row[0] for row in cursor.fetchall()]
+                
         except Exception as e:
             st.error(f"❌ Erro ao listar usuários: {str(e)}")
             return []
@@ -255,7 +501,7 @@ class UserDatabase:
     def update_user(self, username: str, full_name: Optional[str] = None,
                    role: Optional[str] = None, active: Optional[bool] = None) -> bool:
         """
-        Atualiza dados do usuário.
+        Atualiza dados do usuário. Desativar encerra as sessões abertas.
         
         Args:
             username: Nome de usuário
@@ -266,36 +512,26 @@ class UserDatabase:
         Returns:
             True se atualizado com sucesso
         """
+        if not full_name and not role and active is None:
+            return False
+        
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            updates = []
-            params = []
-            
-            if full_name:
-                updates.append("full_name = ?" if self.db_type == 'sqlite' else "full_name = %s")
-                params.append(full_name)
-            
-            if role:
-                updates.append("role = ?" if self.db_type == 'sqlite' else "role = %s")
-                params.append(role)
-            
-            if active is not None:
-                updates.append("active = ?" if self.db_type == 'sqlite' else "active = %s")
-                params.append(1 if active else 0)
-            
-            if not updates:
-                return False
-            
-            params.append(username)
-            sql = f"UPDATE users SET {', '.join(updates)} WHERE username = ?" if self.db_type == 'sqlite' else f"UPDATE users SET {', '.join(updates)} WHERE username = %s"
-            
-            cursor.execute(sql, params)
-            conn.commit()
-            conn.close()
-            return True
-            
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                # Instrução única: campos None mantêm o valor atual
+                self.consultas.executar(cursor, """
+                    UPDATE users SET
+                        full_name = COALESCE(?, full_name),
+                        role = COALESCE(?, role),
+                        active = COALESCE(?, active),
+                        session_generation = session_generation + ?
+                    WHERE username = ?
+                """, (full_name or None, role or None, active, int(active is False), username))
+                
+                self.users_version += 1
+                return True
+                
         except Exception as e:
             st.error(f"❌ Erro ao atualizar usuário: {str(e)}")
             return False
@@ -313,26 +549,73 @@ class UserDatabase:
             True se alterado com sucesso
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            
-            cursor.execute("""
-                UPDATE users SET password_hash = ?
-                WHERE username = ?
-            """ if self.db_type == 'sqlite' else """
-                UPDATE users SET password_hash = %s
-                WHERE username = %s
-            """, (password_hash, username))
-            
-            conn.commit()
-            conn.close()
-            return True
-            
+            password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt(rounds=self.bcrypt_rounds)).decode('utf-8')
         except Exception as e:
             st.error(f"❌ Erro ao alterar senha: {str(e)}")
             return False
+        
+        return self.set_password_hash(username, password_hash)
+    
+    
+    def set_password_hash(self, username: str, password_hash: str) -> bool:
+        """
+        Grava um hash de senha já calculado (troca de senha ou rehash no login).
+        
+        Args:
+            username: Nome de usuário
+            password_hash: Hash bcrypt da senha
+        
+        Returns:
+            True se alterado com sucesso
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar(cursor, """
+                    UPDATE users SET password_hash = ?
+                    WHERE username = ?
+                """, (password_hash, username))
+                
+                self.users_version += 1
+                return True
+                
+        except Exception as e:
+            st.error(f"❌ Erro ao alterar senha: {str(e)}")
+            return False
+    
+    
+    def revoke_sessions(self, username: str) -> bool:
+        """
+        Encerra todas as sessões do usuário (logout): incrementa a geração de
+        sessão, invalidando os tokens emitidos antes.
+        
+        Args:
+            username: Nome de usuário
+        
+        Returns:
+            True se atualizado com sucesso
+        
+        Raises:
+            BancoOcupado: Pool de conexões esgotado (ver DB_POOL_TIMEOUT).
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar(cursor, """
+                    UPDATE users SET session_generation = session_generation + 1
+                    WHERE username = ?
+                """, (username,))
+                
+                self.users_version += 1
+                return True
+                
+        except BancoOcupado:
+            raise
+        except Exception as e:
+            st.error(f"❌ Erro ao encerrar sessões: {str(e)}")
+            return False
     
     
     def delete_user(self, username: str) -> bool:
@@ -348,12 +631,244 @@ class UserDatabase:
         return self.update_user(username, active=False)
 
 
+    def create_users_bulk(self, users: List[Tuple[str, str, str, str]]) -> int:
+        """
+        Cria vários usuários em uma única transação (importação em lote).
+        Usernames já existentes são ignorados.
+
+        Args:
+            users: Lista de tuplas (username, password_hash, full_name, role),
+                com as senhas já convertidas em hash
+
+        Returns:
+            Quantidade de usuários criados (-1 em caso de erro)
+        """
+        if not users:
+            return 0
+
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+
+                # Conta só as linhas inseridas por este lote (não afetado por outras sessões)
+                criados = self.consultas.inserir_muitos(cursor, """
+                    INSERT INTO users (username, password_hash, full_name, role)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (username) DO NOTHING
+                """, users)
+
+                self.users_version += 1
+                return criados
+
+        except Exception as e:
+            st.error(f"❌ Erro ao criar usuários em lote: {str(e)}")
+            return -1
+
+
+    def set_users_active(self, usernames: List[str], active: bool) -> bool:
+        """
+        Ativa ou desativa vários usuários em uma única transação.
+        Desativar encerra as sessões abertas.
+
+        Args:
+            usernames: Nomes de usuário
+            active: Novo status
+
+        Returns:
+            True se atualizado com sucesso
+        """
+        if not usernames:
+            return True
+
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+
+                self.consultas.executar_muitos(
+                    cursor, "UPDATE users SET active = ?, session_generation = session_generation + ? WHERE username = ?",
+                    [(bool(active), int(not active), username) for username in usernames]
+                )
+
+                self.users_version += 1
+                return True
+
+        except Exception as e:
+            st.error(f"❌ Erro ao atualizar usuários em lote: {str(e)}")
+            return False
+
+    
+    
+    def get_city_aliases(self) -> Dict[Tuple[int, str], Dict]:
+        """
+        Carrega a tabela de aliases de cidades.
+        
+        Returns:
+            Dicionário (codigo_uf, alias) -> {codigo_ibge, score, pinned, updated_at}
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar(cursor, """
+                    SELECT codigo_uf, alias, codigo_ibge, score, pinned, updated_at
+                    FROM city_aliases
+                """)
+                
+                rows = cursor.fetchall()
+                
+                return {
+                    (row[0], row[1]): {
+                        'codigo_ibge': row[2],
+                        'score': row[3],
+                        'pinned': bool(row[4]),
+                        'updated_at': row[5]
+                    }
+                    for row in rows
+                }
+                
+        except Exception as e:
+            st.error(f"❌ Erro ao carregar aliases de cidades: {str(e)}")
+            return {}
+    
+    
+    def save_city_aliases(self, aliases: List[Tuple[str, int, float]]) -> bool:
+        """
+        Registra aliases resolvidos pelo fuzzy matching.
+        Aliases fixados (pinned) por um administrador não são sobrescritos.
+        A UF de cada alias é a do município (dois primeiros dígitos do código IBGE).
+        
+        Args:
+            aliases: Lista de tuplas (alias, codigo_ibge, score)
+        
+        Returns:
+            True se salvo com sucesso
+        """
+        if not aliases:
+            return True
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar_muitos(cursor, """
+                    INSERT INTO city_aliases (codigo_uf, alias, codigo_ibge, score, pinned, updated_at)
+                    VALUES (?, ?, ?, ?, FALSE, CURRENT_TIMESTAMP)
+                    ON CONFLICT (codigo_uf, alias) DO UPDATE SET
+                        codigo_ibge = excluded.codigo_ibge,
+                        score = excluded.score,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE city_aliases.pinned = FALSE
+                """, [
+                    (int(codigo) // 100000, alias, int(codigo), float(score))
+                    for alias, codigo, score in aliases
+                ])
+                
+                return True
+                
+        except Exception as e:
+            st.error(f"❌ Erro ao salvar aliases de cidades: {str(e)}")
+            return False
+    
+    
+    def set_city_alias(self, alias: str, codigo_ibge: int, pinned: bool = True) -> bool:
+        """
+        Define (ou corrige) manualmente o município de um alias.
+        O alias vale apenas para a UF do município informado.
+        
+        Args:
+            alias: Nome da cidade como aparece nas planilhas (CIDADE_NORMALIZADA)
+            codigo_ibge: Código IBGE do município correto
+            pinned: Se True, o alias não será sobrescrito pelo matching automático
+        
+        Returns:
+            True se salvo com sucesso
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar(cursor, """
+                    INSERT INTO city_aliases (codigo_uf, alias, codigo_ibge, score, pinned, updated_at)
+                    VALUES (?, ?, ?, 100, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (codigo_uf, alias) DO UPDATE SET
+                        codigo_ibge = excluded.codigo_ibge,
+                        score = 100,
+                        pinned = excluded.pinned,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (int(codigo_ibge) // 100000, alias, int(codigo_ibge), bool(pinned)))
+                
+                return True
+                
+        except Exception as e:
+            st.error(f"❌ Erro ao salvar alias de cidade: {str(e)}")
+            return False
+    
+    
+    def delete_city_alias(self, codigo_uf: int, alias: str) -> bool:
+        """
+        Remove um alias, forçando novo matching na próxima consolidação.
+        
+        Args:
+            codigo_uf: Código IBGE da UF do alias
+            alias: Nome da cidade como aparece nas planilhas
+        
+        Returns:
+            True se removido com sucesso
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                self.consultas.executar(
+                    cursor, "DELETE FROM city_aliases WHERE codigo_uf = ? AND alias = ?", (int(codigo_uf), alias)
+                )
+                
+                return True
+                
+        except Exception as e:
+            st.error(f"❌ Erro ao remover alias de cidade: {str(e)}")
+            return False
+
+
 # Instância global
 _user_db = None
+_user_db_lock = threading.Lock()
 
 def get_user_database() -> UserDatabase:
-    """Retorna instância singleton do banco de usuários"""
+    """
+    Retorna instância singleton do banco de usuários.
+    
+    Na primeira chamada do processo cria o esquema e o admin padrão. Com
+    DB_AUTO_INIT=false essa etapa fica só no deploy (`python user_database.py`)
+    e o app nunca executa DDL.
+    """
     global _user_db
     if _user_db is None:
-        _user_db = UserDatabase()
+        with _user_db_lock:
+            if _user_db is None:
+                db = UserDatabase()
+                if db._get_config('DB_AUTO_INIT', 'true').lower() == 'true':
+                    db._initialize_database()
+                _user_db = db
     return _user_db
+
+
+@st.cache_data(ttl=300)
+def get_city_alias_map() -> Dict[Tuple[int, str], Tuple[int, float, bool]]:
+    """
+    Retorna o mapa (codigo_uf, alias) -> (codigo_ibge, score, fixado) usado pelo matching de cidades.
+    Após editar aliases, chame get_city_alias_map.clear() para invalidar o cache.
+    """
+    aliases = get_user_database().get_city_aliases()
+    return {alias: (info['codigo_ibge'], info['score'], info['pinned']) for alias, info in aliases.items()}
+
+
+if __name__ == "__main__":
+    # Inicialização no deploy: esquema e admin padrão, fora do app
+    banco = UserDatabase()
+    print(f"⏳ Inicializando banco de usuários ({banco.db_type})...")
+    if banco._initialize_database():
+        print(f"✅ Banco de usuários pronto! (esquema v{versao_esquema(banco)})")
+    else:
+        print("❌ Erro ao inicializar banco de usuários!")
+        raise SystemExit(1)
@@ -0,0 +1,218 @@
+# 👥 Script Auxiliar - Importação/Exportação de Usuários em CSV
+# Cadastra delegações inteiras a partir de um CSV e exporta a lista de
+# usuários para auditoria. Também usado pela aba de importação do admin.
+#
+# Formato de importação (cabeçalho obrigatório):
+#     username,full_name,password,role
+#     joao.silva,João da Silva,senha123,user
+#
+# Uso:
+#     python usuarios_csv.py importar novos_usuarios.csv
+#     python usuarios_csv.py exportar usuarios.csv
+
+import csv
+import io
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, TextIO, Tuple
+
+import bcrypt
+
+
+PAPEIS = ('user', 'admin')
+COLUNAS_IMPORTACAO = ['username', 'full_name', 'password', 'role']
+COLUNAS_EXPORTACAO = ['username', 'full_name', 'role', 'active', 'created_at']
+
+# Usuários por transação na importação e por página na exportação
+TAMANHO_LOTE = 100
+
+
+class ResultadoImportacao(NamedTuple):
+    """Resumo de uma importação"""
+    criados: int
+    existentes: List[str]             # usernames já cadastrados (ignorados)
+    erros: List[Tuple[int, str]]      # (linha do CSV, motivo)
+
+
+def _hash_senha(args: Tuple[str, int]) -> str:
+    """Gera o hash bcrypt de uma senha (executado nos processos do pool)"""
+    senha, rounds = args
+    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def gerar_hashes(senhas: List[str], rounds: int, processos: int = 0) -> List[str]:
+    """
+    Gera os hashes bcrypt de várias senhas em paralelo, em um pool de processos.
+
+    Args:
+        senhas: Senhas em texto plano.
+        rounds: Custo bcrypt.
+        processos: Tamanho do pool (0 = número de CPUs, até 8).
+
+    Returns:
+        Hashes na mesma ordem das senhas.
+    """
+    tarefas = [(senha, rounds) for senha in senhas]
+    processos = min(processos or min(os.cpu_count() or 1, 8), len(tarefas))
+
+    if processos <= 1:
+        return [_hash_senha(tarefa) for tarefa in tarefas]
+
+    # spawn: não herda threads do servidor Streamlit (e é o padrão no Windows)
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as executor:
+        return list(executor.map(_hash_senha, tarefas, chunksize=max(1, len(tarefas) // (processos * 4))))
+
+
+def ler_csv_usuarios(arquivo: TextIO, existentes: Iterable[str] = ()) -> Tuple[List[Dict], List[Tuple[int, str]], List[str]]:
+    """
+    Lê e valida o CSV de importação linha a linha.
+
+    Args:
+        arquivo: Arquivo texto com cabeçalho username,full_name,password,role.
+        existentes: Usernames já cadastrados.
+
+    Returns:
+        Tupla (linhas válidas, erros (linha, motivo), usernames já existentes).
+    """
+    leitor = csv.DictReader(arquivo)
+    cabecalho = [coluna.strip().lower() for coluna in (leitor.fieldnames or [])]
+    faltantes = [coluna for coluna in COLUNAS_IMPORTACAO if coluna not in cabecalho and coluna != 'role']
+    if faltantes:
+        return [], [(1, f"Colunas faltantes: {', '.join(faltantes)}")], []
+    leitor.fieldnames = cabecalho
+
+    existentes = set(existentes)
+    vistos = set()
+    validos, erros, ja_cadastrados = [], [], []
+
+    for numero, linha in enumerate(leitor, start=2):
+        username = (linha.get('username') or '').strip()
+        full_name = (linha.get('full_name') or '').strip()
+        senha = linha.get('password') or ''
+        papel = (linha.get('role') or '').strip().lower() or 'user'
+
+        if not username or not senha or not full_name:
+            erros.append((numero, "Preencha username, full_name e password"))
+        elif ' ' in username:
+            erros.append((numero, f"Nome de usuário '{username}' contém espaços"))
+        elif len(senha) < 6:
+            erros.append((numero, f"Senha de '{username}' com menos de 6 caracteres"))
+        elif papel not in PAPEIS:
+            erros.append((numero, f"Papel inválido '{papel}' (use {' ou '.join(PAPEIS)})"))
+        elif username in vistos:
+            erros.append((numero, f"Usuário '{username}' repetido no arquivo"))
+        elif username in existentes:
+            ja_cadastrados.append(username)
+        else:
+            vistos.add(username)
+            validos.append({'username': username, 'full_name': full_name, 'password': senha, 'role': papel})
+
+    return validos, erros, ja_cadastrados
+
+
+def importar_usuarios(db, arquivo: TextIO, processos: int = 0,
+                      tamanho_lote: int = TAMANHO_LOTE) -> ResultadoImportacao:
+    """
+    Importa usuários de um CSV: valida, gera os hashes em paralelo e insere
+    em transações de tamanho_lote usuários.
+
+    Args:
+        db: Instância de UserDatabase.
+        arquivo: Arquivo texto do CSV.
+        processos: Tamanho do pool de hashing (0 = número de CPUs).
+        tamanho_lote: Usuários por transação.
+
+    Returns:
+        ResultadoImportacao com criados, existentes e erros.
+    """
+    try:
+        validos, erros, existentes = ler_csv_usuarios(arquivo, db.list_usernames())
+    except UnicodeDecodeError:
+        # Ex.: CSV salvo pelo Excel em cp1252/latin-1; nada foi gravado ainda
+        return ResultadoImportacao(0, [], [(0, "Arquivo não está em UTF-8 (no Excel, salve como 'CSV UTF-8')")])
+
+    # Só as linhas válidas e novas pagam o custo do bcrypt
+    hashes = gerar_hashes([linha['password'] for linha in validos], db.bcrypt_rounds, processos)
+
+    criados = 0
+    for inicio in range(0, len(validos), tamanho_lote):
+        lote = [
+            (linha['username'], password_hash, linha['full_name'], linha['role'])
+            for linha, password_hash in zip(validos[inicio:inicio + tamanho_lote], hashes[inicio:inicio + tamanho_lote])
+        ]
+        resultado = db.create_users_bulk(lote)
+        if resultado < 0:
+            erros.append((0, f"Erro ao gravar o lote iniciado em '{lote[0][0]}'"))
+        else:
+            criados += resultado
+
+    return ResultadoImportacao(criados, existentes, erros)
+
+
+def linhas_csv_usuarios(db, tamanho_pagina: int = TAMANHO_LOTE) -> Iterator[str]:
+    """
+    Gera a lista de usuários em CSV, página por página (paginação por keyset),
+    sem carregar a tabela inteira. Hashes de senha nunca são exportados.
+
+    Yields:
+        Trechos de texto CSV (cabeçalho e depois uma página por vez).
+    """
+    yield ','.join(COLUNAS_EXPORTACAO) + '\r\n'
+
+    cursor = None
+    while True:
+        usuarios, cursor = db.list_users_page(limit=tamanho_pagina, after=cursor)
+
+        pagina = io.StringIO()
+        escritor = csv.writer(pagina)
+        for usuario in usuarios:
+            escritor.writerow([usuario[coluna] for coluna in COLUNAS_EXPORTACAO])
+        yield pagina.getvalue()
+
+        if cursor is None:
+            return
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("👥 IMPORTAÇÃO/EXPORTAÇÃO DE USUÁRIOS - CRECI Itinerante")
+    print("=" * 60)
+    print()
+
+    if len(sys.argv) != 3 or sys.argv[1] not in ('importar', 'exportar'):
+        print("Uso:")
+        print("  python usuarios_csv.py importar arquivo.csv")
+        print("  python usuarios_csv.py exportar arquivo.csv")
+        sys.exit(1)
+
+    from user_database import get_user_database
+
+    comando, caminho = sys.argv[1], sys.argv[2]
+    banco = get_user_database()
+
+    if comando == 'exportar':
+        with open(caminho, 'w', encoding='utf-8-sig', newline='') as destino:
+            for trecho in linhas_csv_usuarios(banco):
+                destino.write(trecho)
+        print(f"✅ Usuários exportados para {caminho}")
+        sys.exit(0)
+
+    if not os.path.exists(caminho):
+        print(f"❌ Arquivo não encontrado: {caminho}")
+        sys.exit(1)
+
+    print("⏳ Validando e gerando hashes...")
+    with open(caminho, encoding='utf-8-sig', newline='') as origem:
+        resultado = importar_usuarios(banco, origem)
+
+    print()
+    print(f"✅ Usuários criados:         {resultado.criados}")
+    print(f"   Já existentes (ignorados): {len(resultado.existentes)}")
+    print(f"   Linhas com erro:           {len(resultado.erros)}")
+    for numero, motivo in resultado.erros:
+        print(f"   ⚠️  Linha {numero}: {motivo}")
+    print()
+    sys.exit(1 if resultado.erros else 0)